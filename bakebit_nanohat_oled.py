@@ -50,6 +50,41 @@ History:
         Re-organised menu system to have dedicated "apps" area. (02/08/19)
  0.22   Added Ethernet port speed support via Ethtool on Classic mode
         home page(03/08/19)
+ 0.23   Only send changed areas of display to OLED (frame_diff.py)
+        Added cache of rendered page frames (frame_cache.py)
+        Draw text from pre-rendered glyph atlas (glyph_atlas.py)
+        Compile menu in to tree of nodes at start-up (menu_tree.py)
+        Summary page stats read from /proc & /sys (sys_stats.py)
+        Page data collected by background sampler (sampler.py)
+        Interfaces listed via netlink, not ifconfig (net_inventory.py)
+        WLAN interface details via nl80211, not iw (nl80211.py)
+        Home page link speed/duplex & IP from sysfs, not ethtool
+        Start-up split in to boot sequence, overlapping splash screen
+        Main loop driven by key press events & timers (event_loop.py)
+        Key presses queued & repeated presses coalesced (button_queue.py)
+        Page data collected concurrently, pages wait for it up to a deadline
+        (fanout.py)
+        External commands run by spawn server helper, without a shell
+        (spawn_server.py)
+        Command & probe results held in TTL cache, replacing result_cache
+        flag (ttl_cache.py)
+        UFW status read from ufw rules files, not ufw command (ufw_reader.py)
+        USB devices listed from sysfs & compiled usb.ids index, not lsusb
+        (usb_inventory.py)
+        Display backends: NanoHat OLED, headless (PNG/PBM frames) & terminal
+        emulator with keys from stdin (display_backends.py)
+        Render, display push, collector & command timings and counters
+        exported for node_exporter & shown on Status > Diagnostics page
+        (metrics.py)
+        Control socket for key injection, state & frames, with key-to-frame
+        latency benchmark (control_socket.py)
+        Pages redrawn as their refresh policy says (static, interval, on data
+        change or clock second), not all every second
+        Frames converted to SSD1306 page bytes in bulk (frame_encoder.py)
+        Native SSD1306 I2C driver (ssd1306_i2c.py) & screen blanked by
+        switching panel off, not writing zeros
+        Linux framebuffer (ssd1307fb) display backend (fbdev.py)
+        Simple tables scrolled by moving the lines already drawn (18/10/26)
         
 
 To do:
@@ -59,21 +94,39 @@ To do:
 
 '''
 
-import bakebit_128_64_oled as oled
+import display_backends
+import frame_diff
+import glyph_atlas
+from boot_timer import BootTimer, timing_requested
+from button_queue import ButtonQueue
+from control_socket import ControlServer, key_names
+from event_loop import EventLoop, monotonic
+from frame_cache import FrameCache
+from menu_tree import compile_menu
+from metrics import Registry
+from net_inventory import NetInventory, LinkMonitor
+from nl80211 import Nl80211
+from sampler import Sampler
+from spawn_server import SpawnClient
+from sys_stats import SystemStats, human_size
+from ttl_cache import TTLCache
+from ufw_reader import UfwReader
+from usb_inventory import UsbInventory
 from PIL import Image
-from PIL import ImageFont
 from PIL import ImageDraw
 import time
 import sys
-import subprocess
 import signal
 import os
 import socket
+import threading
+import argparse
+import base64
 import types
 import re
 from textwrap import wrap
 
-__version__ = "0.22 (beta)"
+__version__ = "0.23 (beta)"
 __author__  = "wifinigel@gmail.com"
 
 ############################
@@ -85,16 +138,29 @@ height=64
 ############################
 # Set page sleep control
 ############################
-pageSleep=300
-pageSleepCountdown=pageSleep
+pageSleep=300                 # seconds without a key press before screen blanked
 
 ####################################
 # Initialize the SEEED OLED display
 ####################################
-oled.init()
-#Set display to normal mode (i.e non-inverse mode)
-oled.setNormalDisplay()      
-oled.setHorizontalMode()
+# The display is initialised in boot() - importing this module does not
+# touch the hardware. The display backend (NanoHat OLED, headless or
+# terminal emulator) is chosen with --display (see display_backends.py)
+display_backend = 'bakebit'
+display_options = {}
+backend = None
+display = None
+
+def init_display():
+
+    global backend
+    global display
+
+    backend = display_backends.open_backend(display_backend, **display_options)
+
+    # Only the parts of each frame that have changed since the last one are
+    # sent to the display (full frames are slow to send over I2C)
+    display = frame_diff.FrameDiff(backend.device, push_time=push_time)
 
 #######################################
 # Initialize drawing & fonts variables
@@ -112,31 +178,50 @@ drawing_in_progress = False
 image = Image.new('1', (width, height))
 draw = ImageDraw.Draw(image)
 
+# Rendered frames are cached against their page content so that repainting
+# an unchanged page does not need to re-draw it (max number of frames held)
+frame_cache_size = 32
+frame_cache = FrameCache(frame_cache_size)
+
 #######################
 # Define display fonts
 #######################
-smartFont = ImageFont.truetype('DejaVuSansMono-Bold.ttf', 10);
-font11    = ImageFont.truetype('DejaVuSansMono.ttf', 11);
-font12    = ImageFont.truetype('DejaVuSansMono.ttf', 12);
-fontb12   = ImageFont.truetype('DejaVuSansMono-Bold.ttf', 12);
-font14    = ImageFont.truetype('DejaVuSansMono.ttf', 14);
-fontb14   = ImageFont.truetype('DejaVuSansMono-Bold.ttf', 14);
-fontb24   = ImageFont.truetype('DejaVuSansMono-Bold.ttf', 24);
+# Text is drawn from pre-rendered glyphs (see glyph_atlas.py), which are
+# cached on disk after the first boot. Fonts are loaded by boot().
+smartFont = None
+font11    = None
+font12    = None
+fontb12   = None
+font14    = None
+fontb14   = None
+fontb24   = None
+
+def load_fonts():
+
+    global smartFont, font11, font12, fontb12, font14, fontb14, fontb24
+
+    smartFont = glyph_atlas.load_font('DejaVuSansMono-Bold.ttf', 10);
+    font11    = glyph_atlas.load_font('DejaVuSansMono.ttf', 11);
+    font12    = glyph_atlas.load_font('DejaVuSansMono.ttf', 12);
+    fontb12   = glyph_atlas.load_font('DejaVuSansMono-Bold.ttf', 12);
+    font14    = glyph_atlas.load_font('DejaVuSansMono.ttf', 14);
+    fontb14   = glyph_atlas.load_font('DejaVuSansMono-Bold.ttf', 14);
+    fontb24   = glyph_atlas.load_font('DejaVuSansMono-Bold.ttf', 24);
 
 #######################################
 # Initialize various global variables
 #######################################
 shutdown_in_progress = False  # True when shutdown or reboot started
 screen_cleared = False        # True when display cleared (e.g. screen save)
-current_menu_location = [0]   # Pointer to current location in menu structure
+current_menu_node = None      # Current location in menu structure (MenuNode)
 option_selected = 0           # Content of currently selected menu level
-sig_fired = False             # Set to True when button handler fired
 home_page_name = "Home"       # Display name for top level menu
 current_mode = "classic"      # Currently selected mode (e.g. wconsole/classic)
 nav_bar_top = 55              # top pixel of nav bar
+nav_positions = { 'down': 0, 'next': 50, 'back': 100 }  # nav button x positions
 current_scroll_selection = 0  # where we currently are in scrolling table
 table_list_length = 0         # Total length of currently displayed table
-result_cache = False          # used to cache results when paging info
+table_view = None             # last simple table pushed (see scroll_table())
 display_state = 'page'        # current display state: 'page' or 'menu'
 start_up = True               # True if in initial (home page) start-up state
 
@@ -154,32 +239,182 @@ kismet_ctl_file = '/home/wlanpi/nanohat-oled-scripts/kismet_ctl'
 bettercap_ctl_file = '/home/wlanpi/nanohat-oled-scripts/bettercap_ctl'
 profiler_ctl_file = '/home/wlanpi/nanohat-oled-scripts/profiler_ctl'
 
-# Linux programs
-ifconfig_file = '/sbin/ifconfig'
-iw_file = '/usr/sbin/iw'
-ufw_file = '/usr/sbin/ufw'
-ethtool_file = '/sbin/ethtool'
+# web page that the WLANPi image version is shown on
+index_html_file = '/var/www/html/index.html'
 
+# version of WLANPi image & hostname (found by boot())
+wlanpi_ver = "unknown"
+hostname = "unknown"
 
 # check our current mode
-if os.path.isfile(wconsole_mode_file):
-    current_mode = 'wconsole'
-if os.path.isfile(hotspot_mode_file):
-    current_mode = 'hotspot'
-    
+def get_mode():
+
+    mode = 'classic'
+
+    if os.path.isfile(wconsole_mode_file):
+        mode = 'wconsole'
+    if os.path.isfile(hotspot_mode_file):
+        mode = 'hotspot'
+
+    return mode
+
+# get the current version of WLANPi image (the "WLAN Pi v..." line(s) of the
+# web page, with html tags removed)
+def get_wlanpi_ver():
+
+    try:
+        with open(index_html_file) as index_html:
+            lines = [ re.sub('<[^>]+>', '', line) for line in index_html if "WLAN Pi v" in line ]
+    except:
+        lines = []
 
-# get & the current version of WLANPi image
-ver_cmd = "grep \"WLAN Pi v\" /var/www/html/index.html | sed \"s/<[^>]\+>//g\""
-try:
-    wlanpi_ver = subprocess.check_output(ver_cmd, shell = True )
-except:
-    wlanpi_ver = "unknown"
+    if not lines:
+        return "unknown"
+
+    return ''.join(lines)
 
 # get hostname
-try:   
-    hostname = subprocess.check_output('hostname', shell = True)
-except:
-    hostname = "unknown"
+def get_hostname():
+
+    try:
+        return socket.gethostname()
+    except:
+        return "unknown"
+
+# Results of commands & probes are cached against (collector, args) for a
+# time (seconds) set per collector, and dropped when leaving the page that
+# shows them (see page_collectors)
+result_cache_size = 64
+result_cache = TTLCache(result_cache_size)
+result_ttl = {
+    'interfaces': 1,
+    'wlan': 8,
+    'kismet': 5,
+    'bettercap': 5,
+    'profiler': 5,
+}
+
+def cached(collector, function, *args):
+
+    '''
+    Return the result of function(*args), cached as collector's result
+    '''
+
+    global result_cache
+    global result_ttl
+
+    # (lists in args, e.g. command lines, need to be tuples in the key)
+    key = (collector, tuple(tuple(arg) if type(arg) is list else arg for arg in args))
+
+    return result_cache.get(key, function, result_ttl[collector], *args)
+
+# Counters & latency histograms (see metrics.py). They are written to
+# metrics_file every metrics_interval seconds for node_exporter's textfile
+# collector, and summarised on the Status > Diagnostics page
+metrics_file = '/run/wlanpi-oled/metrics.prom'
+metrics_interval = 15
+metrics = Registry(prefix='wlanpi_oled_')
+
+render_time = metrics.histogram('render_seconds',
+    'Time to render a menu or page (including sending it to the display)', ['page'])
+push_time = metrics.histogram('display_push_seconds',
+    'Time to send the changed parts of a frame to the display')
+collector_time = metrics.histogram('collector_seconds',
+    'Time taken by a background data collector', ['collector'])
+command_time = metrics.histogram('command_seconds',
+    'Time taken by an external command', ['command'])
+
+# values counted elsewhere are read when the metrics are written out (the
+# objects they are read from are created at start-up)
+metrics.counter_function('display_frames_pushed_total',
+    'Frames sent to the display', lambda: display.frames_pushed if display else 0)
+metrics.counter_function('display_frames_skipped_total',
+    'Frames not sent as identical to the last', lambda: display.frames_skipped if display else 0)
+metrics.counter_function('display_bytes_total',
+    'Data bytes sent to the display', lambda: display.bytes_sent if display else 0)
+metrics.counter_function('button_presses_total',
+    'Button presses received', lambda: button_queue.received)
+metrics.counter_function('button_presses_dropped_total',
+    'Button presses dropped as the queue was full', lambda: button_queue.dropped)
+metrics.counter_function('loop_overruns_total',
+    'Timers run late as the event loop was busy', lambda: event_loop.overruns if event_loop else 0)
+metrics.counter_function('command_fallbacks_total',
+    'External commands run directly as the spawn server was not available',
+    lambda: spawner.fallbacks if spawner else 0)
+metrics.counter_function('result_cache_hits_total',
+    'Command & probe results found in the result cache', lambda: result_cache.hits)
+metrics.counter_function('result_cache_misses_total',
+    'Command & probe results not in the result cache', lambda: result_cache.misses)
+
+# Page data sources. They open sockets & files (& the spawner starts a
+# helper process), so they are created by boot() - see init_collectors() -
+# rather than when this module is imported.
+
+# External commands are run by a small helper process rather than by
+# forking this (much larger) process each time
+spawner = None
+
+def command_output(argv):
+
+    '''
+    Return the output of a command as text (for display)
+    '''
+
+    return spawner.check_output(argv, universal_newlines=True)
+
+# ufw status read from its config & rules files (re-read when they change)
+ufw_reader = None
+
+# USB devices from sysfs, named from a compiled usb.ids index (the device
+# list is re-read only after a USB hotplug event)
+usb_inventory = None
+
+# interface list from kernel via netlink (keeps netlink socket open)
+net_inventory = None
+
+# link state, speed & address of home page interfaces from sysfs & ioctl
+# (re-read only when the link changes)
+link_monitors = {}
+
+# wlan interface details from kernel via nl80211 (keeps netlink socket open)
+wlan_client = None
+
+# system stats collector for summary page (keeps /proc files open)
+system_stats = None
+
+# Page data is collected by a background sampler so that painting a page
+# never has to wait for commands to run (collectors are added by boot())
+sampler = None
+
+def init_collectors():
+
+    global spawner
+    global ufw_reader
+    global usb_inventory
+    global net_inventory
+    global link_monitors
+    global wlan_client
+    global system_stats
+    global sampler
+
+    spawner = SpawnClient(command_time=command_time)
+    ufw_reader = UfwReader()
+    usb_inventory = UsbInventory()
+    net_inventory = NetInventory()
+    link_monitors = {
+        'eth0': LinkMonitor('eth0'),
+        'wlan0': LinkMonitor('wlan0'),
+    }
+    wlan_client = Nl80211()
+    system_stats = SystemStats()
+    sampler = Sampler(collector_time=collector_time)
+
+collecting_msg = "Collecting data..."
+
+# Longest a page waits for data that has not been collected yet before it is
+# drawn with a "Collecting data..." placeholder (seconds). The data fills in
+# on a later refresh once it has been collected.
+page_deadline = 0.5
 
 #############################
 # Get current IP for display
@@ -196,25 +431,33 @@ def get_ip():
         s.close()
     return IP
 
+#########################################
+# Draw text on display image (all fonts)
+#########################################
+def draw_text(xy, text, font, fill=255):
+    global image
+    font.draw_text(image, xy, text, fill=fill)
+    return
+
 ##########################
 # Draw navigation buttons
 ##########################
 def nav_button(label, position):
     global draw
     global nav_bar_top
-    draw.text((position,nav_bar_top),label,font=smartFont,fill=255)
+    draw_text((position,nav_bar_top),label,font=smartFont,fill=255)
     return
     
 def back_button(label="Back"):
-    nav_button(label, 100)
+    nav_button(label, nav_positions['back'])
     return
 
 def next_button(label="Next"):
-    nav_button(label,50)
+    nav_button(label, nav_positions['next'])
     return
 
 def down_button(label="Down"):
-    nav_button(label, 0)
+    nav_button(label, nav_positions['down'])
     return
 
 ##############################################
@@ -233,29 +476,192 @@ def clear_display():
     # Draw a black filled box to clear the display.
     draw.rectangle((0,0,width,height), outline=0, fill=0)
 
+def table_layout(item_list, position, table_display_max, title, font_type, font_size,
+        item_length_max, back_button_req):
+
+    '''
+    Return the text drawn for a simple table scrolled to position, as a list
+    of (key, xy, text, font). The key of the title, each item & each button
+    is the same at any scroll position.
+    '''
+
+    layout = []
+    y = 0
+
+    if title != '':
+        layout.append((('title',), (0, y), title.center(item_length_max, " "), font_type))
+        y += font_size
+
+    table_bottom_entry = min(position + table_display_max, len(item_list))
+
+    for index in range(position, table_bottom_entry):
+        layout.append((('item', index), (0, y), item_list[index][0:item_length_max], font_type))
+        y += font_size
+
+    # scroll buttons if the entries exceed a page
+    if len(item_list) > table_display_max:
+
+        # show down if not at end of list in display window
+        if table_bottom_entry < len(item_list):
+            layout.append((('nav', 'Down'), (nav_positions['down'], nav_bar_top), 'Down', smartFont))
+
+        # show an up button if not at start of list
+        if position > 0:
+            layout.append((('nav', 'Up'), (nav_positions['next'], nav_bar_top), 'Up', smartFont))
+
+    if back_button_req:
+        layout.append((('nav', 'Exit'), (nav_positions['back'], nav_bar_top), 'Exit', smartFont))
+
+    return layout
+
+def layout_extents(layout):
+
+    '''
+    Return (key, first row, last row + 1) of the pixel rows each text of the
+    layout may set (None if that can't be worked out for some text)
+    '''
+
+    extents = []
+
+    for (key, (x, y), text, font) in layout:
+
+        rows = font.text_rows(text)
+        if rows is None:
+            return None
+
+        if rows[1] > rows[0]:
+            extents.append((key, max(0, y + rows[0]), min(height, y + rows[1])))
+
+    return extents
+
+def row_keys(extents):
+
+    '''
+    Return, for each pixel row, the set of keys of the text touching it
+    '''
+
+    rows = [ set() for row in range(height) ]
+
+    for (key, top, bottom) in extents:
+        for row in range(top, bottom):
+            rows[row].add(key)
+
+    return rows
+
+def scroll_table(view, position, layout, body_top, line_height):
+
+    '''
+    Scroll the simple table in image to position: the rows between the
+    title & the nav bar text are moved up or down in place, then only the
+    pixel rows whose text differs from what was there (newly exposed items,
+    changed buttons) are cleared & the text touching them redrawn. Text is
+    only ever drawn on, so the result is identical to drawing the table
+    from scratch.
+
+    Returns the layout_extents() of the new layout, or None, having done
+    nothing, unless image holds the same table view (view is its content)
+    at another position & was the last frame pushed.
+    '''
+
+    global table_view
+
+    if table_view is None or display is None:
+        return None
+
+    (old_view, old_position, old_layout, old_extents, frame_number) = table_view
+
+    if old_view != view or old_position == position:
+        return None
+
+    if frame_number != display.frames_pushed + display.frames_skipped:
+        return None
+
+    if display.last_frame != image.tobytes():
+        return None
+
+    if old_extents is None:
+        old_extents = layout_extents(old_layout)
+
+    new_extents = layout_extents(layout)
+
+    if old_extents is None or new_extents is None:
+        return None
+
+    old_rows = row_keys(old_extents)
+    new_rows = row_keys(new_extents)
+
+    # pixel rows the items move up by (down if negative)
+    shift = (position - old_position) * line_height
+
+    # items scroll between the title text (which may reach below the first
+    # item's line) & the nav bar text (which the last item's descenders may
+    # reach down to)
+    fixed = old_extents + new_extents
+    body_top = max([ bottom for (key, top, bottom) in fixed if key[0] == 'title' ] + [body_top])
+    body_bottom = min([ top for (key, top, bottom) in fixed if key[0] == 'nav' ] + [height])
+
+    if abs(shift) < body_bottom - body_top:
+        if shift > 0:
+            (source_top, source_bottom) = (body_top + shift, body_bottom)
+        else:
+            (source_top, source_bottom) = (body_top, body_bottom + shift)
+        moved = image.crop((0, source_top, width, source_bottom))
+        image.paste(moved, (0, source_top - shift))
+
+    # rows to redraw: those that now hold different text to the rows they
+    # came from
+    stale = []
+
+    for row in range(height):
+        source = row
+        if body_top <= row < body_bottom:
+            source = row + shift
+            if not body_top <= source < body_bottom:
+                stale.append(row)
+                continue
+        if new_rows[row] != old_rows[source]:
+            stale.append(row)
+
+    redraw = set()
+    run_start = None
+
+    for (i, row) in enumerate(stale):
+        redraw.update(new_rows[row])
+        if run_start is None:
+            run_start = row
+        # clear each run of stale rows in one go
+        if i + 1 == len(stale) or stale[i + 1] != row + 1:
+            draw.rectangle((0, run_start, width, row), outline=0, fill=0)
+            run_start = None
+
+    for (key, xy, text, font) in layout:
+        if key in redraw:
+            draw_text(xy, text, font=font, fill=255)
+
+    return new_extents
+
 def display_simple_table(item_list, back_button_req=0, title='', font="small"):
 
     '''
     This function takes a list and paints each entry as a line on a 
     page. It also displays appropriate up/down scroll buttons if the 
     entries passed exceed a page length (one line at a time)
+
+    Scrolling moves the lines already on the page & only draws the line
+    that scrolls in (see scroll_table())
     '''
 
     global drawing_in_progress
     global draw
-    global oled
+    global display
     global current_scroll_selection
     global table_list_length
     global display_state
+    global table_view
 
     drawing_in_progress = True
     display_state = 'page'
-    
-    # Clear display prior to painting new item
-    clear_display()
 
-    y = 0
-    x = 0
     font_offset = 0
     
     if font == "small":
@@ -269,47 +675,50 @@ def display_simple_table(item_list, back_button_req=0, title='', font="small"):
         item_length_max = 17
         table_display_max = 4
     
-    # write title if present
     if title != '':
-        draw.text((x, y + font_offset), title.center(item_length_max, " "),  font=font_type, fill=255)
-        font_offset += font_size
         table_display_max -=1
+        font_offset += font_size
     
     table_list_length = len(item_list)
     
-    # if we're going to scroll of the end of the list, adjust pointer
+    # if we're going to scroll of the end of the list, adjust pointer (may
+    # have moved several lines at once)
     if current_scroll_selection + table_display_max > table_list_length:
-        current_scroll_selection -=1
+        current_scroll_selection = max(0, table_list_length - table_display_max)
     
-    # modify list to display if scrolling required
+    # if this exact table view has been drawn before, re-use the frame
     if table_list_length > table_display_max:
-    
-        table_bottom_entry = current_scroll_selection + table_display_max
-        item_list = item_list[current_scroll_selection: table_bottom_entry]
+        scroll_position = current_scroll_selection
+    else:
+        scroll_position = 0
 
-        # show down if not at end of list in display window
-        if table_bottom_entry < table_list_length:
-            down_button()
+    view = ('table', title, tuple(item_list), back_button_req, font)
+    cache_key = view + (scroll_position,)
 
-        
-        # show an up button if not at start of list
-        if current_scroll_selection > 0:
-            next_button(label="Up")
-    
-    for item in item_list:
-    
-        if len(item) > item_length_max:
-            item = item[0:item_length_max]
+    layout = table_layout(item_list, scroll_position, table_display_max, title,
+        font_type, font_size, item_length_max, back_button_req)
 
-        draw.text((x, y + font_offset), item,  font=font_type, fill=255)
-        
-        font_offset += font_size
-    
-    # Back button
-    if back_button_req:
-        back_button(label="Exit")
-    
-    oled.drawImage(image)
+    extents = None
+
+    if not frame_cache.restore(cache_key, image):
+
+        # scroll from the position last shown, or paint the whole table
+        extents = scroll_table(view, scroll_position, layout, font_offset, font_size)
+
+        if extents is None:
+
+            # Clear display prior to painting new item
+            clear_display()
+
+            for (key, xy, text, text_font) in layout:
+                draw_text(xy, text, font=text_font, fill=255)
+
+        frame_cache.store(cache_key, image)
+
+    display.push(image)
+
+    table_view = (view, scroll_position, layout, extents,
+        display.frames_pushed + display.frames_skipped)
     
     display_state = 'page'
     drawing_in_progress = False
@@ -323,7 +732,7 @@ def display_dialog_msg(msg, back_button_req=0, wrap_limit=17, font="medium"):
     '''
     
     global draw
-    global oled
+    global display
     global drawing_in_progress
     global display_state
     
@@ -375,16 +784,13 @@ def display_paged_table(table_data, back_button_req=0):
 
     global drawing_in_progress
     global draw
-    global oled
+    global display
     global current_scroll_selection
     global table_list_length
     global display_state
 
     drawing_in_progress = True
     display_state = 'page'
-    
-    # Clear display prior to painting new item
-    clear_display()
 
     y = 0
     x = 0
@@ -393,29 +799,43 @@ def display_paged_table(table_data, back_button_req=0):
     item_length_max = 20
     table_display_max = 4
     
-    # write title
+    # Extract pages data
+    table_pages = table_data['pages']
+    page_count = len(table_pages)
+    
+    # Display the page selected - correct over-shoot of page down (may have
+    # moved several pages at once)
+    if current_scroll_selection >= page_count:
+        current_scroll_selection = page_count - 1
+    
+    # Correct over-shoot of page up
+    if current_scroll_selection < 0:
+        current_scroll_selection = 0
+    
+    # build title
     title = table_data['title']
     total_pages = len(table_data['pages'])
     
     if  total_pages > 1:
         title += " ({}/{})".format(current_scroll_selection + 1, total_pages)
+    
+    # if this exact page has been drawn before, re-use the frame
+    cache_key = ('paged', title, tuple(tuple(page) for page in table_pages),
+        current_scroll_selection, back_button_req)
+
+    if frame_cache.restore(cache_key, image):
+        display.push(image)
+        drawing_in_progress = False
+        return
+
+    # Clear display prior to painting new item
+    clear_display()
 
-    draw.text((x, y + font_offset), title.center(item_length_max, " "),  font=smartFont, fill=255)
+    # write title
+    draw_text((x, y + font_offset), title.center(item_length_max, " "),  font=smartFont, fill=255)
     
     font_offset += font_size
     
-    # Extract pages data
-    table_pages = table_data['pages']
-    page_count = len(table_pages)
-    
-    # Display the page selected - correct over-shoot of page down
-    if current_scroll_selection == page_count:
-        current_scroll_selection -=1
-    
-    # Correct over-shoot of page up
-    if current_scroll_selection == -1:
-        current_scroll_selection = 0
-    
     page = table_pages[current_scroll_selection]
     
     # If the page has greater than table_display_max entries, slice it
@@ -427,7 +847,7 @@ def display_paged_table(table_data, back_button_req=0):
         if len(item) > item_length_max:
             item = item[0:item_length_max]
 
-        draw.text((x, y + font_offset), item,  font=smartFont, fill=255)
+        draw_text((x, y + font_offset), item,  font=smartFont, fill=255)
         
         font_offset += font_size
     
@@ -445,7 +865,8 @@ def display_paged_table(table_data, back_button_req=0):
     if back_button_req:
         back_button(label="Exit")
     
-    oled.drawImage(image)
+    frame_cache.store(cache_key, image)
+    display.push(image)
     
     display_state = 'page'
     drawing_in_progress = False
@@ -486,21 +907,12 @@ def draw_page():
     global drawing_in_progress
     global image
     global draw
-    global oled
-    global font
+    global display
     global fontb12
-    global font14
-    global smartFont
-    global width
-    global height
-    global width
-    global height
-    global pageSleepCountdown
-    global current_menu_location
+    global font11
+    global current_menu_node
     global option_selected 
     global option_number_selected
-    global menu
-    global home_page_name
     global display_state
     
     # Drawing already in progress - return
@@ -514,127 +926,270 @@ def draw_page():
     # show menu list based on current menu position
     ################################################
     
-    #FIXME: This feels clunky. Would be best to access menu locations
-    #       via evaluated location rather than crawling over menu
-    
-    menu_structure = menu
-    location_search = []
-    depth = 0
-    section_name = [home_page_name]
-
-    # Crawl the menu structure until we hit the current specified location
-    while current_menu_location != location_search:
-
-        # List that will be used to build menu items to display
-        menu_list = []
-        
-        # Current menu location choice specified in list format:
-        #  current_menu_location = [2,1]
-        #
-        # As we move though menu depths, inpsect next level of
-        # menu structure
-        node = current_menu_location[depth]
-        
-        # figure out the number of menu options at this menu level
-        number_menu_choices = len(menu_structure)
-               
-        if node == number_menu_choices:
-        
-            # we've fallen off the end of menu choices, fix item by zeroing
-            node = 0
-            current_menu_location[depth] = 0
-            
-        
-        location_search.append(node)
-        
-        item_counter = 0
-
-        for menu_item in menu_structure:
-        
-            item_name = menu_item['name']
-            
-            # this is the currently selected item, pre-pend name with '*'
-            if (item_counter == node):
-                section_name.append(item_name)
-                item_name = "*" + item_name
-            
-            menu_list.append((item_name))
-            
-            item_counter = item_counter + 1
-        
-        depth = depth + 1
-        
-        # move down to next level of menu structure & repeat for new level
-        menu_structure = menu_structure[node]['action']
+    # The menu is compiled in to a tree at start-up (see menu_tree.py), so
+    # the title & items to show are already attached to the current node
+    node = current_menu_node
                 
-    option_number_selected = node
-    option_selected = menu_structure
-    
-    # if we're at the top of the menu tree, show the home page title
-    if depth == 1:
-        page_name = home_page_name
+    option_number_selected = node.index
+    if node.is_submenu:
+        option_selected = node.children
     else:
-        # otherwise show the name of the parent menu item
-        page_name = section_name[-2]
-        
-    page_title = ("[ " + page_name + " ]").center(17, " ")
+        option_selected = node.action
     
+    # a menu position we've already drawn can be re-used from the frame cache
+    cache_key = ('menu', node.path)
+
+    if frame_cache.restore(cache_key, image):
+        display.push(image)
+        drawing_in_progress = False
+        return
+
     # Clear display prior to painting new item
     clear_display()
     
     # paint the page title
-    draw.text((1, 1), page_title,  font=fontb12, fill=255)
+    draw_text((1, 1), node.title,  font=fontb12, fill=255)
     
     # vertical starting point for menu (under title) & incremental offset for
     # subsequent items
     y=15
     y_offset=13
     
-    # define display window limit for menu table
-    table_window = 3
-    
-    # determine the menu list to show based on current selection and window limits
-    if (len(menu_list) > table_window):
-    
-        # We've got more items than we can fit in our window, need to slice to fit
-        if (option_number_selected >= table_window):
-            menu_list = menu_list[(option_number_selected - (table_window - 1)): option_number_selected + 1]
-        else:
-            # We have enough space for the menu items, so no special treatment required
-            menu_list = menu_list[0 : table_window]
-    
-    # paint the menu items, highlighting selected menu item
-    for menu_item in menu_list:
+    # paint the menu items in the display window, highlighting selected menu item
+    for menu_item in node.window:
     
         rect_fill=0
         text_fill=255
     
-        # this is selected menu item: highlight it and remove * character
-        if (menu_item[0] == '*'):
+        # this is selected menu item: highlight it
+        if (menu_item is node):
             rect_fill=255
             text_fill=0
-            menu_item = menu_item[1:len(menu_item)]
-            
-        # convert menu item to std width format with nav indicator
-        menu_item = "{:<17}>".format(menu_item)
     
         draw.rectangle((0, y, 127, y+y_offset), outline=0, fill=rect_fill)
-        draw.text((1, y+1), menu_item,  font=font11, fill=text_fill)
+        draw_text((1, y+1), menu_item.label,  font=font11, fill=text_fill)
         y += y_offset  
     
     # add nav buttons
     down_button()
     next_button()
     # Don't show back button at top level of menu
-    if depth != 1:
+    if node.depth != 1:
         back_button()
     else:
         back_button(label="Exit")
     
-    oled.drawImage(image)
+    frame_cache.store(cache_key, image)
+    display.push(image)
 
     drawing_in_progress = False
 
+##########################################################
+# data collector functions (run by the background sampler)
+##########################################################
+def collect_system():
+
+    ''' 
+    System stats for the summary page
+    '''
+
+    global system_stats
+
+    stats = {}
+    
+    for name, collector in [('load', system_stats.loadavg), ('memory', system_stats.memory),
+            ('disk', system_stats.disk_usage), ('temp', system_stats.thermal_zones)]:
+        try:
+            stats[name] = collector()
+        except:
+            stats[name] = None
+    
+    return stats
+
+def collect_interfaces():
+
+    '''
+    Return a list of network interfaces found to be up, with IP address if available
+    '''
+
+    global net_inventory
+
+    try:
+        interface_list = cached('interfaces', net_inventory.interfaces)
+    except Exception as ex:
+        return ([ "Err: netlink error" ], None)
+
+    interfaces = []
+    for interface in interface_list:
+
+        # only interfaces that are up are listed (as ifconfig did)
+        if not interface.is_up:
+            continue
+        
+        if interface.ipv4:
+            ip_address = interface.ipv4[0]
+        elif interface.kind == 'monitor':
+            ip_address = "(Monitor)"
+        else:
+            ip_address = "No IP address"
+        
+        interfaces.append( '{}: {}'.format(interface.name, ip_address))
+
+    return (None, interfaces)
+
+def collect_wlan_interfaces():
+
+    '''
+    Create pages to summarise WLAN interface info
+    '''
+    
+    global net_inventory
+    global wlan_client
+
+    try:
+        interface_list = cached('interfaces', net_inventory.interfaces)
+    except Exception as ex:
+        return ([ "Err: netlink error" ], None)
+
+    # Extract wlan interfaces that are up
+    interface_names = [ interface.name for interface in interface_list
+        if interface.is_up and re.match(r'wlan\d+$', interface.name) ]
+    
+    # get details of all wireless interfaces from nl80211 in one request
+    try:
+        wlan_details = dict((wlan.name, wlan) for wlan in cached('wlan', wlan_client.interfaces))
+    except Exception as ex:
+        wlan_details = {}
+    
+    interfaces = []
+    for interface_name in interface_names:
+    
+        interface_info = []
+        wlan = wlan_details.get(interface_name)
+        
+        # construct our page data - start with name
+        interface_info.append("Interface: " + interface_name)
+        
+        if wlan is None:
+            interface_info.append("Err: nl80211 failed")
+            interfaces.append(interface_info)
+            continue
+        
+        # SSID (if applicable)
+        if wlan.ssid is not None:
+            interface_info.append("SSID: " + wlan.ssid)
+        else:
+            interface_info.append("SSID: N/A")
+            
+        # Mode
+        interface_info.append("Mode: " + wlan.iftype_name)
+        
+        # Channel
+        if wlan.channel is not None:
+            interface_info.append("Ch: {} ({}Mhz)".format(wlan.channel, wlan.width or "?"))
+        else:
+            interface_info.append("Ch: unknown")
+        
+        # MAC
+        if wlan.mac is not None:
+            interface_info.append("Addr: " + wlan.mac)
+        else:
+            interface_info.append("Addr: unknown")
+         
+        interfaces.append(interface_info)
+        
+    # if we had no WLAN interfaces, insert message
+    if len(interfaces) == 0:
+        interfaces.append(['No Wlan Interfaces'])
+    
+    return (None, interfaces)
+
+def collect_usb():
+
+    '''
+    Return a list of non-Linux USB interfaces found in sysfs
+    '''
+
+    global usb_inventory
+
+    try:
+        devices = usb_inventory.devices()
+    except Exception as ex:
+        error_descr = "Issue getting usb info from sysfs"
+        return ([ "Err: usb error" ], None)
+        
+    interfaces = []
+
+    for device in devices:
+
+        result = device.description
+
+        # skip Linux root hubs
+        if 'Linux' in result:
+            continue
+    
+        # chop down the string to fit the display
+        result = result[0:19]
+    
+        interfaces.append(result)
+        
+    if len(interfaces) == 0:
+        interfaces.append("No devices detected")
+    
+    return (None, interfaces)
+
+def collect_home():
+
+    '''
+    Interface, IP address & mode/link info for the home page
+    '''
+
+    global current_mode
+    global link_monitors
+
+    if current_mode == "wconsole":
+        # get wlan0 IP
+        if_name = "wlan0"
+        mode_name = "Wi-Fi Console"
+    
+    elif current_mode == "hotspot":
+        # get wlan0 IP
+        if_name = "wlan0"
+        mode_name = "Hotspot"
+    
+    else:
+        # get eth0 IP
+        if_name = "eth0"
+        mode_name = ""
+        
+        # get Ethernet port info (...for Jerry)
+        try:
+            link = link_monitors[if_name].status()
+
+            if not link.carrier:
+                # Ethernet link is down, report msg instead of speed & duplex
+                mode_name = "Link down"
+            elif (link.speed is None) or (link.duplex is None):
+                # speed/duplex not known (yet)...show nothing
+                mode_name = ""
+            else:
+                # Report the speed & duplex, as ethtool shows them
+                mode_name = "{}Mb/s {}".format(link.speed, link.duplex.capitalize())
+
+        except Exception as ex:
+            # Something went wrong...show nothing
+            mode_name = ""
+
+    try:
+        ip_addr = link_monitors[if_name].status().ipv4
+    except Exception as ex:
+        ip_addr = None
+
+    if ip_addr is None:
+        ip_addr = "No IP Addr"
+
+    return (if_name, ip_addr, mode_name)
+
 ####################################
 # dispatcher (menu) functions here
 ####################################
@@ -647,44 +1202,42 @@ def show_summary():
     global width
     global height
     global draw
-    global oled
+    global display
     global display_state
+    global sampler
+    global page_deadline
     
-    # The commands here take quite a while to execute, so lock screen early
-    # (normally done by page drawing function)
-    drawing_in_progress = True
-         
-    IPAddress = get_ip()
+    # stats are collected in the background (see collect_system())
+    sampler.wait_for(['ip', 'system'], page_deadline)
+    IPAddress = sampler.get('ip', "unknown")
+    stats = sampler.get('system', {})
     
-    # determine CPU load
-    cmd = "top -bn1 | grep load | awk '{printf \"CPU Load: %.2f\", $(NF-2)}'"
+    # determine CPU load (1 min load average, as shown by top)
     try:
-        CPU = subprocess.check_output(cmd, shell = True )
+        CPU = "CPU Load: %.2f" % stats['load'].one
     except:
         CPU = "unknown"
         
-    #determine mem useage
-    cmd = "free -m | awk 'NR==2{printf \"Mem: %s/%sMB %.2f%%\", $3,$2,$3*100/$2 }'"
+    #determine mem useage (as shown by free -m)
     try:
-        MemUsage = subprocess.check_output(cmd, shell = True )
+        mem = stats['memory']
+        MemUsage = "Mem: %s/%sMB %.2f%%" % (mem.used_mb, mem.total_mb, mem.used_mb*100.0/mem.total_mb)
     except:
         MemUsage = "unknown"
     
-    # determine disk util
-    cmd = "df -h | awk '$NF==\"/\"{printf \"Disk: %d/%dGB %s\", $3,$2,$5}'"
+    # determine disk util (as shown by df -h)
     try:
-        Disk = subprocess.check_output(cmd, shell = True )
+        disk = stats['disk']
+        Disk = "Disk: %d/%dGB %s%%" % (human_size(disk.used)[0], human_size(disk.total)[0], disk.percent)
     except:
         Disk = "unknown"
         
     # determine temp
     try:
-        tempI = int(open('/sys/class/thermal/thermal_zone0/temp').read())
+        tempI = stats['temp'][0].celsius
     except:
         tempI = "unknown"
     
-    if tempI>1000:
-        tempI = tempI/1000
     tempStr = "CPU TEMP: %sC" % str(tempI)
 
     results = [
@@ -713,7 +1266,7 @@ def show_date():
     global width
     global height
     global draw
-    global oled
+    global display
     global display_state
     
     drawing_in_progress = True
@@ -722,19 +1275,19 @@ def show_date():
     clear_display()
 
     text = time.strftime("%A")
-    draw.text((1,0),text,font=font12,fill=255)
+    draw_text((1,0),text,font=font12,fill=255)
     text = time.strftime("%e %b %Y")
-    draw.text((1,13),text,font=font12,fill=255)
+    draw_text((1,13),text,font=font12,fill=255)
     text = time.strftime("%X")
-    draw.text((1,26),text,font=fontb14,fill=255)
+    draw_text((1,26),text,font=fontb14,fill=255)
     text = time.strftime("%Z")
-    draw.text((1,41),"TZ: " + text,font=font12,fill=255)
+    draw_text((1,41),"TZ: " + text,font=font12,fill=255)
     
     
     # Back button
     back_button()
         
-    oled.drawImage(image)
+    display.push(image)
     
     display_state = 'page'
     drawing_in_progress = False
@@ -742,54 +1295,18 @@ def show_date():
 def show_interfaces():
 
     '''
-    Return a list of network interfaces found to be up, with IP address if available
+    Display list of network interfaces found to be up, with IP address if available
     '''
 
-    global ifconfig_file
-    global iw_file
     global display_state
+    global sampler
+    global page_deadline
 
-    try:
-        ifconfig_info = subprocess.check_output(ifconfig_file, shell=True)
-    except Exception as ex:
-        interfaces= [ "Err: ifconfig error" ]
-        display_simple_table(interfaces, back_button_req=1)
-        return
+    (error, interfaces) = sampler.get('interfaces', (None, [collecting_msg]), wait=page_deadline)
 
-    # Extract interface info with a bit of regex magic
-    interface_re = re.findall('^(\w+?)\: flags(.*?)RX packets', ifconfig_info, re.DOTALL|re.MULTILINE)
-    if interface_re is None:
-        # Something broke is our regex - report an issue
-        interfaces = [ "Error: match error"]
-    else:
-        interfaces = []
-        for result in interface_re:
-        
-            # save the interface name
-            interface_name = result[0]
-            
-            # look at the rest of the interface info & extract IP if available
-            interface_info = result[1]
-            
-            inet_search = re.search("inet (.+?) ", interface_info, re.MULTILINE)
-            if inet_search is None:
-                ip_address = "No IP address"
-                
-                # do check if this is an interface in monitor mode
-                if (re.search("wlan\d", interface_name, re.MULTILINE)):
-
-                    # fire up 'iw' for this interface (hmmm..is this a bit of an un-necessary ovehead?)
-                    try:
-                        iw_info = subprocess.check_output('{} {} info'.format(iw_file, interface_name), shell=True)
-
-                        if re.search("type monitor", iw_info, re.MULTILINE):
-                            ip_address = "(Monitor)"
-                    except:
-                        ip_address = "unknown"
-            else:
-                ip_address = inet_search.group(1)
-            
-            interfaces.append( '{}: {}'.format(interface_name, ip_address))
+    if error:
+        display_simple_table(error, back_button_req=1)
+        return
 
     # final check no-one pressed a button before we render page
     if display_state == 'menu':
@@ -800,87 +1317,18 @@ def show_interfaces():
 def show_wlan_interfaces():
 
     '''
-    Create pages to summarise WLAN interface info
+    Display pages to summarise WLAN interface info
     '''
     
-    global ifconfig_file
-    global iw_file
     global display_state
+    global sampler
+    global page_deadline
 
-    try:
-        ifconfig_info = subprocess.check_output('{} -s'.format(ifconfig_file), shell=True)
-    except Exception as ex:
-        interfaces= [ "Err: ifconfig error" ]
-        display_simple_table(interfaces, back_button_req=1)
-        return
-
-    # Extract interface info
-    interface_re = re.findall('^(wlan\d)  ', ifconfig_info, re.DOTALL|re.MULTILINE)
-    if interface_re is None:
-        interfaces = [ "Error: match error"]
-    else:
-        
-        interfaces = []
-        for interface_name in interface_re:
-        
-            interface_info = []
-            
-            # use iw to find further info for each wlan interface
-            try:
-                iw_info = subprocess.check_output("{} {} info".format(iw_file, interface_name), shell=True)
-            except:
-                iw_info = "Err: iw cmd failed"
-            
-            # split the output in to an array
-            iw_list = iw_info.split('\n')
-            
-            interface_details = {}
-            
-            for iw_item in iw_list:
-            
-                iw_item = iw_item.strip()
+    (error, interfaces) = sampler.get('wlan', (None, [[collecting_msg]]), wait=page_deadline)
 
-                fields = iw_item.split()
-                
-                # skip empty lines
-                if not fields:
-                    continue
-                
-                interface_details[fields[0]] = fields[1:] 
-            
-            # construct our page data - start with name
-            interface_info.append("Interface: " + interface_name)
-            
-            # SSID (if applicable)
-            if 'ssid' in interface_details.keys():
-                interface_info.append("SSID: " + str(interface_details['ssid'][0]))
-            else:
-                interface_info.append("SSID: N/A")
-                
-            # Mode
-            if 'type' in interface_details.keys():
-                interface_info.append("Mode: " + str(interface_details['type'][0]))
-            else:
-                interface_info.append("Mode: N/A")
-            
-            # Channel
-            if 'channel' in interface_details.keys():
-                interface_info.append("Ch: {} ({}Mhz)".format( str(interface_details['channel'][0]), str(interface_details['channel'][4]) ) )
-            else:
-                interface_info.append("Ch: unknown")
-            
-            # MAC
-            if 'addr' in interface_details.keys():
-                interface_info.append("Addr: " + str(interface_details['addr']))
-            else:
-                interface_info.append("Addr: unknown")
-             
-            interfaces.append(interface_info)
-            
-        # if we had no WLAN interfaces, insert message
-        if len(interfaces) == 0:
-            interfaces.append(['No Wlan Interfaces'])
-        
+    if error:
+        display_simple_table(error, back_button_req=1)
+        return
     
     data = {
         'title': '--WLAN I/F--',
@@ -896,33 +1344,17 @@ def show_wlan_interfaces():
 def show_usb():
 
     '''
-    Return a list of non-Linux USB interfaces found with the lsusb command
+    Display list of non-Linux USB interfaces found in sysfs
     '''
     global display_state
+    global sampler
+    global page_deadline
 
-    lsusb = '/usr/bin/lsusb | /bin/grep -v Linux | /usr/bin/cut -d\  -f7-'
-    lsusb_info = []
+    (error, interfaces) = sampler.get('usb', (None, [collecting_msg]), wait=page_deadline)
 
-    try:
-        lsusb_output = subprocess.check_output(lsusb, shell=True)
-        lsusb_info = lsusb_output.split('\n')
-    except Exception as ex:
-        error_descr = "Issue getting usb info using lsusb command"
-        interfaces= [ "Err: lsusb error" ]
-        display_simple_table(interfaces, back_button_req=1)
+    if error:
+        display_simple_table(error, back_button_req=1)
         return
-        
-    interfaces = []
-
-    for result in lsusb_info:
-    
-        # chop down the string to fit the display
-        result = result[0:19]
-    
-        interfaces.append(result)
-        
-    if len(interfaces) == 0:
-        interfaces.append("No devices detected")
     
     # final check no-one pressed a button before we render page
     if display_state == 'menu':
@@ -937,53 +1369,25 @@ def show_ufw():
     '''
     Return a list ufw ports
     '''
-    global ufw_file
-    global result_cache
+    global ufw_reader
     global display_state
     
-    ufw_info = []
-    
-    # check ufw is available
-    if not os.path.isfile(ufw_file):
+    # check ufw is available (its config file is what we read)
+    if not ufw_reader.installed:
         
         display_dialog_msg('UFW not installed', back_button_req=1)
         
         display_state = 'page'
         return
     
-    # If no cached ufw data from previous screen paint, run ufw status
-    if result_cache == False:
-    
-        try:
-            ufw_output = subprocess.check_output("{} status".format(ufw_file), shell=True)
-            ufw_info = ufw_output.split('\n')
-            result_cache = ufw_info # cache results
-        except Exception as ex:
-            error_descr = "Issue getting ufw info using ufw command"
-            interfaces= [ "Err: ufw error" ]
-            display_simple_table(interfaces, back_button_req=1)
-            return
-    else:
-        # we must have cached results from last time
-        ufw_info = result_cache
-        
-    port_entries = []
-    
-    # Add in status line
-    port_entries.append(ufw_info[0])
-
-    # lose top 4 & last 2 lines of output
-    ufw_info = ufw_info[4:-2]
-
-    for result in ufw_info:
-        
-        # tidy/compress the output
-        result = result.strip()
-        result_list = result.split()
-        
-        final_result = ' '.join(result_list)
-    
-        port_entries.append(final_result)
+    # ufw status & rules are read from its files (see ufw_reader.py)
+    try:
+        port_entries = ufw_reader.status_lines()
+    except Exception as ex:
+        error_descr = "Issue getting ufw info from ufw rules files"
+        interfaces= [ "Err: ufw error" ]
+        display_simple_table(interfaces, back_button_req=1)
+        return
         
     if len(port_entries) == 0:
         port_entries.append("No ufw info detected")
@@ -996,6 +1400,47 @@ def show_ufw():
     
     return
 
+def show_diagnostics():
+
+    '''
+    Summary of the metrics collected (see metrics.py): median/95th
+    percentile times in ms & counters
+    '''
+
+    global metrics
+    global display_state
+
+    def ms(histogram, **labels):
+        return '{:.0f}/{:.0f}'.format(histogram.quantile(0.5, **labels) * 1000,
+            histogram.quantile(0.95, **labels) * 1000)
+
+    entries = []
+
+    for labels in render_time.label_values():
+        entries.append('{:<10.10} {}ms'.format(labels['page'].replace('show_', ''),
+            ms(render_time, **labels)))
+
+    if push_time.count():
+        entries.append('Push {}ms'.format(ms(push_time)))
+
+    entries.append('Frames {}/{} skip'.format(display.frames_pushed, display.frames_skipped))
+    entries.append('Sent {}'.format(human_size(display.bytes_sent)))
+
+    for labels in collector_time.label_values():
+        entries.append('C {:<8.8} {}ms'.format(labels['collector'], ms(collector_time, **labels)))
+
+    for labels in command_time.label_values():
+        entries.append('X {:<8.8} {}ms'.format(labels['command'], ms(command_time, **labels)))
+
+    entries.append('Keys {} drop {}'.format(button_queue.received, button_queue.dropped))
+    entries.append('Overruns {}'.format(event_loop.overruns))
+
+    # final check no-one pressed a button before we render page
+    if display_state == 'menu':
+        return
+
+    display_list_as_paged_table(entries, back_button_req=1, title='--Diagnostics--')
+
 def show_menu_ver():
 
     global __version__
@@ -1005,33 +1450,38 @@ def show_menu_ver():
 
 def shutdown():
 
-    global oled
+    global display
+    global backend
     global shutdown_in_progress
     global screen_cleared
     
     display_dialog_msg('Shutting down...', back_button_req=0)
     time.sleep(1)
 
-    oled.clearDisplay()
+    display.blank()
     screen_cleared = True
     
-    os.system('systemctl poweroff')
+    # (not when running without the NanoHat - see display_backends.py)
+    if backend.hardware:
+        spawner.call(['systemctl', 'poweroff'])
     shutdown_in_progress = True
     return
 
 def reboot():
 
-    global oled
+    global display
+    global backend
     global shutdown_in_progress
     global screen_cleared
     
     display_dialog_msg('Rebooting...', back_button_req=0)
     time.sleep(1)
 
-    oled.clearDisplay()
+    display.blank()
     screen_cleared = True
     
-    os.system('systemctl reboot')
+    if backend.hardware:
+        spawner.call(['systemctl', 'reboot'])
     shutdown_in_progress = True
     return
 
@@ -1040,7 +1490,8 @@ def switcher(resource_title, resource_switcher_file, mode_name):
     Function to perform generic set of operations to switch wlanpi mode
     '''
 
-    global oled
+    global display
+    global backend
     global shutdown_in_progress
     global screen_cleared
     global current_mode
@@ -1073,10 +1524,11 @@ def switcher(resource_title, resource_switcher_file, mode_name):
         display_dialog_msg(dialog_msg, back_button_req)
         shutdown_in_progress = True
         time.sleep(2)
-        oled.clearDisplay()
+        display.blank()
         screen_cleared = True
 
-        subprocess.call("{} {}".format(resource_switcher_file, switch), shell=True) # reboots
+        if backend.hardware:
+            spawner.call([resource_switcher_file, switch]) # reboots
     except Exception as ex:
         dialog_msg = 'Switch failed! {}'.format(ex)
         back_button_req=1
@@ -1130,19 +1582,22 @@ def kismet_ctl(action="status"):
     if action=="status":
         # check kismet status & return text
         try:
-            dialog_msg = subprocess.check_output("{} {}".format(kismet_ctl_file, action), shell=True)
+            # status is cached while the page is shown (see result_ttl)
+            dialog_msg = cached('kismet', command_output, [kismet_ctl_file, action])
         except Exception as ex:
             dialog_msg = 'Status failed!'.format(ex)
         
     elif action=="start":
         try:
-            dialog_msg = subprocess.check_output("{} {}".format(kismet_ctl_file, action), shell=True)
+            dialog_msg = command_output([kismet_ctl_file, action])
+            result_cache.invalidate('kismet')
         except Exception as ex:
             dialog_msg = 'Start failed!'.format(ex)
     
     elif action=="stop":
         try:
-            dialog_msg = subprocess.check_output("{} {}".format(kismet_ctl_file, action), shell=True)
+            dialog_msg = command_output([kismet_ctl_file, action])
+            result_cache.invalidate('kismet')
         except Exception as ex:
             dialog_msg = 'Stop failed! {}'.format(ex)
         
@@ -1180,19 +1635,22 @@ def bettercap_ctl(action="status"):
     if action=="status":
         # check bettercap status & return text
         try:
-            dialog_msg = subprocess.check_output("{} {}".format(bettercap_ctl_file, action), shell=True)
+            # status is cached while the page is shown (see result_ttl)
+            dialog_msg = cached('bettercap', command_output, [bettercap_ctl_file, action])
         except Exception as ex:
             dialog_msg = 'Status failed!'.format(ex)
         
     elif action=="start":
         try:
-            dialog_msg = subprocess.check_output("{} {}".format(bettercap_ctl_file, action), shell=True)
+            dialog_msg = command_output([bettercap_ctl_file, action])
+            result_cache.invalidate('bettercap')
         except Exception as ex:
             dialog_msg = 'Start failed!'.format(ex)
     
     elif action=="stop":
         try:
-            dialog_msg = subprocess.check_output("{} {}".format(bettercap_ctl_file, action), shell=True)
+            dialog_msg = command_output([bettercap_ctl_file, action])
+            result_cache.invalidate('bettercap')
         except Exception as ex:
             dialog_msg = 'Stop failed!'.format(ex)
         
@@ -1229,7 +1687,8 @@ def profiler_ctl(action="status"):
     if action=="status":
         # check profiler status & return text
         try:
-            status_file_content = subprocess.check_output("{} {}".format(profiler_ctl_file, action), shell=True)
+            # status is cached while the page is shown (see result_ttl)
+            status_file_content = cached('profiler', command_output, [profiler_ctl_file, action])
             item_list =  status_file_content.splitlines()          
         except Exception as ex:
             item_list = ['Status failed!', str(ex)]
@@ -1240,25 +1699,29 @@ def profiler_ctl(action="status"):
         
     elif action=="start":
         try:
-            dialog_msg = subprocess.check_output("{} {}".format(profiler_ctl_file, action), shell=True)
+            dialog_msg = command_output([profiler_ctl_file, action])
+            result_cache.invalidate('profiler')
         except Exception as ex:
             dialog_msg = 'Start failed!'.format(ex)
             
     elif action=="start_no11r":
         try:
-            dialog_msg = subprocess.check_output("{} {}".format(profiler_ctl_file, action), shell=True)
+            dialog_msg = command_output([profiler_ctl_file, action])
+            result_cache.invalidate('profiler')
         except Exception as ex:
             dialog_msg = 'Start failed!'.format(ex)
     
     elif action=="stop":
         try:
-            dialog_msg = subprocess.check_output("{} {}".format(profiler_ctl_file, action), shell=True)
+            dialog_msg = command_output([profiler_ctl_file, action])
+            result_cache.invalidate('profiler')
         except Exception as ex:
             dialog_msg = 'Stop failed!'.format(ex)
             
     elif action=="purge":
         try:
-            dialog_msg = subprocess.check_output("{} {}".format(profiler_ctl_file, action), shell=True)
+            dialog_msg = command_output([profiler_ctl_file, action])
+            result_cache.invalidate('profiler')
         except Exception as ex:
             dialog_msg = 'Report purge failed!'.format(ex)
         
@@ -1289,69 +1752,36 @@ def profiler_purge():
 def home_page():
 
     global draw
-    global oled
+    global display
     global wlanpi_ver
-    global current_mode
     global hostname
     global drawing_in_progress
     global display_state
-    global ethtool_file
+    global sampler
     
     drawing_in_progress = True
     display_state = 'page'
 
-    if current_mode == "wconsole":
-        # get wlan0 IP
-        if_name = "wlan0"
-        mode_name = "Wi-Fi Console"
-    
-    elif current_mode == "hotspot":
-        # get wlan0 IP
-        if_name = "wlan0"
-        mode_name = "Hotspot"
-    
-    else:
-        # get eth0 IP
-        if_name = "eth0"
-        mode_name = ""
-        
-        # get Ethernet port info (...for Jerry)
-        try:
-            #eth_speed_info  = subprocess.check_output("{} eth0  | grep -i speed | cut -d' ' -f2".format(ethtool_file), shell=True)
-            eth_info = subprocess.check_output('{} eth0'.format(ethtool_file), shell=True)
-            speed_re = re.findall('Speed\: (.*\/s)', eth_info, re.MULTILINE)
-            duplex_re = re.findall('Duplex\: (.*)', eth_info, re.MULTILINE)
-            link_re = re.findall('Link detected\: (.*)', eth_info, re.MULTILINE)
-                      
-            if (speed_re is None) or (duplex_re is None) or (link_re is None):
-                # Our pattern matching failed...silently fail....we must set up logging at some stage
-                mode_name = ""
-            elif (link_re[0] == "no"):
-                # Ethernet link is down, report msg instead of speed & duplex
-                mode_name = "Link down" 
-            else:
-                # Report the speed & duplex messages from ethtool
-                mode_name = "{} {}".format(speed_re[0], duplex_re[0])
-            
-        except Exception as ex:
-            # Something went wrong...show nothing
-            mode_name = ""
+    # interface & link info is collected in the background (see collect_home())
+    (if_name, ip_addr, mode_name) = sampler.get('home', ("", "", ""))
     
-    ip_addr_cmd = "ip addr show {} | grep -Po \'inet \K[\d.]+\'".format(if_name) 
+    # the home page is redrawn when its data changes - re-use the frame if unchanged
+    cache_key = ('home', str(wlanpi_ver), str(hostname), if_name, str(ip_addr), str(mode_name))
+
+    if frame_cache.restore(cache_key, image):
+        display.push(image)
+        drawing_in_progress = False
+        return
 
-    try:
-        ip_addr = subprocess.check_output(ip_addr_cmd, shell=True)
-    except Exception as ex:
-        ip_addr = "No IP Addr"
-    
     clear_display()
-    draw.text((0,1),str(wlanpi_ver),font=smartFont,fill=255)
-    draw.text((0,11),str(hostname),font=font11,fill=255)
-    draw.text((95,20),if_name,font=smartFont,fill=255)
-    draw.text((0,29),str(ip_addr),font=font14,fill=255)
-    draw.text((0,43),str(mode_name),font=smartFont,fill=255)
+    draw_text((0,1),str(wlanpi_ver),font=smartFont,fill=255)
+    draw_text((0,11),str(hostname),font=font11,fill=255)
+    draw_text((95,20),if_name,font=smartFont,fill=255)
+    draw_text((0,29),str(ip_addr),font=font14,fill=255)
+    draw_text((0,43),str(mode_name),font=smartFont,fill=255)
     back_button('Menu')
-    oled.drawImage(image)
+    frame_cache.store(cache_key, image)
+    display.push(image)
     
     drawing_in_progress = False
     return 
@@ -1360,115 +1790,139 @@ def home_page():
 # other functions here
 #######################
 
-def menu_down():
+def render(page):
+
+    '''
+    Run draw_page() or a dispatcher, timing it (see render_time)
+    '''
+
+    global render_time
+
+    with render_time.time(page='menu' if page is draw_page else page.__name__):
+        page()
 
-    global current_menu_location
-    global menu
+def menu_down(steps=1):
+
+    global current_menu_node
     global current_scroll_selection
     global display_state
     
     # If we are in a table, scroll down (unless at bottom of list)
     if display_state == 'page':
-        current_scroll_selection +=1
+        current_scroll_selection += steps
         return
     
     # Menu not currently shown, do nothing
     if display_state != 'menu':
         return
 
-    # pop the last menu list item, increment & push back on
-    current_selection = current_menu_location.pop()
-    current_selection = current_selection +1
-    current_menu_location.append(current_selection)
+    # move to next item at this menu level (wraps around to top)
+    for step in range(steps):
+        current_menu_node = current_menu_node.next
     
-    draw_page()
+    render(draw_page)
     
 
-def menu_right():
+def menu_right(steps=1):
 
-    global current_menu_location
-    global menu
-    global option_number_selected
-    global option_selected
+    global current_menu_node
     global current_scroll_selection
     global display_state
     
     # If we are in a table, scroll up (unless at top of list)
     if display_state == 'page':
-        if current_scroll_selection == 0:
-            return
-        else:
-            current_scroll_selection -=1
-            return
+        current_scroll_selection = max(0, current_scroll_selection - steps)
+        return
     
-    # Check if the "action" field at the current location is an 
-    # array or a function.
+    # Check if the current menu item is a sub-menu or a function.
     
-    # if we have an array, append the current selection and re-draw menu
-    if (type(option_selected) is list):
-        current_menu_location.append(0)
-        draw_page()
-    elif (isinstance(option_selected, types.FunctionType)):
+    # if we have a sub-menu, move to its first item and re-draw menu
+    if current_menu_node.is_submenu:
+        current_menu_node = current_menu_node.children[0]
+        render(draw_page)
+    elif (isinstance(current_menu_node.action, types.FunctionType)):
     # if we have a function (dispatcher), execute it
         display_state = 'page'
-        option_selected()
+        page_enter()
+        render(current_menu_node.action)
 
 def menu_left():
 
-    global current_menu_location
-    global menu
-    global option_number_selected
-    global option_selected
+    global current_menu_node
     global current_scroll_selection
     global table_list_length
-    global result_cache
     global display_state
     global start_up
+    global option_selected
     
-    # If we're in a table we need to exit, reset table scroll counters, reset
-    # result cache and draw the menu for our current level
+    # If we're in a table we need to exit, reset table scroll counters, drop
+    # cached results of the page and draw the menu for our current level
     if display_state == 'page':
         current_scroll_selection = 0
         table_list_length = 0
         display_state = 'menu'
         display_state = 'menu'
-        draw_page()
-        result_cache = False
+        render(draw_page)
+        page_exit()
         return
 
     if display_state == 'menu':
 
         # check to make sure we aren't at top of menu structure
-        if len(current_menu_location) == 1:
+        if current_menu_node.depth == 1:
             # If we're at the top and hit exit (back) button, revert to start-up state
             start_up = True
+            option_selected = home_page
             home_page()
         else:
-            current_menu_location.pop()
-            draw_page()
+            current_menu_node = current_menu_node.parent
+            render(draw_page)
     else:
         display_state = 'menu'
-        draw_page()
+        render(draw_page)
 
 def go_up():
 
     # executed when the back navigation item is selected
 
-    global current_menu_location
+    global current_menu_node
     global display_state
     
     display_state = 'menu'
     
-    if len(current_menu_location) == 1:
+    if current_menu_node.depth == 1:
         # we must be at top level, do nothing
         return
     else:
-        # Take off last level of menu structure to go up
-        # Set index to 0 so top menu item selected
-        current_menu_location.pop()
-        current_menu_location[-1] = 0
+        # Go up a level of menu structure, with top menu item selected
+        current_menu_node = current_menu_node.parent.siblings[0]
         
-        draw_page()
+        render(draw_page)
+
+##############################
+# page entry/exit data control
+##############################
+
+def page_enter():
+
+    '''
+    Ask for the background data of the page being entered to be refreshed
+    '''
+
+    for collector in page_collectors.get(current_menu_node.action, []):
+        sampler.refresh(collector)
+
+def page_exit():
+
+    '''
+    Drop cached results of the page being left, so it shows fresh data
+    next time it's entered
+    '''
+
+    global result_cache
+
+    for collector in page_collectors.get(current_menu_node.action, []):
+        result_cache.invalidate(collector)
 
 #######################
 # menu structure here
@@ -1487,6 +1941,7 @@ menu = [
             { "name": "1.Summary", "action": show_summary},
             { "name": "2.Date/Time", "action": show_date},
             { "name": "3.Version", "action": show_menu_ver},
+            { "name": "4.Diagnostics", "action": show_diagnostics},
         ]
       },
       { "name": "3.Apps", "action": [
@@ -1537,160 +1992,724 @@ menu = [
       }
 ]
 
-# update menu options data structure if we're in non-classic mode    
-if current_mode == "wconsole":
-    switcher_dispatcher = wconsole_switcher
-    home_page_name = "Wi-Fi Console"
-
-if current_mode == "hotspot":
-    switcher_dispatcher = hotspot_switcher
-    home_page_name = "Hotspot"
-
-if current_mode != "classic":
-    menu[2] = { "name": "3.Actions", "action": [
-                { "name": "1.Classic Mode",   "action": [
-                    { "name": "Cancel", "action": go_up},
-                    { "name": "Confirm", "action": switcher_dispatcher},
-                    ]
-                },
-                { "name": "2.Reboot",   "action": [
-                    { "name": "Cancel", "action": go_up},
-                    { "name": "Confirm", "action": reboot},
-                    ]
-                },
-            ]
-          }
-    
-    menu.pop(3)
-
-# Set up handlers to process key presses
-def receive_signal(signum, stack):
-
-    global pageSleepCountdown
-    global pageSleep
-    global current_menu_location
+# cached results used by each page (see result_cache), which are also the
+# names of the background sampler collectors (if any) for the page
+page_collectors = {
+    home_page:            ['home'],
+    show_summary:         ['ip', 'system'],
+    show_interfaces:      ['interfaces'],
+    show_wlan_interfaces: ['interfaces', 'wlan'],
+    show_usb:             ['usb'],
+    kismet_status:        ['kismet'],
+    bettercap_status:     ['bettercap'],
+    profiler_status:      ['profiler'],
+}
+
+# When each page is redrawn while it is shown (see schedule_refresh()):
+#   STATIC    drawn once, when it is selected (menus & pages not listed here)
+#   ON_EVENT  redrawn when data it shows (see page_collectors) changes
+#   CLOCK     redrawn on each second boundary of the wall clock
+#   number    redrawn every that many seconds
+STATIC = 'static'
+ON_EVENT = 'event'
+CLOCK = 'clock'
+
+page_refresh = {
+    home_page:            ON_EVENT,
+    show_summary:         ON_EVENT,
+    show_interfaces:      ON_EVENT,
+    show_wlan_interfaces: ON_EVENT,
+    show_usb:             ON_EVENT,
+    show_ufw:             10,
+    show_date:            CLOCK,
+    show_diagnostics:     1,
+    kismet_status:        5,
+    bettercap_status:     5,
+    profiler_status:      5,
+}
+
+# update menu options data structure if we're in non-classic mode & compile
+# it in to a tree of nodes for fast navigation
+def build_menu():
+
+    global home_page_name
+    global menu_tree
+    global current_menu_node
+
+    mode_menu = list(menu)
+
+    if current_mode == "wconsole":
+        switcher_dispatcher = wconsole_switcher
+        home_page_name = "Wi-Fi Console"
+
+    if current_mode == "hotspot":
+        switcher_dispatcher = hotspot_switcher
+        home_page_name = "Hotspot"
+
+    if current_mode != "classic":
+        mode_menu[2] = { "name": "3.Actions", "action": [
+                    { "name": "1.Classic Mode",   "action": [
+                        { "name": "Cancel", "action": go_up},
+                        { "name": "Confirm", "action": switcher_dispatcher},
+                        ]
+                    },
+                    { "name": "2.Reboot",   "action": [
+                        { "name": "Cancel", "action": go_up},
+                        { "name": "Confirm", "action": reboot},
+                        ]
+                    },
+                ]
+              }
+        
+        mode_menu.pop(3)
+
+    menu_tree = compile_menu(mode_menu, home_page_name)
+    current_menu_node = menu_tree.first
+
+# compiled menu (built by boot())
+menu_tree = None
+
+##########################################
+# Key press handling, refresh & screensaver
+##########################################
+
+# Button presses (signals) & timers are handled by an event loop (see
+# event_loop.py), which is set up in main()
+event_loop = None
+refresh_timer = None          # next page refresh (None when not due)
+screensaver_timer = None      # when screen will be blanked if no key pressed
+metrics_timer = None          # when metrics file is next written
+clock_margin = 0.005          # CLOCK pages are redrawn just after the second
+
+def write_metrics():
+
+    '''
+    Write the metrics file (see metrics.py) every metrics_interval seconds
+    while the screen is on
+    '''
+
+    global metrics_timer
+
+    metrics_timer = None
+
+    if metrics_file:
+        try:
+            metrics.write_textfile(metrics_file)
+        except (IOError, OSError):
+            pass
+
+    if not (screen_cleared or shutdown_in_progress):
+        metrics_timer = event_loop.call_later(metrics_interval, write_metrics)
+
+def current_page():
+
+    '''
+    The dispatcher of the page shown (None if a menu is shown)
+    '''
+
+    if display_state == 'menu':
+        return None
+
+    # if we've just booted up, home page is shown
+    if start_up:
+        return home_page
+
+    return option_selected
+
+def schedule_refresh(deadline=None):
+
+    '''
+    Schedule the next redraw of the current page as its refresh policy says
+    (see page_refresh). 'deadline' is when the last redraw was due, so that
+    interval pages are redrawn on a fixed period.
+    '''
+
+    global refresh_timer
+
+    if refresh_timer is not None:
+        refresh_timer.cancel()
+        refresh_timer = None
+
+    if shutdown_in_progress or screen_cleared:
+        sampler.watch([])
+        return
+
+    # the collectors of the page shown keep running: event driven pages
+    # don't read their data again until it changes
+    sampler.watch(page_collectors.get(current_page(), []))
+
+    policy = page_refresh.get(current_page(), STATIC)
+    now = monotonic()
+
+    # static & event driven pages have no timer
+    if policy in (STATIC, ON_EVENT):
+        return
+
+    if policy == CLOCK:
+        next_deadline = now + 1 - time.time() % 1 + clock_margin
+    else:
+        next_deadline = (now if deadline is None else deadline) + policy
+        if next_deadline < now:
+            next_deadline = now + policy
+
+    refresh_timer = event_loop.call_at(next_deadline, refresh_page, next_deadline)
+
+def page_data_changed(name):
+
+    '''
+    Sampler listener (runs on a collector thread): pass the change to the
+    event loop
+    '''
+
+    event_loop.call_soon_threadsafe(redraw_on_event, name)
+
+def redraw_on_event(name):
+
+    '''
+    Redraw the current page if it is event driven & shows the data changed
+    '''
+
+    if shutdown_in_progress or screen_cleared:
+        return
+
+    page = current_page()
+
+    if page_refresh.get(page, STATIC) == ON_EVENT and name in page_collectors.get(page, []):
+        start_refresh()
+
+def start_refresh(delay=0):
+
+    '''
+    Redraw the current page after 'delay' seconds (& from then on as its
+    refresh policy says)
+    '''
+
+    global refresh_timer
+
+    if refresh_timer is not None:
+        refresh_timer.cancel()
+
+    deadline = monotonic() + delay
+    refresh_timer = event_loop.call_at(deadline, refresh_page, deadline)
+
+def refresh_page(deadline):
+
+    '''
+    Re-draw the current menu or page & schedule the next refresh. Refreshes
+    stop while the screen is blank or shutting down (restarted by a key press)
+    '''
+
+    global refresh_timer
+    global option_selected
+
+    refresh_timer = None
+
+    if shutdown_in_progress or screen_cleared:
+        return
+
+    if not drawing_in_progress:
+        try:
+            # Draw a menu or execute current action (dispatcher)
+            if display_state != 'menu':
+                # no menu shown, so must be executing action. 
+                
+                # if we've just booted up, show home page
+                if start_up == True:
+                    option_selected = home_page
+                
+                # Re-run current action to refresh screen
+                render(option_selected)
+            else:
+                # lets try drawing our page (or refresh if already painted)
+                render(draw_page)
+        except IOError:
+            print ("Error")
+
+    schedule_refresh(deadline)
+
+def screen_saver():
+
+    '''
+    Blank the display to reduce screenburn (no key pressed for a while)
+    '''
+
+    global screen_cleared
+    global screensaver_timer
+    global refresh_timer
+    global metrics_timer
+
+    screensaver_timer = None
+
+    if not screen_cleared:
+        display.blank()
+        screen_cleared = True
+
+        # last metrics until the screen is woken
+        if metrics_timer is not None:
+            metrics_timer.cancel()
+        write_metrics()
+
+    # nothing more to do until a key is pressed
+    if refresh_timer is not None:
+        refresh_timer.cancel()
+        refresh_timer = None
+
+    sampler.watch([])
+
+def reset_screen_saver(now):
+
+    global screensaver_timer
+
+    if screensaver_timer is not None:
+        screensaver_timer.cancel()
+
+    screensaver_timer = event_loop.call_at(now + pageSleep, screen_saver)
+
+# Button presses are queued (with the time they happened) by key_signal()
+# and handled in batches by process_buttons(), so presses that arrive while
+# a page is being drawn are not lost
+button_queue = ButtonQueue()
+button_timer = None           # pending process_buttons() call
+button_keys = {
+    signal.SIGUSR1: 'down',   # Key 1 - Down key
+    signal.SIGUSR2: 'right',  # Key 2 - Right/Selection key
+    signal.SIGALRM: 'left',   # Key 3 - Left/Back key
+}
+
+def key_signal(signum, timestamp):
+
+    '''
+    Run from the event loop for each button signal received: just queue
+    the key press (handled once all pending signals have been queued)
+    '''
+
+    queue_key(button_keys[signum], timestamp)
+
+def queue_key(key, timestamp):
+
+    global button_timer
+
+    button_queue.put(key, timestamp)
+
+    if button_timer is None:
+        button_timer = event_loop.call_later(0, process_buttons)
+
+def process_buttons():
+
+    '''
+    Handle all queued key presses. Runs of the same key are handled as one
+    multi-step move with a single repaint.
+    '''
+
+    global button_timer
+
+    button_timer = None
+
+    # control socket key presses are answered by the next frame from here on
+    armed_waiters.extend(queued_waiters)
+    del queued_waiters[:]
+
+    for run in button_queue.drain():
+        key_pressed(run.key, run.count, run.last)
+
+def key_pressed(key, count, timestamp):
+
     global shutdown_in_progress
     global screen_cleared
-    global sig_fired
     global start_up
 
-    if (sig_fired):
-        # signal handler already in progress, ignore this one
-        return
-
-    #user pressed a button, reset the sleep counter
-    pageSleepCountdown = pageSleep 
+    #user pressed a button, reset the sleep countdown
+    reset_screen_saver(timestamp)
     
     start_up = False
     
-    if drawing_in_progress or shutdown_in_progress:
+    if shutdown_in_progress:
         return
     
-    # if display has been switched off to save screen, power back on and show home menu
+    # if display has been switched off to save screen, power back on and show
+    # home menu (the first key press only wakes the screen)
     if screen_cleared:
         screen_cleared = False
-        pageSleepCountdown = pageSleep
-        return
+        start_refresh()
+        write_metrics()
+        count -= 1
+        if count == 0:
+            return
     
-    # Key 1 pressed - Down key
-    if signum == signal.SIGUSR1:
-        sig_fired = True
-        menu_down()
-        sig_fired = False
+    scrolling = display_state == 'page' and key in ('down', 'right')
+
+    # Down key
+    if key == 'down':
+        menu_down(count)
+
+    # Right/Selection key
+    elif key == 'right':
+        if scrolling:
+            menu_right(count)
+        else:
+            # each press may move in to a sub-menu or run a dispatcher
+            for press in range(count):
+                menu_right()
+
+    # Left/Back key
+    elif key == 'left':
+        for press in range(count):
+            menu_left()
+
+    # scrolling a page only moves the scroll position: repaint it now.
+    # Otherwise the key has drawn a menu or page: refresh it as it says.
+    if scrolling:
+        start_refresh()
+    else:
+        schedule_refresh()
+
+##########################################
+# Control socket (see control_socket.py)
+##########################################
+
+# Key presses can also be injected, and the state & last frame read, over a
+# Unix domain socket. A key press request is answered when the display has
+# been updated after the key was handled, with the time taken.
+control_socket_file = '/run/wlanpi-oled/control.sock'
+control_server = None
+key_timeout = 5               # seconds to wait for a frame after a key press
+key_count_max = 10            # most presses of a key in one request
+queued_waiters = []           # key requests waiting for their key to be handled
+armed_waiters = []            # key requests waiting for the next frame
+
+def page_name():
+
+    '''
+    Name of what is shown: the dispatcher, or 'menu/' & the menu path
+    '''
+
+    if display_state != 'menu':
+        return getattr(option_selected, '__name__', str(option_selected))
+
+    names = []
+    node = current_menu_node
+    while node is not None and node.parent is not None:
+        names.insert(0, node.name)
+        node = node.parent
+
+    return 'menu/' + '/'.join(names)
+
+def control_key(connection, args):
+
+    usage = 'usage: key down|next|back [count]'
+
+    if not args or args[0] not in key_names:
+        connection.send({'ok': False, 'error': usage})
         return
-        
 
-    # Key 2 pressed - Right/Selection key
-    if signum == signal.SIGUSR2:
-        sig_fired = True    
-        menu_right()
-        sig_fired = False
+    try:
+        count = int(args[1]) if len(args) > 1 else 1
+    except ValueError:
+        connection.send({'ok': False, 'error': usage})
         return
 
-    # Key 3 pressed - Left/Back key
-    if signum == signal.SIGALRM:  
-        sig_fired = True
-        menu_left()
-        sig_fired = False
+    # (a client can't flood the button queue)
+    count = max(1, min(count, key_count_max))
+    now = monotonic()
+
+    for press in range(count):
+        queue_key(key_names[args[0]], now)
+
+    waiter = [connection, now, None]
+    waiter[2] = event_loop.call_later(key_timeout, key_timed_out, waiter)
+    queued_waiters.append(waiter)
+
+def key_timed_out(waiter):
+
+    for waiters in (queued_waiters, armed_waiters):
+        if waiter in waiters:
+            waiters.remove(waiter)
+
+    waiter[0].send({'ok': False, 'error': 'no frame after {}s'.format(key_timeout)})
+
+def frame_pushed(sent):
+
+    '''
+    Display listener: answer key presses waiting for a frame
+    '''
+
+    if not armed_waiters:
         return
 
+    now = monotonic()
+
+    for (connection, key_time, timer) in armed_waiters:
+        timer.cancel()
+        connection.send({
+            'ok': True,
+            'latency_ms': round((now - key_time) * 1000, 2),
+            'page': page_name(),
+            'display_state': display_state,
+            'bytes_sent': sent,
+        })
+
+    del armed_waiters[:]
+
+def control_state(connection, args):
+
+    connection.send({
+        'ok': True,
+        'display_state': display_state,
+        'page': page_name(),
+        'menu_path': list(current_menu_node.path),
+        'screen_cleared': screen_cleared,
+        'frames_pushed': display.frames_pushed,
+    })
+
+def control_frame(connection, args):
+
+    frame = display.last_frame or bytearray(width * height // 8)
+
+    connection.send({
+        'ok': True,
+        'width': width,
+        'height': height,
+        'frames_pushed': display.frames_pushed,
+        'data': base64.b64encode(bytes(frame)).decode('ascii'),
+    })
+
+control_handlers = {
+    'key': control_key,
+    'state': control_state,
+    'frame': control_frame,
+}
+
 ###############################################################################
 #
 # ****** MAIN *******
 #
 ###############################################################################
 
-# First time around (power-up), draw logo on display
-image0 = Image.open('wlanprologo.png').convert('1')
-oled.drawImage(image0)
-time.sleep(2)
-
-# Set signal handlers for button presses - these fire every time a button
-# is pressed
-signal.signal(signal.SIGUSR1, receive_signal)
-signal.signal(signal.SIGUSR2, receive_signal)
-signal.signal(signal.SIGALRM, receive_signal)
-
-##############################################################################
-# Constant 'while' loop to paint images on display or execute actions in
-# response to selections made with buttons. When any of the 3 WLANPi buttons
-# are pressed, I believe the signal handler takes over the Python interpreter
-# and executes the code associated with the button. The original flow continues
-# once the button press action has been completed. 
-# 
-# The current sleep period of the while loop is ignored when a button is 
-# pressed.
-# 
-# All global variables defined outside of the while loop are preserved and may 
-# read/set as required. The same variables are available for read/write even
-# when a button is pressed and an interrupt occurs: no additional thread or
-# interpreter with its own set of vars appears to be launched. For this reason,
-# vars may be used to signal between the main while loop and any button press
-# activity to indicate that processes such as screen paints are in progress.
-#
-# Despite the sample code suggesting threading is used I do not believe this
-# is the case, based on testing with variable scopes and checking for process
-# IDs when different parts of the script are executing.
-##############################################################################
-while True:
-    try:
-        
-        if shutdown_in_progress or screen_cleared or drawing_in_progress:
-            
-            # we don't really want to do anything at the moment, lets 
-            # nap and loop around
-            time.sleep(1)
-            continue
-        
-        # Draw a menu or execute current action (dispatcher)
-        if display_state != 'menu':
-            # no menu shown, so must be executing action. 
-            
-            # if we've just booted up, show home page
-            if start_up == True:
-                option_selected = home_page
-            
-             # Re-run current action to refresh screen
-            option_selected()
+# Time taken by each boot phase (see boot_timer.py) - reported on stderr if
+# run with --boot-timing
+boot_timer = BootTimer(timing_requested())
+boot_timer.mark('imports done')
+
+# Longest we wait for the home page data before drawing it anyway (seconds)
+home_page_wait = 2
+
+def boot():
+
+    '''
+    Start-up sequence: show the logo as soon as the display is up, then
+    load fonts, find the version/hostname & compile the menu concurrently
+    while the logo is shown. The home page is drawn as soon as all of that
+    & the first home page data are ready.
+    '''
+
+    global current_mode
+    global option_selected
+
+    # page data sources are created here rather than on import
+    with boot_timer.phase('data sources created'):
+        init_collectors()
+
+    # start the helper that runs external commands while we're still small
+    with boot_timer.phase('spawn server started'):
+        spawner.start()
+
+    with boot_timer.phase('hardware init'):
+        init_display()
+
+    # First time around (power-up), draw logo on display
+    with boot_timer.phase('splash pushed'):
+        image0 = Image.open('wlanprologo.png').convert('1')
+        display.push(image0)
+
+    current_mode = get_mode()
+
+    # Start collecting page data in the background, each at its own interval
+    # (seconds). Collectors that nobody is reading from are paused.
+    home_ready = threading.Event()
+
+    def home_collected(name):
+        if name == 'home':
+            home_ready.set()
+
+    sampler.listeners.append(home_collected)
+
+    sampler.add('home', collect_home, 2)
+    sampler.add('ip', get_ip, 2)
+    sampler.add('interfaces', collect_interfaces, 2, initial=False)
+    sampler.add('system', collect_system, 5, initial=False)
+    sampler.add('wlan', collect_wlan_interfaces, 10, initial=False)
+    # (USB hotplug events refresh the list straight away - see usb_hotplug())
+    sampler.add('usb', collect_usb, usb_inventory.max_age, initial=False)
+    sampler.start()
+
+    def timed(name, function):
+        def run():
+            with boot_timer.phase(name):
+                function()
+        return run
+
+    def get_ver_and_hostname():
+        global wlanpi_ver
+        global hostname
+        wlanpi_ver = get_wlanpi_ver()
+        hostname = get_hostname()
+
+    tasks = [
+        timed('load fonts', load_fonts),
+        timed('version & hostname', get_ver_and_hostname),
+        timed('compile menu', build_menu),
+    ]
+
+    threads = [ threading.Thread(target=task) for task in tasks ]
+
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    with boot_timer.phase('wait for start-up tasks'):
+        for thread in threads:
+            thread.join()
+
+    with boot_timer.phase('wait for home page data'):
+        home_ready.wait(home_page_wait)
+
+    with boot_timer.phase('first home page'):
+        option_selected = home_page
+        home_page()
+
+    boot_timer.mark('first frame')
+    boot_timer.report()
+
+def emulator_keys(fd):
+
+    '''
+    Run from the event loop when keys are typed on the emulator's stdin
+    '''
+
+    global backend
+    global event_loop
+
+    for key in backend.read_keys():
+        if key == 'quit':
+            event_loop.stop()
         else:
-            # lets try drawing our page (or refresh if already painted)
-            draw_page()
-        
-        # if screen timeout is zero, clear it if not already done (blank the 
-        # display to reduce screenburn)
-        if pageSleepCountdown == 0 and screen_cleared == False:
-            oled.clearDisplay()
-            screen_cleared = True
+            queue_key(key, monotonic())
 
-        pageSleepCountdown = pageSleepCountdown - 1
+def usb_hotplug(fd):
 
-        # have a nap before we start our next loop
-        time.sleep(1)
-        
+    '''
+    Run from the event loop when the kernel sends uevents: re-read the USB
+    device list now if a USB device was plugged in or removed
+    '''
+
+    global usb_inventory
+    global sampler
+
+    if usb_inventory.hotplug():
+        sampler.refresh('usb')
+
+def parse_args(argv):
+
+    parser = argparse.ArgumentParser(description='WLANPi NanoHat OLED menu system')
+    parser.add_argument('--display', choices=sorted(display_backends.backends),
+        default=os.environ.get('OLED_DISPLAY', 'bakebit'),
+        help='display backend (default: bakebit, the NanoHat OLED)')
+    parser.add_argument('--i2c-bus', type=int, default=0,
+        help='ssd1306: I2C bus number of the display (default: %(default)s)')
+    parser.add_argument('--fb-device', default='/dev/fb0',
+        help='fbdev: framebuffer device, or a file to stand in for one (default: %(default)s)')
+    parser.add_argument('--fb-geometry',
+        help='fbdev: WIDTHxHEIGHT[:LINE_LENGTH] instead of the geometry the driver reports')
+    parser.add_argument('--frames-dir',
+        help='headless/emulator: write each frame to an image file in this directory')
+    parser.add_argument('--frame-format', choices=['png', 'pbm'], default='png',
+        help='headless/emulator: frame image file format')
+    parser.add_argument('--metrics-file', default=metrics_file,
+        help='Prometheus textfile to write metrics to (default: %(default)s, "" for none)')
+    parser.add_argument('--control-socket', default=control_socket_file,
+        help='control socket path (default: %(default)s, "" for none)')
+    parser.add_argument('--boot-timing', action='store_true',
+        help='report start-up timing on stderr')
+
+    return parser.parse_args(argv)
+
+def main():
+
+    global event_loop
+    global display_backend
+    global display_options
+    global metrics_file
+    global control_server
+
+    args = parse_args(sys.argv[1:])
+    metrics_file = args.metrics_file
+    display_backend = args.display
+    display_options = {
+        'frames_dir': args.frames_dir,
+        'frame_format': args.frame_format,
+        'i2c_bus': args.i2c_bus,
+        'fb_device': args.fb_device,
+        'fb_geometry': args.fb_geometry,
+    }
+
+    boot()
+
+    ##############################################################################
+    # Buttons & timers are handled by an event loop. When any of the 3 WLANPi
+    # buttons are pressed, a signal is sent to us. The signal handler only
+    # records the signal; the loop then wakes up straight away (via the signal
+    # wakeup fd) and queues the key press for process_buttons(). This means a
+    # key press never interrupts a screen paint part way through, and is never
+    # lost because a screen paint was in progress.
+    #
+    # The current page is redrawn as its refresh policy says (page_refresh):
+    # never, on a timer, or when the data it shows changes. The screen is
+    # blanked by another timer pageSleep seconds after the last key press.
+    # While the screen is blank there are no timers, so the loop sleeps until
+    # the next button press.
+    ##############################################################################
+    event_loop = EventLoop()
+
+    # Set signal handlers for button presses - these fire every time a button
+    # is pressed
+    for signum in button_keys:
+        event_loop.add_signal(signum, key_signal)
+
+    # the emulator's keys are typed on stdin
+    if backend.input_fd is not None:
+        event_loop.add_reader(backend.input_fd, emulator_keys)
+
+    # USB devices plugged in or removed (kernel uevents)
+    if usb_inventory.monitor.available:
+        event_loop.add_reader(usb_inventory.monitor.fileno(), usb_hotplug)
+
+    # key presses, state & frames over the control socket
+    display.listeners.append(frame_pushed)
+
+    if args.control_socket:
+        try:
+            control_server = ControlServer(args.control_socket, event_loop, control_handlers)
+        except (OSError, IOError, socket.error) as ex:
+            sys.stderr.write('Control socket not available: {}\n'.format(ex))
+
+    # event driven pages are redrawn when their data changes
+    sampler.listeners.append(page_data_changed)
+
+    reset_screen_saver(monotonic())
+    schedule_refresh()
+    write_metrics()
+
+    try:
+        event_loop.run()
     except KeyboardInterrupt:
-        break
-    except IOError:
-        print ("Error")
+        pass
+    finally:
+        backend.close()
+        if control_server is not None:
+            control_server.close()
+
+if __name__ == '__main__':
+    main()
 
 '''
 Discounted ideas
@@ -0,0 +1,147 @@
+'''
+Start-up timing instrumentation.
+
+Records how long each phase of the boot sequence takes and when the first
+frames reach the display, in the spirit of 'python -X importtime'. Phases
+may run on different threads, so each is reported with its start offset as
+well as its duration. Offsets are measured from process start (taken from
+/proc/self/stat), so interpreter start-up & module imports are included in
+the time-to-first-frame figures.
+
+Enable with the --boot-timing command line option or by setting the
+environment variable OLED_BOOT_TIMING=1. The report is written to stderr:
+
+    boot: start [ms] | duration [ms] | phase
+    boot:        212 |            0 | imports done
+    boot:        213 |           41 | hardware init
+    boot:        254 |           18 | splash pushed
+    ...
+
+Usage:
+
+    timer = boot_timer.BootTimer(enabled=True)
+    with timer.phase('load fonts'):
+        load_fonts()
+    timer.mark('first frame')
+    timer.report()
+'''
+
+import os
+import sys
+import threading
+import time
+
+# use a monotonic clock where available (Python 3)
+monotonic = getattr(time, 'monotonic', time.time)
+
+
+def process_age():
+
+    '''
+    Return seconds since this process was started, or None if not known
+    '''
+
+    try:
+        with open('/proc/self/stat') as stat_file:
+            # skip past the command name, which may contain spaces
+            fields = stat_file.read().rsplit(')', 1)[1].split()
+        with open('/proc/uptime') as uptime_file:
+            uptime = float(uptime_file.read().split()[0])
+        start_ticks = int(fields[19])
+        return uptime - start_ticks / float(os.sysconf('SC_CLK_TCK'))
+    except (IOError, OSError, IndexError, ValueError):
+        return None
+
+
+def timing_requested(argv=None, environ=None):
+
+    '''
+    True if boot timing has been asked for on the command line or environment
+    '''
+
+    if argv is None:
+        argv = sys.argv
+    if environ is None:
+        environ = os.environ
+
+    return '--boot-timing' in argv or environ.get('OLED_BOOT_TIMING', '') not in ('', '0')
+
+
+class BootTimer(object):
+
+    '''
+    Collects (start, duration, phase name) records for the boot sequence
+    '''
+
+    def __init__(self, enabled=False):
+
+        self.enabled = enabled
+        self.records = []
+        self.lock = threading.Lock()
+
+        # offset of our clock from process start
+        self.origin = monotonic()
+        age = process_age()
+        if age is not None:
+            self.origin -= age
+
+    def elapsed(self):
+
+        return monotonic() - self.origin
+
+    def record(self, name, start, duration):
+
+        with self.lock:
+            self.records.append((start, duration, name))
+
+    def mark(self, name):
+
+        '''
+        Record a point in time (e.g. first frame on the display)
+        '''
+
+        self.record(name, self.elapsed(), 0.0)
+
+    def phase(self, name):
+
+        '''
+        Context manager that times a phase of the boot sequence
+        '''
+
+        return _Phase(self, name)
+
+    def report(self, stream=None):
+
+        if not self.enabled:
+            return
+
+        if stream is None:
+            stream = sys.stderr
+
+        with self.lock:
+            records = sorted(self.records)
+
+        stream.write('boot: start [ms] | duration [ms] | phase\n')
+        for start, duration, name in records:
+            stream.write('boot: {:10.0f} | {:12.0f} | {}\n'.format(
+                start * 1000, duration * 1000, name))
+        stream.flush()
+
+
+class _Phase(object):
+
+    def __init__(self, timer, name):
+
+        self.timer = timer
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+
+        self.start = self.timer.elapsed()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.timer.record(self.name, self.start, self.timer.elapsed() - self.start)
+        return False
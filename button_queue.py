@@ -0,0 +1,80 @@
+'''
+Queue of button presses with run coalescing.
+
+Button presses used to be acted on one at a time as they arrived, and any
+press that arrived while the display was busy (drawing a slow page, or
+already handling a press) was thrown away. Instead, each press is added to
+a bounded queue with the time it happened. When the queue is drained,
+consecutive presses of the same key are coalesced in to a single run, so
+that e.g. five Down presses can be handled as one five step move followed
+by a single repaint rather than five moves & five repaints.
+
+Usage:
+
+    buttons = button_queue.ButtonQueue()
+    buttons.put('down', timestamp)
+    for run in buttons.drain():
+        print(run.key, run.count)       # e.g. ('down', 5)
+'''
+
+from collections import deque, namedtuple
+
+
+class KeyRun(namedtuple('KeyRun', 'key count first last')):
+
+    '''
+    'count' consecutive presses of 'key', pressed between times first & last
+    '''
+
+
+class ButtonQueue(object):
+
+    '''
+    Bounded FIFO of (key, timestamp) button press events
+    '''
+
+    def __init__(self, max_events=64):
+
+        self.events = deque()
+        self.max_events = max_events
+
+        # presses accepted & presses lost because the queue was full
+        self.received = 0
+        self.dropped = 0
+
+    def __len__(self):
+
+        return len(self.events)
+
+    def put(self, key, timestamp):
+
+        '''
+        Add a key press. Returns False (& counts it as dropped) if full
+        '''
+
+        if len(self.events) >= self.max_events:
+            self.dropped += 1
+            return False
+
+        self.events.append((key, timestamp))
+        self.received += 1
+        return True
+
+    def drain(self):
+
+        '''
+        Remove all queued presses, returning them as a list of KeyRun
+        '''
+
+        runs = []
+
+        while self.events:
+
+            key, timestamp = self.events.popleft()
+
+            if runs and runs[-1].key == key:
+                runs[-1] = runs[-1]._replace(count=runs[-1].count + 1, last=timestamp)
+            else:
+                runs.append(KeyRun(key, 1, timestamp, timestamp))
+
+        return runs
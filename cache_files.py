@@ -0,0 +1,31 @@
+'''
+Where files derived from others are cached between runs.
+
+The glyph atlases of the fonts (glyph_atlas.py) & the index of usb.ids
+(usb_inventory.py) are each built once & kept in cache_dir, so that the
+next start-up can map or read them rather than build them again.
+'''
+
+import os
+import tempfile
+
+cache_dir = '/var/cache/wlanpi-oled'
+
+
+def writable_cache_dir():
+
+    '''
+    Return cache_dir (made if need be), or the temporary directory if it
+    can't be written to. None if neither can.
+    '''
+
+    for directory in (cache_dir, tempfile.gettempdir()):
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            if os.access(directory, os.W_OK):
+                return directory
+        except OSError:
+            pass
+
+    return None
@@ -0,0 +1,302 @@
+'''
+Local control socket for the display process.
+
+The menu can otherwise only be driven with the three buttons. The control
+socket is a Unix domain stream socket (only accessible to root by default)
+served from the display process' event loop. Requests are single lines of
+text; each gets a single line JSON reply:
+
+    key down|next|back [count]   press a key (count times, at most 10).
+                                 The reply is sent once the display has
+                                 been updated (or after 'key_timeout'
+                                 seconds) & gives the key-to-frame
+                                 latency & the page shown
+    state                        current display state, menu path & page
+    frame                        last frame pushed: width, height & the
+                                 row-major 1 bit per pixel image (base64)
+
+The latency benchmark replays a navigation script (keys separated by
+spaces or new lines: d/down, n/next, b/back) against a running display
+process and reports key-to-frame latency percentiles for each page:
+
+    python control_socket.py benchmark "b n n d n b" --repeat 20
+
+Other commands:
+
+    python control_socket.py key down
+    python control_socket.py state
+    python control_socket.py frame /tmp/frame.pbm
+'''
+
+import base64
+import json
+import os
+import socket
+import sys
+
+# default socket location
+socket_path = '/run/wlanpi-oled/control.sock'
+
+# key names accepted in requests & scripts
+key_names = {
+    'd': 'down',
+    'down': 'down',
+    'n': 'right',
+    'next': 'right',
+    'right': 'right',
+    'b': 'left',
+    'back': 'left',
+    'left': 'left',
+}
+
+max_request = 1024
+
+
+class ControlConnection(object):
+
+    '''
+    A client connection: buffers requests until a full line arrives
+    '''
+
+    def __init__(self, server, sock):
+
+        self.server = server
+        self.sock = sock
+        self.buffer = b''
+
+    def send(self, reply):
+
+        '''
+        Send a reply (a dict, sent as a line of JSON)
+        '''
+
+        if self.sock is None:
+            return
+
+        try:
+            self.sock.setblocking(True)
+            self.sock.sendall(json.dumps(reply).encode('utf-8') + b'\n')
+            self.sock.setblocking(False)
+        except socket.error:
+            self.close()
+
+    def readable(self, fd):
+
+        try:
+            data = self.sock.recv(4096)
+        except socket.error:
+            data = b''
+
+        if not data:
+            self.close()
+            return
+
+        self.buffer += data
+
+        while b'\n' in self.buffer:
+            (line, self.buffer) = self.buffer.split(b'\n', 1)
+            self.server.dispatch(self, line.decode('utf-8', 'replace').split())
+
+        if len(self.buffer) > max_request:
+            self.send({'ok': False, 'error': 'request too long'})
+            self.close()
+
+    def close(self):
+
+        if self.sock is not None:
+            self.server.loop.remove_reader(self.sock.fileno())
+            self.sock.close()
+            self.sock = None
+
+
+class ControlServer(object):
+
+    '''
+    Accepts control connections & passes requests to handlers:
+    handlers[command](connection, args) - the handler sends the reply
+    '''
+
+    def __init__(self, path, loop, handlers):
+
+        self.path = path
+        self.loop = loop
+        self.handlers = handlers
+
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        if os.path.exists(path):
+            os.unlink(path)
+
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+        umask = os.umask(0o077)
+        try:
+            self.sock.bind(path)
+        finally:
+            os.umask(umask)
+
+        self.sock.listen(4)
+        self.sock.setblocking(False)
+        loop.add_reader(self.sock.fileno(), self.accept)
+
+    def accept(self, fd):
+
+        try:
+            (sock, address) = self.sock.accept()
+        except socket.error:
+            return
+
+        sock.setblocking(False)
+        connection = ControlConnection(self, sock)
+        self.loop.add_reader(sock.fileno(), connection.readable)
+
+    def dispatch(self, connection, words):
+
+        if not words:
+            return
+
+        handler = self.handlers.get(words[0])
+
+        if handler is None:
+            connection.send({'ok': False, 'error': 'unknown command: {}'.format(words[0])})
+            return
+
+        try:
+            handler(connection, words[1:])
+        except Exception as ex:
+            connection.send({'ok': False, 'error': str(ex)})
+
+    def close(self):
+
+        self.loop.remove_reader(self.sock.fileno())
+        self.sock.close()
+
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+#########################
+# client side
+#########################
+
+class ControlClient(object):
+
+    '''
+    Sends requests to a display process' control socket
+    '''
+
+    def __init__(self, path=socket_path, timeout=10):
+
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(path)
+        self.buffer = b''
+
+    def request(self, line):
+
+        self.sock.sendall(line.encode('utf-8') + b'\n')
+
+        while b'\n' not in self.buffer:
+            data = self.sock.recv(65536)
+            if not data:
+                raise IOError('control socket closed')
+            self.buffer += data
+
+        (reply, self.buffer) = self.buffer.split(b'\n', 1)
+
+        return json.loads(reply.decode('utf-8'))
+
+    def close(self):
+
+        self.sock.close()
+
+
+def frame_pbm(reply):
+
+    '''
+    Return a 'frame' reply as a PBM (P4) image. PBM has 1 for black, so
+    the bits are inverted to show lit pixels as white.
+    '''
+
+    data = bytearray(base64.b64decode(reply['data']))
+
+    return ('P4\n{} {}\n'.format(reply['width'], reply['height']).encode('ascii') +
+        bytes(bytearray(byte ^ 0xff for byte in data)))
+
+
+def percentile(values, q):
+
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def benchmark(client, script, repeat=10):
+
+    '''
+    Replay the keys in script 'repeat' times & print key-to-frame latency
+    percentiles (ms) for each page reached
+    '''
+
+    keys = []
+    for word in script.split():
+        if word.lower() not in key_names:
+            raise ValueError('Unknown key in script: {}'.format(word))
+        keys.append(key_names[word.lower()])
+
+    latencies = {}
+    timeouts = 0
+
+    for run in range(repeat):
+        for key in keys:
+            reply = client.request('key ' + key)
+            if not reply.get('ok'):
+                timeouts += 1
+                continue
+            latencies.setdefault(reply['page'], []).append(reply['latency_ms'])
+
+    print('{} x {} keys{}'.format(repeat, len(keys),
+        ' ({} with no frame)'.format(timeouts) if timeouts else ''))
+    print('{:<36} {:>5} {:>8} {:>8} {:>8}'.format('page', 'keys', 'p50 ms', 'p95 ms', 'max ms'))
+
+    for page in sorted(latencies):
+        values = latencies[page]
+        print('{:<36} {:>5} {:>8.1f} {:>8.1f} {:>8.1f}'.format(page, len(values),
+            percentile(values, 0.5), percentile(values, 0.95), max(values)))
+
+
+if __name__ == '__main__':
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description='WLANPi OLED control socket client')
+    parser.add_argument('--socket', default=socket_path, help='control socket path')
+    parser.add_argument('--repeat', type=int, default=10, help='benchmark: times to replay script')
+    parser.add_argument('command', choices=['key', 'state', 'frame', 'benchmark'])
+    parser.add_argument('args', nargs='*')
+    args = parser.parse_args()
+
+    client = ControlClient(args.socket)
+
+    if args.command == 'benchmark':
+        script = ' '.join(args.args)
+        if os.path.isfile(script):
+            with open(script) as script_file:
+                script = script_file.read()
+        benchmark(client, script, args.repeat)
+
+    elif args.command == 'frame':
+        reply = client.request('frame')
+        if args.args:
+            with open(args.args[0], 'wb') as pbm:
+                pbm.write(frame_pbm(reply))
+        else:
+            print(json.dumps(reply))
+
+    else:
+        print(json.dumps(client.request(' '.join([args.command] + args.args))))
+
+    client.close()
@@ -0,0 +1,261 @@
+'''
+Display backends: where frames go & where key presses come from.
+
+The display process was written for a NanoHat attached to the unit, so
+nothing could be run (or profiled, or benchmarked) without one. A backend
+opens a display device (see display_devices.py) for the FrameDiff to write
+to. The available backends are:
+
+    bakebit     the NanoHat OLED, through the FriendlyARM bakebit_128_64_oled
+                driver (imported only when this backend is opened). Keys
+                are the three buttons, which signal the process.
+    ssd1306     the NanoHat OLED, through this project's own driver
+                (ssd1306_i2c.py: I2C_RDWR block transfers on /dev/i2c-N)
+    fbdev       a 1 bit per pixel Linux framebuffer, e.g. the NanoHat OLED
+                through the kernel's ssd1307fb driver (fbdev.py: frames
+                are written straight in to the memory mapped /dev/fbN). A
+                regular file can stand in for the framebuffer.
+    headless    no display: frames are kept in memory & optionally written
+                to a directory as PNG or PBM files. No keys (but signals
+                still work, e.g. kill -USR1 <pid> for Down).
+    emulator    as headless, but each frame is also drawn on the terminal
+                and keys are read from stdin: d = Down, n = Next (right
+                button), b = Back (left button), q = quit.
+
+Only the bakebit, ssd1306 & fbdev (on a real framebuffer) backends are
+'hardware': the others never shut down, reboot or switch the mode of the
+machine they run on.
+
+Usage:
+
+    backend = display_backends.open_backend('headless', frames_dir='/tmp/frames')
+    display = frame_diff.FrameDiff(backend.device)
+
+    python bakebit_nanohat_oled.py --display=emulator
+    python -m cProfile -s cumtime bakebit_nanohat_oled.py --display=headless
+'''
+
+import os
+import sys
+
+from display_devices import BakebitDevice, HeadlessDevice
+
+# emulator keys: key character -> button (as named in button_keys)
+emulator_keys = {
+    'd': 'down',
+    'n': 'right',
+    'b': 'left',
+}
+
+
+class BakebitBackend(object):
+
+    '''
+    The NanoHat OLED panel
+    '''
+
+    name = 'bakebit'
+    hardware = True
+    input_fd = None
+
+    def __init__(self, **options):
+
+        import bakebit_128_64_oled as oled
+
+        oled.init()
+        #Set display to normal mode (i.e non-inverse mode)
+        oled.setNormalDisplay()
+        oled.setHorizontalMode()
+
+        self.driver = oled
+        self.device = BakebitDevice(oled)
+
+    def close(self):
+
+        pass
+
+
+class SSD1306Backend(object):
+
+    '''
+    The NanoHat OLED panel, driven directly over /dev/i2c-N
+    '''
+
+    name = 'ssd1306'
+    hardware = True
+    input_fd = None
+
+    def __init__(self, i2c_bus=0, **options):
+
+        import ssd1306_i2c
+
+        self.bus = ssd1306_i2c.I2CBus(i2c_bus)
+        self.device = ssd1306_i2c.SSD1306(self.bus)
+        self.device.init()
+
+    def close(self):
+
+        self.bus.close()
+
+
+class FramebufferBackend(object):
+
+    '''
+    A Linux framebuffer device (or a file standing in for one), memory mapped
+    '''
+
+    name = 'fbdev'
+    input_fd = None
+
+    def __init__(self, fb_device='/dev/fb0', fb_geometry=None, **options):
+
+        import fbdev
+
+        (width, height, line_length) = (None, None, None)
+        if fb_geometry:
+            (width, height, line_length) = fbdev.parse_geometry(fb_geometry)
+
+        self.device = fbdev.Framebuffer(fb_device, width, height, line_length)
+        self.hardware = self.device.is_device
+
+    def close(self):
+
+        self.device.close()
+
+
+class HeadlessBackend(object):
+
+    '''
+    No panel: frames kept in memory (& written to frames_dir if given)
+    '''
+
+    name = 'headless'
+    hardware = False
+    input_fd = None
+
+    def __init__(self, frames_dir=None, frame_format='png', **options):
+
+        self.device = HeadlessDevice(frames_dir=frames_dir, frame_format=frame_format)
+
+    def close(self):
+
+        pass
+
+
+def text_frame(image):
+
+    '''
+    Return a frame as text, two pixel rows per line of text
+    '''
+
+    (width, height) = image.size
+    pixels = image.load()
+    chars = ' \'.:'
+    lines = []
+
+    for y in range(0, height, 2):
+        lines.append(''.join(chars[(1 if pixels[x, y] else 0) | (2 if pixels[x, y + 1] else 0)]
+            for x in range(width)))
+
+    return '\n'.join(lines)
+
+
+class TerminalDevice(HeadlessDevice):
+
+    '''
+    Headless device that also draws each frame on the terminal
+    '''
+
+    def __init__(self, output=None, **options):
+
+        HeadlessDevice.__init__(self, **options)
+        self.output = output or sys.stdout
+
+        # on a terminal, draw each frame over the last one
+        self.home = '\x1b[H\x1b[2J' if self.output.isatty() else ''
+
+    def end_frame(self):
+
+        HeadlessDevice.end_frame(self)
+
+        border = '+' + '-' * self.width + '+'
+        lines = [ '|' + line + '|' for line in text_frame(self.last_frame).split('\n') ]
+
+        self.output.write(self.home + '\n'.join([border] + lines + [border]) +
+            '\n[d]own [n]ext [b]ack [q]uit  frame {}\n'.format(self.frame_count))
+        self.output.flush()
+
+
+class EmulatorBackend(object):
+
+    '''
+    Frames drawn on the terminal & keys read from stdin
+    '''
+
+    name = 'emulator'
+    hardware = False
+
+    def __init__(self, frames_dir=None, frame_format='png', **options):
+
+        self.device = TerminalDevice(frames_dir=frames_dir, frame_format=frame_format)
+        self.input_fd = sys.stdin.fileno()
+        self.saved_terminal = None
+
+        # read keys as they are typed (no need to press return)
+        if os.isatty(self.input_fd):
+            import termios
+            import tty
+            self.saved_terminal = termios.tcgetattr(self.input_fd)
+            tty.setcbreak(self.input_fd)
+
+    def read_keys(self):
+
+        '''
+        Return the keys typed since the last call: button names, 'quit' for
+        q or end of input
+        '''
+
+        data = os.read(self.input_fd, 64)
+
+        if not data:
+            return ['quit']
+
+        keys = []
+
+        for char in data.decode('ascii', 'ignore').lower():
+            if char == 'q':
+                keys.append('quit')
+            elif char in emulator_keys:
+                keys.append(emulator_keys[char])
+
+        return keys
+
+    def close(self):
+
+        if self.saved_terminal is not None:
+            import termios
+            termios.tcsetattr(self.input_fd, termios.TCSADRAIN, self.saved_terminal)
+            self.saved_terminal = None
+
+
+backends = {
+    'bakebit': BakebitBackend,
+    'ssd1306': SSD1306Backend,
+    'fbdev': FramebufferBackend,
+    'headless': HeadlessBackend,
+    'emulator': EmulatorBackend,
+}
+
+
+def open_backend(name, **options):
+
+    '''
+    Open the named backend (options: frames_dir, frame_format, i2c_bus,
+    fb_device, fb_geometry)
+    '''
+
+    if name not in backends:
+        raise ValueError('Unknown display backend: {} (choose from {})'.format(
+            name, ', '.join(sorted(backends))))
+
+    return backends[name](**options)
@@ -0,0 +1,223 @@
+'''
+Display devices that accept page/column addressed writes for the 128x64
+SSD1306 OLED panel used on the NanoHat.
+
+The SSD1306 stores its image in 8 "pages", each page being an 8 pixel high
+band across the full width of the panel. Each byte written to the panel sets
+one column of 8 pixels in a page (bit 0 is the top pixel of the page). A
+device in this module only needs to support writing a run of column bytes
+into a single page starting at a given column - see frame_diff.py for the
+code that works out which runs need to be sent.
+
+end_frame() is called after the writes for each frame (or a clear) have
+been made, for devices that need to do something with a complete frame.
+
+HeadlessDevice stands in for the panel when there is no hardware (see
+display_backends.py): it keeps the panel RAM, turns it back in to an image
+at the end of each frame & keeps recent frames in memory, optionally
+writing each one to a PNG or PBM file.
+'''
+
+import os
+from collections import deque
+
+# SSD1306 command bytes used to set the write window in horizontal mode
+SET_COLUMN_ADDRESS = 0x21
+SET_PAGE_ADDRESS = 0x22
+
+# SSD1306 command bytes to switch the panel off & on (RAM is kept)
+DISPLAY_OFF = 0xAE
+DISPLAY_ON = 0xAF
+
+# I2C control byte that flags the following bytes as display data
+DATA_MODE = 0x40
+
+# bytes of command overhead to set up a write window (cmd + start + end) x 2
+WINDOW_COMMAND_BYTES = 6
+
+
+class BakebitDevice(object):
+
+    '''
+    Page/column addressed writes through the FriendlyARM
+    bakebit_128_64_oled driver module
+    '''
+
+    def __init__(self, driver, width=128, height=64, block_size=32):
+
+        self.driver = driver
+        self.width = width
+        self.height = height
+        self.block_size = block_size
+
+        # The vendor module keeps its smbus handle & panel address as module
+        # globals. If they are not there, fall back to per-byte sendData()
+        self.bus = getattr(driver, 'bus', None)
+        self.address = getattr(driver, 'address', 0x3c)
+
+    def write_region(self, page, column, data):
+
+        '''
+        Write the column bytes in data to the given page, starting at column
+        '''
+
+        send = self.driver.sendCommand
+
+        send(SET_COLUMN_ADDRESS)
+        send(column)
+        send(column + len(data) - 1)
+        send(SET_PAGE_ADDRESS)
+        send(page)
+        send(page)
+
+        if self.bus is None:
+            for byte in bytearray(data):
+                self.driver.sendData(byte)
+            return
+
+        for i in range(0, len(data), self.block_size):
+            self.bus.write_i2c_block_data(self.address, DATA_MODE,
+                list(bytearray(data[i:i + self.block_size])))
+
+    def clear(self):
+
+        '''
+        Blank the panel RAM
+        '''
+
+        self.driver.clearDisplay()
+
+    def power(self, on):
+
+        '''
+        Switch the panel on or off
+        '''
+
+        self.driver.sendCommand(DISPLAY_ON if on else DISPLAY_OFF)
+
+    def end_frame(self):
+
+        pass
+
+
+class CountingDevice(object):
+
+    '''
+    Stand-in for a real display that keeps a copy of the panel RAM and
+    counts the bytes that would have been sent over the I2C bus. Used to
+    measure the effect of frame differencing without any hardware.
+    '''
+
+    def __init__(self, width=128, height=64):
+
+        self.width = width
+        self.height = height
+        self.ram = bytearray(width * height // 8)
+        self.powered = True
+        self.writes = 0
+        self.data_bytes = 0
+        self.command_bytes = 0
+
+    @property
+    def bytes_sent(self):
+        return self.data_bytes + self.command_bytes
+
+    def write_region(self, page, column, data):
+
+        if column + len(data) > self.width or page >= self.height // 8:
+            raise ValueError('Write outside panel: page {} column {} length {}'.format(
+                page, column, len(data)))
+
+        start = page * self.width + column
+        self.ram[start:start + len(data)] = bytearray(data)
+
+        self.writes += 1
+        self.data_bytes += len(data)
+        self.command_bytes += WINDOW_COMMAND_BYTES
+
+    def clear(self):
+
+        self.ram = bytearray(len(self.ram))
+        self.writes += 1
+        self.data_bytes += len(self.ram)
+
+    def power(self, on):
+
+        self.powered = on
+        self.writes += 1
+        self.command_bytes += 1
+
+    def reset_counters(self):
+
+        self.writes = 0
+        self.data_bytes = 0
+        self.command_bytes = 0
+
+    def end_frame(self):
+
+        pass
+
+
+def panel_image(ram, width=128, height=64):
+
+    '''
+    Return a PIL mode '1' image of panel RAM (SSD1306 page/column bytes)
+    '''
+
+    from PIL import Image
+
+    row_bytes = width // 8
+    raw = bytearray(row_bytes * height)
+
+    for page in range(height // 8):
+        columns = ram[page * width:(page + 1) * width]
+        for x in range(width):
+            bits = columns[x]
+            if not bits:
+                continue
+            mask = 0x80 >> (x & 7)
+            index = page * 8 * row_bytes + (x >> 3)
+            for r in range(8):
+                if bits & (1 << r):
+                    raw[index + r * row_bytes] |= mask
+
+    return Image.frombytes('1', (width, height), bytes(raw))
+
+
+class HeadlessDevice(CountingDevice):
+
+    '''
+    Panel stand-in with no hardware: keeps the last 'keep' frames as images
+    & writes each frame to frames_dir (as frame-NNNNNN.png or .pbm) if given
+    '''
+
+    def __init__(self, width=128, height=64, frames_dir=None, frame_format='png', keep=16):
+
+        CountingDevice.__init__(self, width, height)
+
+        self.frames_dir = frames_dir
+        self.frame_format = frame_format
+        self.frames = deque(maxlen=keep)
+        self.frame_count = 0
+
+        if frames_dir is not None and not os.path.isdir(frames_dir):
+            os.makedirs(frames_dir)
+
+    @property
+    def last_frame(self):
+
+        return self.frames[-1] if self.frames else None
+
+    def end_frame(self):
+
+        if self.powered:
+            image = panel_image(self.ram, self.width, self.height)
+        else:
+            image = panel_image(bytearray(len(self.ram)), self.width, self.height)
+
+        self.frames.append(image)
+        self.frame_count += 1
+
+        if self.frames_dir is not None:
+            image.save(os.path.join(self.frames_dir,
+                'frame-{:06d}.{}'.format(self.frame_count, self.frame_format)))
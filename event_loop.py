@@ -0,0 +1,272 @@
+'''
+Minimal event loop for the display process.
+
+The main loop used to wake up every second (time.sleep(1)) whether or not
+there was anything to do, and button presses were handled re-entrantly in
+the signal handler, interrupting whatever the main loop was doing.
+
+Here, signal handlers only record the signal and return. The signal module
+also writes a byte to a wakeup pipe (signal.set_wakeup_fd()), so the loop
+(blocked in poll()) wakes immediately and runs the registered callback for
+the signal from the loop itself - never from inside a signal handler.
+On Python 3 the byte written to the pipe is the signal number, and one is
+written for every signal received, whereas the Python-level handler only
+runs once for several signals of the same kind that arrive close together.
+So there, signals are counted from the pipe rather than by the handler.
+
+Other file descriptors (e.g. stdin, sockets) can be watched too, with
+add_reader(), and other threads can ask for a callback to be run from the
+loop with call_soon_threadsafe(). Everything else is driven by timers, whose deadlines are kept on the
+monotonic clock. When no timers are pending the loop sleeps until the next
+signal, so an idle blanked screen costs no wakeups at all.
+
+Usage:
+
+    loop = event_loop.EventLoop()
+    loop.add_signal(signal.SIGUSR1, key_pressed)    # key_pressed(signum, timestamp)
+    timer = loop.call_later(1, refresh)
+    timer.cancel()
+    loop.run()
+'''
+
+import errno
+import fcntl
+import heapq
+import os
+import select
+import signal
+import sys
+import time
+from collections import deque
+
+# use a monotonic clock where available (Python 3)
+monotonic = getattr(time, 'monotonic', time.time)
+
+
+class Timer(object):
+
+    '''
+    A callback scheduled to run at a time on the monotonic clock
+    '''
+
+    def __init__(self, when, callback, args):
+
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+
+        self.cancelled = True
+
+    def __lt__(self, other):
+
+        return self.when < other.when
+
+
+def _set_nonblocking(fd):
+
+    flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+    fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
+
+class EventLoop(object):
+
+    '''
+    Runs signal callbacks & timers from a single poll() loop
+    '''
+
+    def __init__(self):
+
+        self.timers = []
+        self.signal_callbacks = {}
+        self.readers = {}
+        self.pending_calls = deque()
+        self.pending_signals = deque()
+        self.stopped = False
+
+        # wakeup pipe: the signal module writes to it when a signal arrives
+        self.wakeup_read, self.wakeup_write = os.pipe()
+        _set_nonblocking(self.wakeup_read)
+        _set_nonblocking(self.wakeup_write)
+
+        self.poll = select.poll()
+        self.poll.register(self.wakeup_read, select.POLLIN)
+
+        signal.set_wakeup_fd(self.wakeup_write)
+
+        # Python 3.5+ writes the signal number to the wakeup fd
+        self.numbered_wakeup = sys.version_info >= (3, 5)
+
+        # number of times the loop has woken up (for checking idle behaviour)
+        self.wakeups = 0
+
+        # timers run more than overrun_limit seconds late (the loop was
+        # busy, e.g. drawing a slow page, when they were due)
+        self.overrun_limit = 0.1
+        self.overruns = 0
+
+    def close(self):
+
+        signal.set_wakeup_fd(-1)
+        os.close(self.wakeup_read)
+        os.close(self.wakeup_write)
+
+    def add_signal(self, signum, callback):
+
+        '''
+        Run callback(signum, timestamp) from the loop each time signum is
+        received (timestamp is monotonic clock time of the signal)
+        '''
+
+        self.signal_callbacks[signum] = callback
+        signal.signal(signum, self._signal_handler)
+
+    def add_reader(self, fd, callback):
+
+        '''
+        Run callback(fd) from the loop whenever fd is readable
+        '''
+
+        self.readers[fd] = callback
+        self.poll.register(fd, select.POLLIN)
+
+    def remove_reader(self, fd):
+
+        if self.readers.pop(fd, None) is not None:
+            self.poll.unregister(fd)
+
+    def _signal_handler(self, signum, frame):
+
+        # keep this short: just note the signal (deque append is atomic)
+        if not self.numbered_wakeup:
+            self.pending_signals.append((signum, monotonic()))
+
+    def call_at(self, when, callback, *args):
+
+        '''
+        Run callback(*args) at 'when' on the monotonic clock
+        '''
+
+        timer = Timer(when, callback, args)
+        heapq.heappush(self.timers, timer)
+        return timer
+
+    def call_later(self, delay, callback, *args):
+
+        '''
+        Run callback(*args) after 'delay' seconds
+        '''
+
+        return self.call_at(monotonic() + delay, callback, *args)
+
+    def call_soon_threadsafe(self, callback, *args):
+
+        '''
+        Run callback(*args) from the loop as soon as possible (may be called
+        from any thread)
+        '''
+
+        self.pending_calls.append((callback, args))
+        self._wake()
+
+    def _wake(self):
+
+        # a 0 byte is not taken as a signal number by _drain_wakeup()
+        try:
+            os.write(self.wakeup_write, b'\0')
+        except OSError:
+            pass
+
+    def stop(self):
+
+        self.stopped = True
+        self._wake()
+
+    def _timeout(self):
+
+        '''
+        Milliseconds until the next timer is due (None: no timers)
+        '''
+
+        while self.timers and self.timers[0].cancelled:
+            heapq.heappop(self.timers)
+
+        if not self.timers:
+            return None
+
+        return max(0, int((self.timers[0].when - monotonic()) * 1000 + 0.999))
+
+    def _drain_wakeup(self):
+
+        data = b''
+
+        try:
+            while True:
+                chunk = os.read(self.wakeup_read, 512)
+                if not chunk:
+                    break
+                data += chunk
+        except OSError as ex:
+            if ex.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+
+        if self.numbered_wakeup:
+            now = monotonic()
+            for signum in bytearray(data):
+                if signum in self.signal_callbacks:
+                    self.pending_signals.append((signum, now))
+
+    def run_once(self):
+
+        '''
+        Wait for a signal or the next timer, then run whatever is due
+        '''
+
+        ready = []
+
+        if not self.pending_signals and not self.pending_calls:
+            try:
+                ready = self.poll.poll(self._timeout())
+            except (select.error, OSError, IOError) as ex:
+                # Python 2 does not restart poll() after a signal
+                if ex.args[0] != errno.EINTR:
+                    raise
+
+        for fd, events in ready:
+            if fd == self.wakeup_read:
+                self._drain_wakeup()
+
+        self.wakeups += 1
+
+        while self.pending_signals:
+            signum, timestamp = self.pending_signals.popleft()
+            callback = self.signal_callbacks.get(signum)
+            if callback is not None:
+                callback(signum, timestamp)
+
+        for fd, events in ready:
+            callback = self.readers.get(fd)
+            if callback is not None:
+                callback(fd)
+
+        while self.pending_calls:
+            callback, args = self.pending_calls.popleft()
+            callback(*args)
+
+        now = monotonic()
+
+        while self.timers and self.timers[0].when <= now:
+            timer = heapq.heappop(self.timers)
+            if not timer.cancelled:
+                if now - timer.when > self.overrun_limit:
+                    self.overruns += 1
+                timer.callback(*timer.args)
+
+    def run(self):
+
+        self.stopped = False
+
+        while not self.stopped:
+            self.run_once()
@@ -0,0 +1,153 @@
+'''
+Concurrent fan-out of independent probes with a deadline.
+
+Gathering the data for a page can mean several independent probes (reading
+from the kernel, running a command...). Run one after the other, the page
+takes as long as all of them put together. FanOut runs probes on a small
+pool of worker threads so that they overlap; a probe that is still running
+is never started a second time. The page deadline (drawing whatever is
+ready, with placeholders for late probes) is applied by the sampler, see
+Sampler.wait_for() in sampler.py.
+
+Usage:
+
+    pool = fanout.FanOut(workers=4)
+
+    # run a probe in the background & be called back when it's done
+    pool.submit('usb', collect_usb, callback=publish)
+'''
+
+import threading
+import time
+
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+# use a monotonic clock where available (Python 3)
+monotonic = getattr(time, 'monotonic', time.time)
+
+
+class Probe(object):
+
+    '''
+    A single run of a probe function
+    '''
+
+    def __init__(self, name, function, args=()):
+
+        self.name = name
+        self.function = function
+        self.args = args
+        self.callbacks = []
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.started = monotonic()
+        self.finished = None
+
+    def run(self):
+
+        try:
+            self.result = self.function(*self.args)
+        except Exception as ex:
+            self.error = ex
+
+        self.finished = monotonic()
+
+    @property
+    def duration(self):
+
+        if self.finished is None:
+            return None
+        return self.finished - self.started
+
+
+class FanOut(object):
+
+    '''
+    Runs probes concurrently on a pool of (daemon) worker threads
+    '''
+
+    def __init__(self, workers=4, name='fanout'):
+
+        self.workers = workers
+        self.name = name
+        self.tasks = Queue()
+        self.threads = []
+        self.lock = threading.Lock()
+
+        # probes currently queued or running
+        self.in_flight = {}
+
+    def _start_worker(self):
+
+        thread = threading.Thread(target=self._worker,
+            name='{}-{}'.format(self.name, len(self.threads)))
+        thread.daemon = True
+        thread.start()
+        self.threads.append(thread)
+
+    def _worker(self):
+
+        while True:
+
+            probe = self.tasks.get()
+            probe.run()
+
+            with self.lock:
+                if self.in_flight.get(probe.name) is probe:
+                    del self.in_flight[probe.name]
+                callbacks = list(probe.callbacks)
+
+            probe.done.set()
+
+            for callback in callbacks:
+                callback(probe)
+
+    def submit(self, name, function, args=(), callback=None):
+
+        '''
+        Start a probe (unless one of the same name is already running) &
+        return it. callback(probe) is called on the worker thread when done.
+        '''
+
+        with self.lock:
+
+            probe = self.in_flight.get(name)
+
+            if probe is None:
+                probe = Probe(name, function, args)
+                self.in_flight[name] = probe
+                self.tasks.put(probe)
+
+                # workers are started as needed, up to the pool size
+                if len(self.threads) < min(self.workers, len(self.in_flight)):
+                    self._start_worker()
+
+            if callback is not None:
+                probe.callbacks.append(callback)
+
+        return probe
+
+
+if __name__ == '__main__':
+
+    # demo: eight 0.3s probes take ~0.3s rather than 2.4s, & submitting a
+    # probe that is still running does not start it again
+    pool = FanOut(workers=8)
+
+    def probe(value, delay):
+        time.sleep(delay)
+        return value
+
+    start = monotonic()
+    probes = [ pool.submit('probe{}'.format(n), probe, (n, 0.3)) for n in range(8) ]
+    again = pool.submit('probe0', probe, (0, 0.3))
+
+    for running in probes:
+        running.done.wait()
+
+    print('8 probes: {:.2f}s, resubmitted probe shared: {}, results {}'.format(
+        monotonic() - start, again is probes[0], [ running.result for running in probes ]))
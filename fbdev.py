@@ -0,0 +1,278 @@
+'''
+Linux framebuffer (fbdev) display device.
+
+Some builds drive the NanoHat panel with the kernel's ssd1307fb driver,
+which exposes it as /dev/fbN: a 1 bit per pixel framebuffer that the
+driver copies to the panel itself. Sending frames over I2C from Python as
+well would only duplicate that work. Framebuffer maps the fb device's
+memory & frames are written straight into the mapping.
+
+The framebuffer is row-major like a PIL mode '1' image buffer, but
+ssd1307fb (like most mono fbdev drivers) has the leftmost pixel of each
+byte in the least significant bit, so each byte is bit reversed on the
+way in (a single bytearray.translate(), which also inverts the bits for
+drivers with a MONO01 visual, i.e. 1 = black). Rows may be padded: each
+starts 'line_length' bytes after the last.
+
+The geometry (width, height, line length) is read with the
+FBIOGET_VSCREENINFO & FBIOGET_FSCREENINFO ioctls, unless given. Given an
+existing regular file instead of a device, the geometry defaults to a
+packed 128x64 panel & the file is grown to fit, so the device can be tested
+without a framebuffer:
+
+    python fbdev.py [file]      # write frames through FrameDiff & check them
+
+Framebuffer has the row-major write_rows() interface that FrameDiff uses
+for devices with 'row_major' set, plus clear()/power()/end_frame().
+
+Usage:
+
+    fb = fbdev.Framebuffer('/dev/fb0')
+    display = frame_diff.FrameDiff(fb)
+'''
+
+import errno
+import fcntl
+import mmap
+import os
+import stat
+import struct
+import sys
+
+# framebuffer ioctls (linux/fb.h)
+FBIOGET_VSCREENINFO = 0x4600
+FBIOGET_FSCREENINFO = 0x4602
+FBIOBLANK = 0x4611
+
+FB_BLANK_UNBLANK = 0
+FB_BLANK_POWERDOWN = 4
+
+# fb_fix_screeninfo.visual for monochrome framebuffers
+FB_VISUAL_MONO01 = 0    # 1 = black
+FB_VISUAL_MONO10 = 1    # 1 = white (ssd1307fb)
+
+# leading fields of struct fb_var_screeninfo (160 bytes): xres, yres,
+# xres_virtual, yres_virtual, xoffset, yoffset, bits_per_pixel
+var_screeninfo = struct.Struct('=7I')
+var_screeninfo_size = 160
+
+# leading fields of struct fb_fix_screeninfo, up to line_length: id,
+# smem_start, smem_len, type, type_aux, visual, xpanstep, ypanstep,
+# ywrapstep, line_length (native alignment - smem_start is an unsigned long)
+fix_screeninfo = struct.Struct('@16sLIIII3HI')
+fix_screeninfo_size = 80
+
+# Python 2's mmap only takes str for slice assignment; Python 3's takes the
+# bytearray as it is (no copy)
+if sys.version_info[0] < 3:
+    as_buffer = bytes
+else:
+    as_buffer = lambda data: data
+
+
+def _byte_table(reverse, invert):
+
+    '''
+    translate() table: each byte value with its bits reversed and/or
+    inverted
+    '''
+
+    table = bytearray(256)
+
+    for value in range(256):
+        out = value
+        if reverse:
+            out = 0
+            for bit in range(8):
+                if value & (1 << bit):
+                    out |= 0x80 >> bit
+        if invert:
+            out ^= 0xff
+        table[value] = out
+
+    return bytes(table)
+
+
+def parse_geometry(text):
+
+    '''
+    Parse a geometry override: WIDTHxHEIGHT[:LINE_LENGTH]
+    '''
+
+    try:
+        (size, _, line_length) = text.partition(':')
+        (width, height) = [ int(value) for value in size.lower().split('x') ]
+        return (width, height, int(line_length) if line_length else None)
+    except ValueError:
+        raise ValueError('Bad framebuffer geometry: {} (expected WIDTHxHEIGHT[:LINE_LENGTH])'.format(text))
+
+
+class Framebuffer(object):
+
+    '''
+    A 1 bit per pixel framebuffer (or a file standing in for one), memory
+    mapped
+    '''
+
+    row_major = True
+
+    def __init__(self, path='/dev/fb0', width=None, height=None, line_length=None,
+            lsb_first=True):
+
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR)
+        self.is_device = stat.S_ISCHR(os.fstat(self.fd).st_mode)
+        self.powered = True
+
+        visual = FB_VISUAL_MONO10
+
+        if self.is_device:
+            (fb_width, fb_height, bits_per_pixel, fb_line_length, visual) = self._screeninfo()
+            if bits_per_pixel != 1:
+                os.close(self.fd)
+                raise ValueError('{}: {} bits per pixel, only 1 is supported'.format(
+                    path, bits_per_pixel))
+        else:
+            (fb_width, fb_height, fb_line_length) = (128, 64, None)
+
+        self.width = width or fb_width
+        self.height = height or fb_height
+        self.line_length = line_length or fb_line_length or (self.width + 7) // 8
+        self.row_bytes = (self.width + 7) // 8
+
+        if self.line_length < self.row_bytes:
+            os.close(self.fd)
+            raise ValueError('{}: line length {} is too short for {} pixels'.format(
+                path, self.line_length, self.width))
+
+        self.size = self.line_length * self.height
+        self.invert = visual == FB_VISUAL_MONO01
+        self.table = _byte_table(lsb_first, self.invert)
+
+        if not self.is_device and os.fstat(self.fd).st_size < self.size:
+            os.ftruncate(self.fd, self.size)
+
+        self.map = mmap.mmap(self.fd, self.size, mmap.MAP_SHARED,
+            mmap.PROT_READ | mmap.PROT_WRITE)
+
+    def _screeninfo(self):
+
+        '''
+        Width, height, bits per pixel, line length & visual from the driver
+        '''
+
+        var = fcntl.ioctl(self.fd, FBIOGET_VSCREENINFO, b'\0' * var_screeninfo_size)
+        (xres, yres, xres_virtual, yres_virtual, xoffset, yoffset,
+            bits_per_pixel) = var_screeninfo.unpack_from(var)
+
+        fix = fcntl.ioctl(self.fd, FBIOGET_FSCREENINFO, b'\0' * fix_screeninfo_size)
+        fields = fix_screeninfo.unpack_from(fix)
+        (visual, line_length) = (fields[5], fields[9])
+
+        return (xres, yres, bits_per_pixel, line_length, visual)
+
+    def write_rows(self, row, data):
+
+        '''
+        Write rows of a PIL mode '1' image buffer (row_bytes per row) in to
+        the framebuffer, starting at the given row
+        '''
+
+        data = data.translate(self.table)
+        row_bytes = self.row_bytes
+
+        if self.line_length == row_bytes:
+            start = row * row_bytes
+            self.map[start:start + len(data)] = as_buffer(data)
+            return
+
+        for i in range(0, len(data), row_bytes):
+            start = (row + i // row_bytes) * self.line_length
+            self.map[start:start + row_bytes] = as_buffer(data[i:i + row_bytes])
+
+    def read_image(self):
+
+        '''
+        Return the framebuffer contents as a PIL mode '1' image
+        '''
+
+        from PIL import Image
+
+        # the table reverses & inverts, so it is its own inverse
+        raw = bytearray()
+        for row in range(self.height):
+            start = row * self.line_length
+            raw += self.map[start:start + self.row_bytes]
+
+        return Image.frombytes('1', (self.width, self.height), bytes(raw.translate(self.table)))
+
+    def clear(self):
+
+        self.map[0:self.size] = (b'\xff' if self.invert else b'\0') * self.size
+
+    def power(self, on):
+
+        '''
+        Switch the panel on or off (no-op for a regular file)
+        '''
+
+        if self.is_device:
+            try:
+                fcntl.ioctl(self.fd, FBIOBLANK, FB_BLANK_UNBLANK if on else FB_BLANK_POWERDOWN)
+            except IOError as ex:
+                # not all drivers can blank the screen
+                if ex.errno != errno.EINVAL:
+                    raise
+
+        self.powered = on
+
+    def end_frame(self):
+
+        # the driver picks up changes to the mapping itself (deferred I/O)
+        pass
+
+    def close(self):
+
+        self.map.close()
+        os.close(self.fd)
+
+
+if __name__ == '__main__':
+
+    # push frames through FrameDiff in to a file & check they read back
+    import tempfile
+
+    import frame_diff
+    from PIL import Image, ImageChops, ImageDraw
+
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+    else:
+        (fd, path) = tempfile.mkstemp(prefix='fbdev.')
+        os.close(fd)
+
+    if not os.path.exists(path):
+        open(path, 'wb').close()
+
+    fb = Framebuffer(path)
+    display = frame_diff.FrameDiff(fb)
+
+    image = Image.new('1', (fb.width, fb.height))
+    draw = ImageDraw.Draw(image)
+
+    ticks = 60
+    for second in range(ticks):
+        draw.rectangle((0, 0, fb.width, fb.height), outline=0, fill=0)
+        draw.text((0, 0), 'WLAN Pi', fill=255)
+        draw.text((0, 26), '12:34:{:02d}'.format(second), fill=255)
+        draw.text((100, 55), 'Back', fill=255)
+        display.push(image)
+        if ImageChops.difference(fb.read_image(), image).getbbox() is not None:
+            raise AssertionError('frame {} differs in {}'.format(second, path))
+
+    sys.stdout.write('{}: {} frames identical, {} bytes written ({} for full frames)\n'.format(
+        path, ticks, display.bytes_sent, ticks * fb.size))
+
+    fb.close()
+    if len(sys.argv) == 1:
+        os.unlink(path)
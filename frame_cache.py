@@ -0,0 +1,110 @@
+'''
+Bounded LRU cache of finished 128x64 display frames.
+
+Rendering a page through PIL is by far the most expensive part of a screen
+refresh, yet most refreshes redraw exactly the same content (a menu that has
+not moved, a table that is still showing the same rows). Pages are keyed by
+their logical content (e.g. menu path & selection, or table title, rows and
+scroll position) and the finished frame is stored as raw image bytes, so a
+repaint of an unchanged screen is just a buffer copy.
+
+Usage:
+
+    if not cache.restore(key, image):
+        ... render page in to image ...
+        cache.store(key, image)
+'''
+
+from collections import OrderedDict
+
+
+class FrameCache(object):
+
+    '''
+    LRU cache of rendered frames, limited by number of entries
+    '''
+
+    def __init__(self, max_entries=32):
+
+        self.max_entries = max_entries
+        self.frames = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.frames)
+
+    def get(self, key):
+
+        '''
+        Return the raw frame bytes cached for key, or None
+        '''
+
+        frame = self.frames.pop(key, None)
+
+        if frame is None:
+            self.misses += 1
+            return None
+
+        # re-insert to mark as most recently used
+        self.frames[key] = frame
+        self.hits += 1
+        return frame
+
+    def put(self, key, frame):
+
+        '''
+        Cache raw frame bytes against key, evicting the least recently used
+        frames if we're over the size limit
+        '''
+
+        if self.max_entries <= 0:
+            return
+
+        self.frames.pop(key, None)
+        self.frames[key] = frame
+
+        while len(self.frames) > self.max_entries:
+            self.frames.popitem(last=False)
+            self.evictions += 1
+
+    def restore(self, key, image):
+
+        '''
+        Copy the frame cached for key in to image. Returns True on a cache hit
+        '''
+
+        frame = self.get(key)
+
+        if frame is None:
+            return False
+
+        image.frombytes(frame)
+        return True
+
+    def store(self, key, image):
+
+        '''
+        Cache the current contents of image against key
+        '''
+
+        self.put(key, image.tobytes())
+
+    def clear(self):
+
+        self.frames.clear()
+
+    def stats(self):
+
+        '''
+        Return a dict of cache counters
+        '''
+
+        return {
+            'entries': len(self.frames),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
@@ -0,0 +1,215 @@
+'''
+SSD1306 frame encoder.
+
+A PIL mode '1' image buffer (Image.tobytes()) is row-major: each byte holds
+8 horizontally adjacent pixels, most significant bit on the left. The
+SSD1306 wants its RAM page by page: each byte holds 8 vertically adjacent
+pixels of one column of an 8 pixel high page, least significant bit at
+the top. Converting one to the other pixel by pixel in Python (as the
+FriendlyARM driver's drawImage() does, and as frame_diff.py used to for
+each changed span) costs 8192 pixel tests per frame.
+
+Here a whole frame is converted in bulk: each 8x8 block of pixels is an
+8x8 bit matrix to be transposed.
+
+    numpy   unpack all the bits, reverse the 8 rows of each page & pack them
+            again down the columns - a handful of whole-array operations
+    LUT     without numpy: a table gives, for each row of a block & each
+            byte value, the 8 output bytes (as one 64 bit integer) that the
+            row's pixels contribute to. A block is the OR of 8 look-ups.
+
+Both give byte-identical output to reference_encode(), the pixel by pixel
+version, which is kept as the specification. Run this module to check the
+encoders against it & to benchmark them:
+
+    python frame_encoder.py             # self-check & benchmark
+'''
+
+import struct
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+width = 128
+height = 64
+pages = height // 8
+
+# A PIL mode '1' image buffer is row-major, 8 pixels per byte (MSB first)
+row_bytes = width // 8
+band_bytes = row_bytes * 8
+
+block = struct.Struct('<Q')
+
+
+def reference_encode(raw, width=width, height=height):
+
+    '''
+    Pixel by pixel conversion of a row-major PIL '1' buffer to SSD1306
+    page/column bytes (bit 0 = top pixel of the page)
+    '''
+
+    raw = bytearray(raw)
+    row_bytes = width // 8
+    out = bytearray()
+
+    for page in range(height // 8):
+        for x in range(width):
+            bits = 0
+            for r in range(8):
+                if raw[(page * 8 + r) * row_bytes + (x >> 3)] & (0x80 >> (x & 7)):
+                    bits |= 1 << r
+            out.append(bits)
+
+    return out
+
+
+def _build_lut():
+
+    '''
+    lut[r][value]: the 8 column bytes (column 0 in the low byte) with bit r
+    set where row r of an 8x8 block has value as its pixels
+    '''
+
+    lut = []
+
+    for r in range(8):
+        table = []
+        for value in range(256):
+            spread = 0
+            for c in range(8):
+                if value & (0x80 >> c):
+                    spread |= 1 << (c * 8 + r)
+            table.append(spread)
+        lut.append(table)
+
+    return lut
+
+lut = _build_lut()
+
+
+def lut_encode(raw, width=width, height=height):
+
+    '''
+    Convert a row-major PIL '1' buffer to SSD1306 page/column bytes, a
+    block of 8x8 pixels at a time using the lookup table
+    '''
+
+    raw = bytearray(raw)
+    row_bytes = width // 8
+    band_bytes = row_bytes * 8
+    (lut0, lut1, lut2, lut3, lut4, lut5, lut6, lut7) = lut
+    pack = block.pack
+    out = []
+
+    for band in range(0, band_bytes * (height // 8), band_bytes):
+        for i in range(band, band + row_bytes):
+            out.append(pack(
+                lut0[raw[i]] |
+                lut1[raw[i + row_bytes]] |
+                lut2[raw[i + 2 * row_bytes]] |
+                lut3[raw[i + 3 * row_bytes]] |
+                lut4[raw[i + 4 * row_bytes]] |
+                lut5[raw[i + 5 * row_bytes]] |
+                lut6[raw[i + 6 * row_bytes]] |
+                lut7[raw[i + 7 * row_bytes]]))
+
+    return bytearray(b''.join(out))
+
+
+def numpy_encode(raw, width=width, height=height):
+
+    '''
+    Convert a row-major PIL '1' buffer to SSD1306 page/column bytes with
+    numpy bit operations
+    '''
+
+    frame = numpy.frombuffer(bytes(raw), dtype=numpy.uint8)
+
+    # (page, row in page, pixel column): bits in left to right order
+    bits = numpy.unpackbits(frame).reshape(height // 8, 8, width)
+
+    # packbits puts the first row in the top bit, so reverse the rows to
+    # get row 0 in bit 0
+    return bytearray(numpy.packbits(bits[:, ::-1, :], axis=1).tobytes())
+
+
+# fastest available encoder
+encode = numpy_encode if numpy is not None else lut_encode
+
+
+def encode_image(image):
+
+    '''
+    SSD1306 page/column bytes for a PIL mode '1' image
+    '''
+
+    (image_width, image_height) = image.size
+
+    return encode(image.tobytes(), image_width, image_height)
+
+
+def self_check(frames=200, seed=1):
+
+    '''
+    Compare the encoders with reference_encode() on blank, full, single
+    pixel & random frames. Returns the number of frames checked.
+    '''
+
+    import random
+
+    rng = random.Random(seed)
+    size = band_bytes * pages
+
+    samples = [bytearray(size), bytearray(b'\xff' * size)]
+
+    # each single pixel, for a sample of positions covering every bit
+    for bit in range(8):
+        for index in (0, row_bytes - 1, rng.randrange(size), size - 1):
+            frame = bytearray(size)
+            frame[index] = 0x80 >> bit
+            samples.append(frame)
+
+    while len(samples) < frames:
+        samples.append(bytearray(rng.getrandbits(8) for n in range(size)))
+
+    encoders = [lut_encode]
+    if numpy is not None:
+        encoders.append(numpy_encode)
+
+    for frame in samples:
+        expected = reference_encode(frame)
+        for encoder in encoders:
+            if encoder(frame) != expected:
+                raise AssertionError('{} output differs from reference'.format(encoder.__name__))
+
+    return len(samples)
+
+
+def benchmark(runs=200):
+
+    import random
+    import time
+
+    monotonic = getattr(time, 'monotonic', time.time)
+    frame = bytearray(random.getrandbits(8) for n in range(band_bytes * pages))
+
+    encoders = [reference_encode, lut_encode]
+    if numpy is not None:
+        encoders.append(numpy_encode)
+
+    for encoder in encoders:
+        count = runs // 10 if encoder is reference_encode else runs
+        start = monotonic()
+        for n in range(count):
+            encoder(frame)
+        print('  {:<18} {:8.3f} ms/frame'.format(encoder.__name__,
+            (monotonic() - start) * 1000 / count))
+
+
+if __name__ == '__main__':
+
+    print('self-check: {} frames identical to reference{}'.format(self_check(),
+        '' if numpy is not None else ' (numpy not available)'))
+    benchmark()
@@ -0,0 +1,366 @@
+'''
+Pre-rasterised glyph atlas for the monospaced TrueType display fonts.
+
+Every draw.text() call sends the string through FreeType, which is slow on
+the small ARM core of the WLANPi. As all of the display fonts are
+monospaced, text can instead be drawn by pasting pre-rendered 1-bit glyphs
+at a fixed advance. Each printable ASCII glyph is rendered once through PIL
+(so the glyph shapes and baseline match draw.text()) and the resulting atlas
+is saved to a small cache file keyed by a hash of the font file, so later
+boots do not need FreeType at all.
+
+Strings containing characters outside the atlas are drawn with PIL as
+before (the TrueType font is only loaded if this happens).
+
+Usage:
+
+    font = glyph_atlas.load_font('DejaVuSansMono.ttf', 11)
+    font.draw_text(image, (0, 0), 'Hello', fill=255)
+
+Run this file directly to benchmark the atlas against the PIL text path.
+'''
+
+import hashlib
+import os
+import struct
+import sys
+
+from PIL import Image
+from PIL import ImageDraw
+from PIL import ImageFont
+import PIL
+
+from cache_files import cache_dir
+
+# characters held in the atlas
+atlas_chars = [chr(c) for c in range(32, 127)]
+
+# default location of the atlas cache files
+default_cache_dir = cache_dir
+
+# directories searched for font files given without a path (as PIL does)
+font_dirs = [
+    '/usr/share/fonts',
+    '/usr/local/share/fonts',
+    os.path.expanduser('~/.fonts'),
+]
+
+# cache file layout
+file_magic = b'GLYA'
+file_version = 1
+header_format = '<4sBBBH'       # magic, version, font size, advance, glyph count
+glyph_format = '<BbbbBB'        # char, x, y, first char x shift, width, height
+
+# most text_rows() results kept per font
+text_rows_cache_size = 256
+
+_font_paths = {}
+
+
+def find_font_file(name):
+
+    '''
+    Return the full path of a font file, searching the usual font
+    directories if no path was given. Returns None if not found.
+    '''
+
+    if name in _font_paths:
+        return _font_paths[name]
+
+    path = None
+
+    if os.path.isfile(name):
+        path = os.path.abspath(name)
+    else:
+        for font_dir in font_dirs:
+            for root, dirs, files in os.walk(font_dir):
+                if name in files:
+                    path = os.path.join(root, name)
+                    break
+            if path:
+                break
+
+    _font_paths[name] = path
+    return path
+
+
+def font_hash(path):
+
+    '''
+    Return a hex digest identifying the content of a font file
+    '''
+
+    digest = hashlib.sha1()
+
+    with open(path, 'rb') as font_file:
+        for block in iter(lambda: font_file.read(65536), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+class GlyphFont(object):
+
+    '''
+    A monospaced TrueType font drawn from a pre-rendered glyph atlas
+    '''
+
+    def __init__(self, name, size, cache_dir=default_cache_dir):
+
+        self.name = name
+        self.size = size
+        self.cache_dir = cache_dir
+        self.path = find_font_file(name)
+        self._font = None
+
+        # per character: (x offset, y offset, first char x shift, mask image)
+        self.glyphs = {}
+        self.glyph_rows = None
+        self.text_rows_cache = {}
+        self.advance = 0
+
+        cache_file = self.cache_file()
+
+        if not (cache_file and self.load(cache_file)):
+            self.build()
+            if cache_file:
+                self.save(cache_file)
+
+    @property
+    def font(self):
+
+        '''
+        The PIL TrueType font, loaded on first use
+        '''
+
+        if self._font is None:
+            self._font = ImageFont.truetype(self.path or self.name, self.size)
+        return self._font
+
+    def cache_file(self):
+
+        '''
+        Return the name of the atlas cache file for this font & size
+        '''
+
+        if not (self.cache_dir and self.path):
+            return None
+
+        # glyph rendering may differ between PIL releases, so include its version
+        key = '{}-{}-{}-{}'.format(font_hash(self.path), self.size,
+            getattr(PIL, '__version__', 'pil'), file_version)
+
+        return os.path.join(self.cache_dir, 'glyphs-{}.bin'.format(
+            hashlib.sha1(key.encode('ascii')).hexdigest()[:16]))
+
+    def build(self):
+
+        '''
+        Render every atlas character through PIL
+        '''
+
+        font = self.font
+        advance = font.getsize('M')[0] if hasattr(font, 'getsize') else int(font.getlength('M'))
+        margin = advance * 2
+        canvas_size = (advance * 5 + margin, self.size * 2 + margin)
+
+        self.advance = advance
+        self.glyphs = {}
+
+        for char in atlas_chars:
+
+            # Render each glyph after a '|' strut so that every glyph sits on
+            # the same baseline that PIL uses for a full line of text
+            canvas = Image.new('1', canvas_size)
+            ImageDraw.Draw(canvas).text((margin, margin), '| ' + char, font=font, fill=255)
+            canvas = canvas.crop((margin + advance + 1, 0) + canvas_size)
+            box = canvas.getbbox()
+
+            if box is None:
+                # nothing to draw (e.g. space)
+                continue
+
+            x = box[0] + advance + 1 - 2 * advance
+            y = box[1] - margin
+
+            # PIL shifts a whole line by the left bearing of its first glyph
+            single = Image.new('1', canvas_size)
+            ImageDraw.Draw(single).text((margin, margin), char, font=font, fill=255)
+            first_shift = single.getbbox()[0] - margin - x
+
+            self.glyphs[char] = (x, y, first_shift, canvas.crop(box))
+
+    def load(self, cache_file):
+
+        '''
+        Load the atlas from a cache file. Returns False if not available
+        '''
+
+        try:
+            with open(cache_file, 'rb') as atlas_file:
+                data = atlas_file.read()
+        except (IOError, OSError):
+            return False
+
+        try:
+            magic, version, size, advance, count = struct.unpack_from(header_format, data, 0)
+            if magic != file_magic or version != file_version or size != self.size:
+                return False
+
+            offset = struct.calcsize(header_format)
+            glyph_size = struct.calcsize(glyph_format)
+            glyphs = {}
+
+            for i in range(count):
+                code, x, y, first_shift, w, h = struct.unpack_from(glyph_format, data, offset)
+                offset += glyph_size
+                length = ((w + 7) // 8) * h
+                mask = Image.frombytes('1', (w, h), data[offset:offset + length])
+                offset += length
+                glyphs[chr(code)] = (x, y, first_shift, mask)
+
+        except (struct.error, ValueError):
+            return False
+
+        self.advance = advance
+        self.glyphs = glyphs
+        return True
+
+    def save(self, cache_file):
+
+        '''
+        Write the atlas to a cache file (silently skipped if not writable)
+        '''
+
+        chunks = [struct.pack(header_format, file_magic, file_version, self.size,
+            self.advance, len(self.glyphs))]
+
+        for char in sorted(self.glyphs):
+            x, y, first_shift, mask = self.glyphs[char]
+            chunks.append(struct.pack(glyph_format, ord(char), x, y, first_shift,
+                mask.size[0], mask.size[1]))
+            chunks.append(mask.tobytes())
+
+        temp_file = '{}.{}'.format(cache_file, os.getpid())
+
+        try:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            with open(temp_file, 'wb') as atlas_file:
+                atlas_file.write(b''.join(chunks))
+            os.rename(temp_file, cache_file)
+        except (IOError, OSError):
+            pass
+
+    def text_rows(self, text):
+
+        '''
+        Return the (first, last + 1) pixel rows, relative to the top of the
+        text, that draw_text() may set for text: (0, 0) if it draws nothing,
+        None if the text is not drawn from the atlas.
+        '''
+
+        if text in self.text_rows_cache:
+            return self.text_rows_cache[text]
+
+        # rows of each glyph, worked out on first use
+        if self.glyph_rows is None:
+            self.glyph_rows = dict((char, (glyph[1], glyph[1] + glyph[3].size[1]))
+                for char, glyph in self.glyphs.items())
+
+        extents = [ self.glyph_rows.get(char) for char in set(text) if char != ' ' ]
+
+        if None in extents:
+            # (newlines are not in the atlas either)
+            rows = None
+        elif not extents:
+            rows = (0, 0)
+        else:
+            rows = (min(extent[0] for extent in extents), max(extent[1] for extent in extents))
+
+        if len(self.text_rows_cache) >= text_rows_cache_size:
+            self.text_rows_cache.clear()
+        self.text_rows_cache[text] = rows
+
+        return rows
+
+    def draw_text(self, image, xy, text, fill=255):
+
+        '''
+        Draw a line of text on image with its top left corner at xy
+        '''
+
+        # command output may arrive as bytes, which PIL also accepted
+        if isinstance(text, bytes) and not isinstance(text, str):
+            text = text.decode('utf-8', 'replace')
+
+        # PIL treats trailing newlines (e.g. in command output) as empty lines
+        lines = text.split('\n')
+        line = lines[0]
+
+        for char in line:
+            if char not in self.glyphs and char != ' ':
+                line = None
+                break
+
+        if line is None or any(lines[1:]):
+            ImageDraw.Draw(image).text(xy, text, font=self.font, fill=fill)
+            return
+
+        if not line:
+            return
+
+        x, y = xy
+        glyphs = self.glyphs
+        first = glyphs.get(line[0])
+        if first:
+            x += first[2]
+
+        for char in line:
+            glyph = glyphs.get(char)
+            if glyph:
+                image.paste(fill, (x + glyph[0], y + glyph[1]), glyph[3])
+            x += self.advance
+
+
+def load_font(name, size, cache_dir=default_cache_dir):
+
+    '''
+    Return a GlyphFont for the named TrueType font file & size
+    '''
+
+    return GlyphFont(name, size, cache_dir)
+
+
+if __name__ == '__main__':
+
+    # Benchmark drawing a paged table page with the atlas & with PIL
+    import timeit
+
+    lines = [
+        '--WLAN I/F-- (1/2)',
+        'Interface: wlan0',
+        'SSID: N/A',
+        'Mode: monitor',
+        'Ch: 36 (20Mhz)',
+    ]
+
+    font = load_font('DejaVuSansMono-Bold.ttf', 10, cache_dir=None)
+    image = Image.new('1', (128, 64))
+    draw = ImageDraw.Draw(image)
+
+    def draw_pil():
+        for i, line in enumerate(lines):
+            draw.text((0, i * 11), line, font=font.font, fill=255)
+
+    def draw_atlas():
+        for i, line in enumerate(lines):
+            font.draw_text(image, (0, i * 11), line, fill=255)
+
+    runs = 500
+    pil_time = min(timeit.repeat(draw_pil, number=runs, repeat=3)) / runs
+    atlas_time = min(timeit.repeat(draw_atlas, number=runs, repeat=3)) / runs
+
+    sys.stdout.write('PIL draw.text: {:.3f} ms/page\n'.format(pil_time * 1000))
+    sys.stdout.write('glyph atlas:   {:.3f} ms/page ({:.1f}x faster)\n'.format(
+        atlas_time * 1000, pil_time / atlas_time))
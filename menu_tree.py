@@ -0,0 +1,150 @@
+'''
+Compiled menu tree.
+
+The menu is defined in bakebit_nanohat_oled.py as a nested list of dicts
+(see the README for the format). Rather than crawling that structure from
+the top every time the menu is drawn, it is compiled once at start-up into
+a tree of MenuNode objects. Each node has links to its parent, children
+and siblings, plus the display strings needed to draw it, so moving around
+the menu is just a case of following a link.
+
+Usage:
+
+    tree = menu_tree.compile_menu(menu, home_page_name)
+    node = tree.first           # first item of top level menu
+    node = node.next            # move down (wraps around)
+    node = node.children[0]     # move in to sub-menu
+    node = tree.index[(2, 1)]   # look up a node by menu location
+'''
+
+# width of menu item text & number of menu items shown at once
+label_width = 17
+table_window = 3
+
+
+class MenuNode(object):
+
+    '''
+    A single menu item
+    '''
+
+    def __init__(self, name, action=None, parent=None, index=0):
+
+        self.name = name
+        self.action = action
+        self.parent = parent
+        self.index = index
+        self.children = []
+
+        # siblings (circular, so moving down from the last item wraps around)
+        self.prev = self
+        self.next = self
+
+        if parent is None:
+            self.path = ()
+        else:
+            self.path = parent.path + (index,)
+
+        # menu item text with nav indicator
+        self.label = "{:<{}}>".format(name, label_width)
+
+        # filled in by compile_menu()
+        self.title = ''
+        self.window = ()
+
+    @property
+    def depth(self):
+        return len(self.path)
+
+    @property
+    def is_submenu(self):
+        return bool(self.children)
+
+    @property
+    def siblings(self):
+        return self.parent.children
+
+    def __repr__(self):
+        return 'MenuNode({!r}, path={})'.format(self.name, list(self.path))
+
+
+class MenuTree(object):
+
+    '''
+    Compiled menu with an index of menu locations to nodes
+    '''
+
+    def __init__(self, root):
+
+        self.root = root
+        self.index = {}
+
+        self._add(root)
+
+    def _add(self, node):
+
+        self.index[node.path] = node
+
+        for child in node.children:
+            self._add(child)
+
+    @property
+    def first(self):
+        return self.root.children[0]
+
+    def find(self, path):
+
+        '''
+        Return the node at a menu location (list or tuple), or None
+        '''
+
+        return self.index.get(tuple(path))
+
+
+def _compile_level(items, parent, title):
+
+    nodes = []
+
+    for index, item in enumerate(items):
+
+        node = MenuNode(item['name'], parent=parent, index=index)
+        node.title = title
+
+        if type(item['action']) is list:
+            child_title = ("[ " + node.name + " ]").center(label_width, " ")
+            node.children = _compile_level(item['action'], node, child_title)
+        else:
+            node.action = item['action']
+
+        nodes.append(node)
+
+    count = len(nodes)
+
+    for node in nodes:
+
+        node.prev = nodes[node.index - 1]
+        node.next = nodes[(node.index + 1) % count]
+
+        # the items shown when this node is selected: the selected item is
+        # always the bottom item of the window once we scroll past the top
+        if count <= table_window:
+            node.window = tuple(nodes)
+        elif node.index >= table_window:
+            node.window = tuple(nodes[node.index - (table_window - 1): node.index + 1])
+        else:
+            node.window = tuple(nodes[0:table_window])
+
+    return nodes
+
+
+def compile_menu(menu, home_page_name):
+
+    '''
+    Compile a menu data structure in to a MenuTree
+    '''
+
+    root = MenuNode(home_page_name)
+    home_title = ("[ " + home_page_name + " ]").center(label_width, " ")
+    root.children = _compile_level(menu, root, home_title)
+
+    return MenuTree(root)
@@ -0,0 +1,328 @@
+'''
+Counters & latency histograms for the display process.
+
+Shows where the time goes: rendering a page with PIL, sending a frame to
+the display, running a collector or an external command. Metrics are kept
+in a Registry & written out in the Prometheus text exposition format, to a
+file that node_exporter's textfile collector can pick up (the file is
+written to a temporary file & renamed, so a scrape never sees part of it).
+
+Values that other modules already count (frames pushed, button presses
+dropped, cache hits...) are not counted twice: they are registered as
+callbacks that are read when the metrics are written out.
+
+Usage:
+
+    registry = metrics.Registry(prefix='wlanpi_oled_')
+    render_time = registry.histogram('render_seconds', 'Time to render a page', ['page'])
+    with render_time.time(page='menu'):
+        draw_page()
+    registry.counter_function('frames_pushed_total', 'Frames sent', lambda: display.frames_pushed)
+    registry.write_textfile('/run/wlanpi-oled/metrics.prom')
+'''
+
+import os
+import tempfile
+import threading
+import time
+
+# use a monotonic clock where available (Python 3)
+monotonic = getattr(time, 'monotonic', time.time)
+
+# latency buckets (seconds) - from a cached menu draw to a slow command
+default_buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def format_value(value):
+
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def format_labels(names, values, extra=()):
+
+    pairs = list(zip(names, values)) + list(extra)
+
+    if not pairs:
+        return ''
+
+    return '{' + ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\')
+        .replace('"', '\\"').replace('\n', '\\n')) for name, value in pairs) + '}'
+
+
+class _Timer(object):
+
+    def __init__(self, histogram, labels):
+
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+
+        self.start = monotonic()
+        return self
+
+    def __exit__(self, *exc_info):
+
+        self.histogram.observe(monotonic() - self.start, **self.labels)
+
+
+class Metric(object):
+
+    '''
+    Base of counters & histograms: a set of values keyed by label values
+    '''
+
+    kind = None
+
+    def __init__(self, name, help_text, label_names=()):
+
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def _key(self, labels):
+
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def header(self):
+
+        return ['# HELP {} {}'.format(self.name, self.help_text),
+                '# TYPE {} {}'.format(self.name, self.kind)]
+
+
+class Counter(Metric):
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels):
+
+        return self.values.get(self._key(labels), 0)
+
+    def lines(self):
+
+        with self.lock:
+            values = sorted(self.values.items())
+
+        return [ '{}{} {}'.format(self.name, format_labels(self.label_names, key),
+            format_value(value)) for key, value in values ]
+
+
+class Histogram(Metric):
+
+    '''
+    Counts of observations in cumulative buckets, plus their sum & count
+    '''
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, label_names=(), buckets=default_buckets):
+
+        Metric.__init__(self, name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+
+        key = self._key(labels)
+
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def time(self, **labels):
+
+        '''
+        Context manager that observes the time taken by its block
+        '''
+
+        return _Timer(self, labels)
+
+    def count(self, **labels):
+
+        entry = self.values.get(self._key(labels))
+        return entry[2] if entry else 0
+
+    def mean(self, **labels):
+
+        entry = self.values.get(self._key(labels))
+        return entry[1] / entry[2] if entry else None
+
+    def quantile(self, q, **labels):
+
+        '''
+        Estimate a quantile from the buckets (linear within a bucket, as
+        Prometheus' histogram_quantile() does). None if nothing observed.
+        '''
+
+        with self.lock:
+            entry = self.values.get(self._key(labels))
+            if not entry:
+                return None
+            counts = list(entry[0])
+            total = entry[2]
+
+        rank = q * total
+        cumulative = 0
+        lower = 0.0
+
+        for bound, count in zip(self.buckets, counts):
+            if count and cumulative + count >= rank:
+                if bound == float('inf'):
+                    return lower
+                return lower + (bound - lower) * (rank - cumulative) / count
+            cumulative += count
+            if bound != float('inf'):
+                lower = bound
+
+        return lower
+
+    def label_values(self):
+
+        with self.lock:
+            keys = sorted(self.values)
+
+        return [ dict(zip(self.label_names, key)) for key in keys ]
+
+    def lines(self):
+
+        lines = []
+
+        with self.lock:
+            values = sorted((key, (list(entry[0]), entry[1], entry[2]))
+                for key, entry in self.values.items())
+
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append('{}_bucket{} {}'.format(self.name,
+                    format_labels(self.label_names, key, [('le', format_value(bound))]),
+                    cumulative))
+            labels = format_labels(self.label_names, key)
+            lines.append('{}_sum{} {}'.format(self.name, labels, format_value(total)))
+            lines.append('{}_count{} {}'.format(self.name, labels, count))
+
+        return lines
+
+
+class FunctionMetric(Metric):
+
+    '''
+    A counter or gauge whose value is read from a function when written out
+    '''
+
+    def __init__(self, name, help_text, function, kind):
+
+        Metric.__init__(self, name, help_text)
+        self.function = function
+        self.kind = kind
+
+    def lines(self):
+
+        return [ '{} {}'.format(self.name, format_value(self.function())) ]
+
+
+class Registry(object):
+
+    '''
+    A set of metrics, written out together
+    '''
+
+    def __init__(self, prefix=''):
+
+        self.prefix = prefix
+        self.metrics = []
+
+    def _add(self, metric):
+
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, label_names=()):
+
+        return self._add(Counter(self.prefix + name, help_text, label_names))
+
+    def histogram(self, name, help_text, label_names=(), buckets=default_buckets):
+
+        return self._add(Histogram(self.prefix + name, help_text, label_names, buckets))
+
+    def counter_function(self, name, help_text, function):
+
+        return self._add(FunctionMetric(self.prefix + name, help_text, function, 'counter'))
+
+    def gauge_function(self, name, help_text, function):
+
+        return self._add(FunctionMetric(self.prefix + name, help_text, function, 'gauge'))
+
+    def render(self):
+
+        '''
+        Return all metrics in the Prometheus text exposition format
+        '''
+
+        lines = []
+
+        for metric in self.metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.lines())
+
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path):
+
+        '''
+        Write the metrics to path (atomically). Raises OSError/IOError if
+        the file can't be written.
+        '''
+
+        directory = os.path.dirname(path)
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        (fd, temp_file) = tempfile.mkstemp(prefix='.metrics.', dir=directory)
+
+        try:
+            with os.fdopen(fd, 'w') as textfile:
+                textfile.write(self.render())
+            os.chmod(temp_file, 0o644)
+            os.rename(temp_file, path)
+        except:
+            os.unlink(temp_file)
+            raise
+
+
+if __name__ == '__main__':
+
+    # example output
+    registry = Registry(prefix='example_')
+    requests = registry.counter('requests_total', 'Requests handled', ['page'])
+    latency = registry.histogram('render_seconds', 'Time to render a page', ['page'])
+
+    for n in range(100):
+        requests.inc(page='home')
+        latency.observe(0.002 + n * 0.0002, page='home')
+
+    registry.gauge_function('uptime_seconds', 'Seconds since start', lambda: 12.5)
+
+    print(registry.render())
+    print('p50 {:.4f}s p95 {:.4f}s'.format(latency.quantile(0.5, page='home'),
+        latency.quantile(0.95, page='home')))
@@ -0,0 +1,395 @@
+'''
+Network interface inventory from rtnetlink & /sys/class/net.
+
+Replaces parsing the output of ifconfig (and running 'iw' to spot monitor
+mode interfaces). A link dump (RTM_GETLINK) and an address dump
+(RTM_GETADDR) are requested over a single netlink socket that is kept open
+between calls, giving the name, state, type and addresses of every
+interface without running any external commands. /sys/class/net is used
+to tell wireless interfaces from other Ethernet-type interfaces.
+
+LinkMonitor reports the link state, speed & duplex of a single interface
+from /sys/class/net/<interface>/{carrier,speed,duplex} and its IPv4 address
+with an ioctl, again without running any commands (previously ethtool and
+'ip addr' were run for the home page every second).
+
+Usage:
+
+    inventory = net_inventory.NetInventory()
+    for interface in inventory.interfaces():
+        print(interface.name, interface.kind, interface.ipv4)
+
+    eth0 = net_inventory.LinkMonitor('eth0')
+    link = eth0.status()        # LinkStatus(carrier, operstate, speed, ...)
+'''
+
+import fcntl
+import os
+import socket
+import struct
+import threading
+import time
+from collections import namedtuple
+
+from sys_stats import ProcFile
+
+monotonic = getattr(time, 'monotonic', time.time)
+
+# netlink message types & flags
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x01
+NLM_F_DUMP = 0x300
+NETLINK_ROUTE = 0
+
+RTM_NEWLINK = 16
+RTM_GETLINK = 18
+RTM_NEWADDR = 20
+RTM_GETADDR = 22
+
+# link attributes
+IFLA_ADDRESS = 1
+IFLA_IFNAME = 3
+IFLA_OPERSTATE = 16
+
+# address attributes
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+
+# interface flags
+IFF_UP = 0x1
+IFF_LOOPBACK = 0x8
+IFF_RUNNING = 0x40
+
+# hardware types (include/uapi/linux/if_arp.h)
+ARPHRD_ETHER = 1
+ARPHRD_LOOPBACK = 772
+ARPHRD_IEEE80211 = 801
+ARPHRD_IEEE80211_PRISM = 802
+ARPHRD_IEEE80211_RADIOTAP = 803
+
+# ioctl to get interface address
+SIOCGIFADDR = 0x8915
+
+# RFC 2863 operational states
+operstates = ['unknown', 'notpresent', 'down', 'lowerlayerdown', 'testing', 'dormant', 'up']
+
+nlmsghdr = struct.Struct('=IHHII')      # length, type, flags, seq, pid
+ifinfomsg = struct.Struct('=BxHiII')    # family, type, index, flags, change
+ifaddrmsg = struct.Struct('=BBBBI')     # family, prefix length, flags, scope, index
+rtattr = struct.Struct('=HH')           # length, type
+
+
+class Interface(namedtuple('Interface', 'name index flags operstate arphrd mac kind ipv4 ipv6')):
+
+    '''
+    A network interface. kind is one of 'ethernet', 'wireless', 'monitor',
+    'loopback' or 'other'. ipv4/ipv6 are lists of address strings.
+    '''
+
+    @property
+    def is_up(self):
+        return bool(self.flags & IFF_UP)
+
+
+def native_string(data):
+
+    '''
+    Convert a NUL terminated attribute value to a native str
+    '''
+
+    data = data.split(b'\0', 1)[0]
+
+    if str is bytes:
+        return data
+    return data.decode('utf-8', 'replace')
+
+
+def mac_string(data):
+
+    return ':'.join('{:02x}'.format(byte) for byte in bytearray(data))
+
+
+def parse_attributes(data, offset):
+
+    '''
+    Return a dict of attribute type to value bytes from a netlink payload
+    (parsing stops at a malformed or truncated attribute)
+    '''
+
+    attributes = {}
+
+    while offset + rtattr.size <= len(data):
+        length, attr_type = rtattr.unpack_from(data, offset)
+        if length < rtattr.size or offset + length > len(data):
+            break
+        attributes[attr_type] = data[offset + rtattr.size: offset + length]
+        offset += (length + 3) & ~3
+
+    return attributes
+
+
+def parse_messages(data):
+
+    '''
+    Split a buffer of netlink messages, yielding (type, flags, seq, payload)
+    (a truncated message ends the buffer)
+    '''
+
+    offset = 0
+
+    while offset + nlmsghdr.size <= len(data):
+        length, msg_type, flags, seq, pid = nlmsghdr.unpack_from(data, offset)
+        if length < nlmsghdr.size or offset + length > len(data):
+            break
+        yield (msg_type, flags, seq, data[offset + nlmsghdr.size: offset + length])
+        offset += (length + 3) & ~3
+
+
+def interface_kind(name, arphrd, flags, sys_class_net='/sys/class/net'):
+
+    '''
+    Classify an interface from its hardware type & sysfs entries
+    '''
+
+    if arphrd in (ARPHRD_IEEE80211_RADIOTAP, ARPHRD_IEEE80211_PRISM, ARPHRD_IEEE80211):
+        return 'monitor'
+
+    if arphrd == ARPHRD_LOOPBACK or flags & IFF_LOOPBACK:
+        return 'loopback'
+
+    if arphrd == ARPHRD_ETHER:
+        sys_dir = os.path.join(sys_class_net, name)
+        if os.path.isdir(os.path.join(sys_dir, 'wireless')) or \
+                os.path.exists(os.path.join(sys_dir, 'phy80211')):
+            return 'wireless'
+        return 'ethernet'
+
+    return 'other'
+
+
+class NetInventory(object):
+
+    '''
+    Lists network interfaces using a persistent rtnetlink socket
+    '''
+
+    def __init__(self, sys_class_net='/sys/class/net'):
+
+        self.sys_class_net = sys_class_net
+        self.sock = None
+        self.seq = 0
+        self.lock = threading.Lock()
+
+    def _socket(self):
+
+        if self.sock is None:
+            self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+            self.sock.bind((0, 0))
+        return self.sock
+
+    def close(self):
+
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def dump(self, msg_type, body):
+
+        '''
+        Send a dump request & return the payloads of all reply messages
+        '''
+
+        sock = self._socket()
+        self.seq += 1
+        seq = self.seq
+
+        request = nlmsghdr.pack(nlmsghdr.size + len(body), msg_type,
+            NLM_F_REQUEST | NLM_F_DUMP, seq, 0) + body
+
+        try:
+            sock.send(request)
+        except socket.error:
+            # socket may have gone bad - try once more with a new one
+            self.close()
+            sock = self._socket()
+            sock.send(request)
+
+        payloads = []
+
+        while True:
+            data = sock.recv(65536)
+            for reply_type, flags, reply_seq, payload in parse_messages(data):
+                if reply_seq != seq:
+                    continue
+                if reply_type == NLMSG_DONE:
+                    return payloads
+                if reply_type == NLMSG_ERROR:
+                    error = struct.unpack_from('=i', payload)[0]
+                    if error:
+                        raise OSError(-error, os.strerror(-error))
+                    return payloads
+                payloads.append((reply_type, payload))
+
+    def interfaces(self):
+
+        '''
+        Return a list of Interface, in interface index order
+        '''
+
+        with self.lock:
+            links = self.dump(RTM_GETLINK, ifinfomsg.pack(socket.AF_UNSPEC, 0, 0, 0, 0))
+            addresses = self.dump(RTM_GETADDR, ifaddrmsg.pack(socket.AF_UNSPEC, 0, 0, 0, 0))
+
+        ipv4 = {}
+        ipv6 = {}
+
+        for msg_type, payload in addresses:
+
+            if msg_type != RTM_NEWADDR:
+                continue
+
+            family, prefix_len, flags, scope, index = ifaddrmsg.unpack_from(payload)
+            attributes = parse_attributes(payload, ifaddrmsg.size)
+            address = attributes.get(IFA_LOCAL, attributes.get(IFA_ADDRESS))
+
+            if address is None:
+                continue
+
+            if family == socket.AF_INET:
+                ipv4.setdefault(index, []).append(socket.inet_ntop(socket.AF_INET, address))
+            elif family == socket.AF_INET6:
+                ipv6.setdefault(index, []).append(socket.inet_ntop(socket.AF_INET6, address))
+
+        interfaces = []
+
+        for msg_type, payload in links:
+
+            if msg_type != RTM_NEWLINK:
+                continue
+
+            family, arphrd, index, flags, change = ifinfomsg.unpack_from(payload)
+            attributes = parse_attributes(payload, ifinfomsg.size)
+
+            name = native_string(attributes.get(IFLA_IFNAME, b''))
+            operstate = bytearray(attributes.get(IFLA_OPERSTATE, b'\0'))[0]
+
+            interfaces.append(Interface(
+                name=name,
+                index=index,
+                flags=flags,
+                operstate=operstates[operstate] if operstate < len(operstates) else 'unknown',
+                arphrd=arphrd,
+                mac=mac_string(attributes.get(IFLA_ADDRESS, b'')),
+                kind=interface_kind(name, arphrd, flags, self.sys_class_net),
+                ipv4=ipv4.get(index, []),
+                ipv6=ipv6.get(index, [])))
+
+        interfaces.sort(key=lambda interface: interface.index)
+
+        return interfaces
+
+
+class LinkStatus(namedtuple('LinkStatus', 'carrier operstate speed duplex ipv4')):
+
+    '''
+    Link state of an interface. speed is in Mb/s (None if unknown), duplex
+    is 'full', 'half' or None, ipv4 is the primary IPv4 address or None.
+    '''
+
+
+def ipv4_address(ifname, sock=None):
+
+    '''
+    Return the primary IPv4 address of an interface (SIOCGIFADDR), or None
+    '''
+
+    close = sock is None
+    if sock is None:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    try:
+        request = struct.pack('16s16x', ifname[:15].encode('ascii') if str is not bytes else ifname[:15])
+        reply = fcntl.ioctl(sock.fileno(), SIOCGIFADDR, request)
+        return socket.inet_ntoa(reply[20:24])
+    except (IOError, OSError):
+        return None
+    finally:
+        if close:
+            sock.close()
+
+
+class LinkMonitor(object):
+
+    '''
+    Reports the link status of an interface. The sysfs carrier & operstate
+    files are kept open & re-read on each call; speed, duplex & address are
+    only looked up again when the link state changes (or, for the address,
+    while there isn't one yet & at most every ip_max_age seconds).
+    '''
+
+    def __init__(self, ifname, sys_class_net='/sys/class/net', ip_max_age=30):
+
+        self.ifname = ifname
+        self.ip_max_age = ip_max_age
+        sys_dir = os.path.join(sys_class_net, ifname)
+
+        self.carrier_file = ProcFile(os.path.join(sys_dir, 'carrier'))
+        self.operstate_file = ProcFile(os.path.join(sys_dir, 'operstate'))
+        self.speed_file = ProcFile(os.path.join(sys_dir, 'speed'))
+        self.duplex_file = ProcFile(os.path.join(sys_dir, 'duplex'))
+
+        self.sock = None
+        self.cached = None
+        self.ip_time = 0
+
+    def _read(self, proc_file):
+
+        try:
+            return proc_file.read().strip()
+        except (IOError, OSError):
+            # e.g. carrier & speed can't be read while interface is down
+            return None
+
+    def _ipv4(self):
+
+        if self.sock is None:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.ip_time = monotonic()
+        return ipv4_address(self.ifname, self.sock)
+
+    def status(self):
+
+        '''
+        Return the current LinkStatus of the interface
+        '''
+
+        carrier = self._read(self.carrier_file) == '1'
+        operstate = self._read(self.operstate_file) or 'unknown'
+        cached = self.cached
+
+        if cached is not None and (cached.carrier, cached.operstate) == (carrier, operstate):
+
+            if cached.ipv4 is None or monotonic() - self.ip_time > self.ip_max_age:
+                cached = cached._replace(ipv4=self._ipv4())
+                self.cached = cached
+
+            return cached
+
+        speed = None
+        duplex = None
+
+        if carrier:
+            try:
+                speed = int(self._read(self.speed_file))
+                if speed <= 0:
+                    speed = None
+            except (TypeError, ValueError):
+                speed = None
+
+            duplex = self._read(self.duplex_file)
+            if duplex not in ('full', 'half'):
+                duplex = None
+
+        self.cached = LinkStatus(carrier, operstate, speed, duplex, self._ipv4())
+        return self.cached
@@ -0,0 +1,273 @@
+'''
+Minimal nl80211 (generic netlink) client for WLAN interface details.
+
+Replaces running 'iw <interface> info' for each WLAN interface and picking
+values out of its output by position. A single NL80211_CMD_GET_INTERFACE
+dump over a persistent generic netlink socket returns the details of all
+wireless interfaces at once.
+
+The message parser (parse_interface()) works on raw message payloads, so it
+can be run against recorded netlink messages without any radios present
+(see tests/test_nl80211.py).
+
+Usage:
+
+    client = nl80211.Nl80211()
+    for wlan in client.interfaces():
+        print(wlan.name, wlan.iftype_name, wlan.ssid, wlan.channel, wlan.width)
+'''
+
+import os
+import socket
+import struct
+import threading
+from collections import namedtuple
+
+from net_inventory import nlmsghdr, parse_attributes, parse_messages, native_string, mac_string
+from net_inventory import NLMSG_DONE, NLMSG_ERROR, NLM_F_REQUEST, NLM_F_DUMP
+
+NETLINK_GENERIC = 16
+
+# generic netlink controller
+GENL_ID_CTRL = 0x10
+CTRL_CMD_GETFAMILY = 3
+CTRL_ATTR_FAMILY_ID = 1
+CTRL_ATTR_FAMILY_NAME = 2
+
+# nl80211 commands & attributes (include/uapi/linux/nl80211.h)
+NL80211_CMD_GET_INTERFACE = 5
+NL80211_CMD_NEW_INTERFACE = 7
+
+NL80211_ATTR_WIPHY = 1
+NL80211_ATTR_IFINDEX = 3
+NL80211_ATTR_IFNAME = 4
+NL80211_ATTR_IFTYPE = 5
+NL80211_ATTR_MAC = 6
+NL80211_ATTR_WIPHY_FREQ = 38
+NL80211_ATTR_SSID = 52
+NL80211_ATTR_CHANNEL_WIDTH = 159
+NL80211_ATTR_CENTER_FREQ1 = 160
+
+# interface types, named as 'iw' shows them
+iftype_names = {
+    0: 'unspecified',
+    1: 'IBSS',
+    2: 'managed',
+    3: 'AP',
+    4: 'AP/VLAN',
+    5: 'WDS',
+    6: 'monitor',
+    7: 'mesh point',
+    8: 'P2P-client',
+    9: 'P2P-GO',
+    10: 'P2P-device',
+    11: 'OCB',
+    12: 'NAN',
+}
+
+# channel width enum to MHz
+channel_widths = {
+    0: 20,      # 20 MHz, no HT
+    1: 20,
+    2: 40,
+    3: 80,
+    4: 80,      # 80+80 MHz
+    5: 160,
+    6: 5,
+    7: 10,
+}
+
+genlmsghdr = struct.Struct('=BBH')      # command, version, reserved
+
+
+class WlanInterface(namedtuple('WlanInterface',
+        'ifindex name wiphy iftype mac ssid frequency channel width center_freq1')):
+
+    '''
+    Details of a wireless interface. Values not reported by the kernel
+    (e.g. SSID when not associated) are None.
+    '''
+
+    @property
+    def iftype_name(self):
+        return iftype_names.get(self.iftype, 'unknown')
+
+
+def frequency_to_channel(frequency):
+
+    '''
+    Convert a centre frequency (MHz) to a channel number
+    '''
+
+    if frequency is None:
+        return None
+    if frequency == 2484:
+        return 14
+    if 2407 < frequency < 2484:
+        return (frequency - 2407) // 5
+    if 4910 <= frequency <= 4980:
+        return (frequency - 4000) // 5
+    # 6 GHz channel 2 is below the rest of the band (inside 5 GHz's range)
+    if frequency == 5935:
+        return 2
+    if 5950 < frequency <= 7115:
+        return (frequency - 5950) // 5
+    if 5000 <= frequency < 5950:
+        return (frequency - 5000) // 5
+    return None
+
+
+def _u32(attributes, attr_type):
+
+    value = attributes.get(attr_type)
+    if value is None or len(value) < 4:
+        return None
+    return struct.unpack_from('=I', value)[0]
+
+
+def parse_interface(payload):
+
+    '''
+    Parse the payload of an NL80211_CMD_NEW_INTERFACE message (generic
+    netlink header onwards) in to a WlanInterface
+    '''
+
+    attributes = parse_attributes(payload, genlmsghdr.size)
+
+    ssid = attributes.get(NL80211_ATTR_SSID)
+    if ssid is not None and str is not bytes:
+        ssid = ssid.decode('utf-8', 'replace')
+
+    frequency = _u32(attributes, NL80211_ATTR_WIPHY_FREQ)
+    width = _u32(attributes, NL80211_ATTR_CHANNEL_WIDTH)
+
+    mac = attributes.get(NL80211_ATTR_MAC)
+
+    return WlanInterface(
+        ifindex=_u32(attributes, NL80211_ATTR_IFINDEX),
+        name=native_string(attributes.get(NL80211_ATTR_IFNAME, b'')),
+        wiphy=_u32(attributes, NL80211_ATTR_WIPHY),
+        iftype=_u32(attributes, NL80211_ATTR_IFTYPE),
+        mac=mac_string(mac) if mac is not None else None,
+        ssid=ssid,
+        frequency=frequency,
+        channel=frequency_to_channel(frequency),
+        width=channel_widths.get(width) if width is not None else None,
+        center_freq1=_u32(attributes, NL80211_ATTR_CENTER_FREQ1))
+
+
+def parse_interface_dump(messages):
+
+    '''
+    Parse a list of raw netlink messages (as received from the socket) in
+    to a list of WlanInterface
+    '''
+
+    interfaces = []
+
+    for data in messages:
+        for msg_type, flags, seq, payload in parse_messages(data):
+            if msg_type in (NLMSG_DONE, NLMSG_ERROR) or len(payload) < genlmsghdr.size:
+                continue
+            command = genlmsghdr.unpack_from(payload)[0]
+            if command == NL80211_CMD_NEW_INTERFACE:
+                interfaces.append(parse_interface(payload))
+
+    return interfaces
+
+
+class Nl80211(object):
+
+    '''
+    nl80211 client using a persistent generic netlink socket
+    '''
+
+    def __init__(self):
+
+        self.sock = None
+        self.family_id = None
+        self.seq = 0
+        self.lock = threading.Lock()
+
+    def _socket(self):
+
+        if self.sock is None:
+            self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_GENERIC)
+            self.sock.bind((0, 0))
+        return self.sock
+
+    def close(self):
+
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        self.family_id = None
+
+    def request(self, msg_type, flags, command, attributes=b''):
+
+        '''
+        Send a generic netlink request & return the raw reply buffers,
+        up to & including the end of the reply
+        '''
+
+        sock = self._socket()
+        self.seq += 1
+        seq = self.seq
+
+        body = genlmsghdr.pack(command, 1, 0) + attributes
+        sock.send(nlmsghdr.pack(nlmsghdr.size + len(body), msg_type,
+            flags | NLM_F_REQUEST, seq, 0) + body)
+
+        replies = []
+        dump = flags & NLM_F_DUMP
+
+        while True:
+            data = sock.recv(65536)
+            replies.append(data)
+            for reply_type, reply_flags, reply_seq, payload in parse_messages(data):
+                if reply_seq != seq:
+                    continue
+                if reply_type == NLMSG_ERROR:
+                    error = struct.unpack_from('=i', payload)[0]
+                    if error:
+                        raise OSError(-error, os.strerror(-error))
+                    return replies
+                if reply_type == NLMSG_DONE or not dump:
+                    return replies
+
+    def resolve_family(self):
+
+        '''
+        Look up the generic netlink family id of nl80211
+        '''
+
+        name = b'nl80211\0'
+        attribute = struct.pack('=HH', 4 + len(name), CTRL_ATTR_FAMILY_NAME) + name
+        attribute += b'\0' * (-len(attribute) % 4)
+
+        for data in self.request(GENL_ID_CTRL, 0, CTRL_CMD_GETFAMILY, attribute):
+            for msg_type, flags, seq, payload in parse_messages(data):
+                if msg_type == GENL_ID_CTRL:
+                    attributes = parse_attributes(payload, genlmsghdr.size)
+                    family_id = attributes.get(CTRL_ATTR_FAMILY_ID)
+                    if family_id is not None:
+                        return struct.unpack_from('=H', family_id)[0]
+
+        raise OSError('nl80211 not available')
+
+    def interfaces(self):
+
+        '''
+        Return a list of WlanInterface for all wireless interfaces
+        '''
+
+        with self.lock:
+            try:
+                if self.family_id is None:
+                    self.family_id = self.resolve_family()
+                replies = self.request(self.family_id, NLM_F_DUMP, NL80211_CMD_GET_INTERFACE)
+            except (socket.error, OSError):
+                self.close()
+                raise
+
+        return parse_interface_dump(replies)
@@ -0,0 +1,284 @@
+'''
+Background metric sampler.
+
+Collecting page data (running commands, reading /proc etc.) inside the
+display loop or a button handler freezes the display until the data is
+ready. Instead, each collector is registered with the sampler with its own
+refresh interval and is run on a background thread. Results are published
+in a snapshot dict that is replaced as a whole each time a collector
+finishes, so pages only ever read an already complete set of values and a
+screen paint never waits for data collection.
+
+Collectors that are due at the same time are run concurrently on a small
+worker pool (see fanout.py), so one slow collector does not hold up the
+others. A page that is shown before its data has been collected can wait
+for it, up to a deadline, with get(name, wait=seconds).
+
+Collectors are only run while their data is being used: if nothing has
+read a value for 'idle_after' seconds, its collector is paused until the
+next read. Collectors named with watch() are never paused (e.g. those of a
+page that is shown, but only reads its data again when the data changes).
+
+Usage:
+
+    sampler = Sampler()
+    sampler.add('usb', collect_usb, interval=30)
+    sampler.start()
+    ...
+    usb_devices = sampler.get('usb')    # None until first collected
+    usb_devices = sampler.get('usb', wait=0.5)  # wait up to 0.5s if not yet collected
+'''
+
+import threading
+import time
+
+from fanout import FanOut
+
+# use a monotonic clock where available (Python 3)
+monotonic = getattr(time, 'monotonic', time.time)
+
+
+class Collector(object):
+
+    '''
+    A registered collector function & its schedule
+    '''
+
+    def __init__(self, name, function, interval, idle_after):
+
+        self.name = name
+        self.function = function
+        self.interval = interval
+        self.idle_after = idle_after
+        self.next_due = 0
+        self.last_read = monotonic()
+        self.errors = 0
+        self.running = False
+
+        # refresh() was called while the collector was running: run it
+        # again as soon as it finishes
+        self.refresh_pending = False
+
+    def is_active(self, now):
+
+        return self.idle_after is None or now - self.last_read < self.idle_after
+
+
+class Sampler(object):
+
+    '''
+    Runs collectors on a background thread & publishes their results
+    '''
+
+    def __init__(self, idle_after=60, workers=4, collector_time=None):
+
+        self.idle_after = idle_after
+        self.collectors = {}
+        self.snapshot = {}
+        self.wakeup = threading.Event()
+        self.stopped = False
+        self.thread = None
+
+        # collectors run concurrently on a worker pool
+        self.pool = FanOut(workers, name='sampler')
+
+        # held while publishing, notified when a new value is published
+        self.published = threading.Condition()
+
+        # called with the collector name (on the collector's thread) each
+        # time a collector publishes a value different to its last one
+        self.listeners = []
+
+        # optional histogram of collector run times (see metrics.py)
+        self.collector_time = collector_time
+
+        # collectors kept running even if not read (see watch())
+        self.watched = frozenset()
+
+        # held while a collector's schedule (next_due, running,
+        # refresh_pending) is changed
+        self.schedule_lock = threading.Lock()
+
+    def add(self, name, function, interval, idle_after=None, initial=True):
+
+        '''
+        Register a collector to be run every 'interval' seconds. If initial
+        is False, the collector is not run until its value is first read.
+        '''
+
+        if idle_after is None:
+            idle_after = self.idle_after
+
+        collector = Collector(name, function, interval, idle_after)
+
+        if not initial:
+            collector.last_read -= idle_after
+
+        self.collectors[name] = collector
+        self.wakeup.set()
+
+    def get(self, name, default=None, wait=0):
+
+        '''
+        Return the latest value published by a collector. If nothing has
+        been published yet, wait up to 'wait' seconds for the first value.
+        '''
+
+        self.wait_for([name], wait)
+
+        return self.snapshot.get(name, default)
+
+    def wait_for(self, names, timeout=0):
+
+        '''
+        Mark collectors as read & wait up to 'timeout' seconds (in total)
+        for all of them to have published a value. Returns True if they have.
+        '''
+
+        now = monotonic()
+        names = [ name for name in names if name in self.collectors ]
+
+        for name in names:
+            collector = self.collectors[name]
+            if not collector.is_active(now):
+                # collector was paused - get it running again straight away
+                with self.schedule_lock:
+                    collector.next_due = 0
+                    collector.refresh_pending = collector.running
+                self.wakeup.set()
+            collector.last_read = now
+
+        deadline = now + timeout
+
+        with self.published:
+            while True:
+                missing = [ name for name in names if name not in self.snapshot ]
+                remaining = deadline - monotonic()
+                if not missing or remaining <= 0:
+                    return not missing
+                self.published.wait(remaining)
+
+    def refresh(self, name):
+
+        '''
+        Ask for a collector to be run as soon as possible
+        '''
+
+        collector = self.collectors.get(name)
+
+        if collector is not None:
+            with self.schedule_lock:
+                collector.next_due = 0
+                collector.refresh_pending = collector.running
+            collector.last_read = monotonic()
+            self.wakeup.set()
+
+    def watch(self, names):
+
+        '''
+        Keep the named collectors running, however long since they were
+        last read, until watch() is called again with other names
+        '''
+
+        self.watched = frozenset(names)
+        self.wakeup.set()
+
+    def start(self):
+
+        self.thread = threading.Thread(target=self._run, name='sampler')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+
+        self.stopped = True
+        self.wakeup.set()
+
+    def publish(self, name, value):
+
+        '''
+        Publish a collector value in a new snapshot
+        '''
+
+        with self.published:
+            changed = name not in self.snapshot or self.snapshot[name] != value
+            snapshot = dict(self.snapshot)
+            snapshot[name] = value
+
+            # replacing the reference is atomic, so readers see either the old
+            # or the new snapshot, never a partly updated one
+            self.snapshot = snapshot
+            self.published.notify_all()
+
+        if not changed:
+            return
+
+        for listener in self.listeners:
+            listener(name)
+
+    def collector_done(self, collector, probe):
+
+        '''
+        Called on a worker thread when a collector run has finished
+        '''
+
+        if self.collector_time is not None:
+            self.collector_time.observe(probe.duration, collector=collector.name)
+
+        if probe.error is None:
+            self.publish(collector.name, probe.result)
+        else:
+            collector.errors += 1
+
+        with self.schedule_lock:
+            if collector.refresh_pending:
+                # (its result may be from before whatever it was refreshed for)
+                collector.next_due = 0
+                collector.refresh_pending = False
+            else:
+                collector.next_due = monotonic() + collector.interval
+            collector.running = False
+
+        self.wakeup.set()
+
+    def run_due(self):
+
+        '''
+        Start all collectors that are due on the worker pool. Returns
+        seconds until the next one is due (None if nothing scheduled)
+        '''
+
+        now = monotonic()
+        next_wait = None
+
+        for collector in list(self.collectors.values()):
+
+            if collector.running:
+                continue
+
+            if collector.name not in self.watched and not collector.is_active(now):
+                continue
+
+            if collector.next_due <= now:
+                with self.schedule_lock:
+                    collector.running = True
+                self.pool.submit(collector.name, collector.function,
+                    callback=lambda probe, collector=collector: self.collector_done(collector, probe))
+                continue
+
+            wait = collector.next_due - now
+            if next_wait is None or wait < next_wait:
+                next_wait = wait
+
+        return next_wait
+
+    def _run(self):
+
+        while not self.stopped:
+
+            self.wakeup.clear()
+            wait = self.run_due()
+
+            # sleep until the next collector is due, or one finishes or is
+            # read again (forever if nothing is active)
+            self.wakeup.wait(wait)
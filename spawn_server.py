@@ -0,0 +1,482 @@
+'''
+Spawn server: runs external commands on behalf of the display process.
+
+Running a command with subprocess from the display process means forking
+the whole interpreter (with PIL, fonts, frame caches etc. loaded) and then,
+with shell=True, exec'ing /bin/sh to run it. On a memory constrained unit
+that is a large part of the time taken to show a page.
+
+Instead, a small helper process (this module run as a script, with no
+site packages) is started once at boot. Commands are sent to it as argv
+lists over a pipe and are exec'd directly, with no shell. Their stdout &
+stderr are streamed back in chunks as they are produced, followed by the
+exit code. Several commands can be in progress at once: each request has
+an id & the helper runs each command on its own thread.
+
+Framing (both directions): 1 byte frame type, 4 byte request id, 4 byte
+payload length, then the payload.
+
+    'R'  request: 4 byte timeout (ms, 0 = none) + NUL separated argv
+    'O'  chunk of stdout
+    'E'  chunk of stderr
+    'X'  command finished: 4 byte signed exit code (-N: killed by signal N)
+
+SpawnClient.check_output() & call() mirror the subprocess functions (but
+take an argv list only). If the helper can't be started or dies, commands
+are run directly with subprocess instead.
+
+Usage:
+
+    spawner = spawn_server.SpawnClient()
+    spawner.start()
+    output = spawner.check_output(['/usr/sbin/ufw', 'status'])
+
+Run this module with --benchmark to compare per-call latency with running
+the same command via subprocess (shell=True) from this process.
+'''
+
+import os
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+# use a monotonic clock where available (Python 3)
+monotonic = getattr(time, 'monotonic', time.time)
+
+frame_header = struct.Struct('=cII')    # type, request id, payload length
+exit_code = struct.Struct('=i')
+request_timeout = struct.Struct('=I')
+
+REQUEST = b'R'
+STDOUT = b'O'
+STDERR = b'E'
+EXIT = b'X'
+
+# exit code reported when a command could not be run (as a shell would)
+not_found_exit_code = 127
+
+chunk_size = 65536
+
+
+def read_exactly(fd, size):
+
+    '''
+    Read 'size' bytes from a file descriptor (b'' at end of file)
+    '''
+
+    data = b''
+
+    while len(data) < size:
+        chunk = os.read(fd, size - len(data))
+        if not chunk:
+            return b''
+        data += chunk
+
+    return data
+
+
+def read_frame(fd):
+
+    '''
+    Return (type, request id, payload), or None at end of file
+    '''
+
+    header = read_exactly(fd, frame_header.size)
+    if not header:
+        return None
+
+    frame_type, request_id, length = frame_header.unpack(header)
+    payload = read_exactly(fd, length) if length else b''
+
+    if length and not payload:
+        return None
+
+    return (frame_type, request_id, payload)
+
+
+def write_frame(fd, frame_type, request_id, payload=b''):
+
+    data = frame_header.pack(frame_type, request_id, len(payload)) + payload
+
+    while data:
+        written = os.write(fd, data)
+        data = data[written:]
+
+
+def encode_argv(argv):
+
+    if str is bytes:
+        return b'\0'.join(argv)
+    return b'\0'.join(os.fsencode(arg) for arg in argv)
+
+
+def decode_argv(data):
+
+    argv = data.split(b'\0')
+
+    if str is bytes:
+        return argv
+    return [ os.fsdecode(arg) for arg in argv ]
+
+
+#########################
+# server (helper) side
+#########################
+
+class SpawnServer(object):
+
+    '''
+    Reads requests from in_fd & writes results to out_fd
+    '''
+
+    def __init__(self, in_fd=0, out_fd=1):
+
+        self.in_fd = in_fd
+        self.out_fd = out_fd
+        self.write_lock = threading.Lock()
+        self.devnull = os.open(os.devnull, os.O_RDONLY)
+
+    def send(self, frame_type, request_id, payload=b''):
+
+        with self.write_lock:
+            write_frame(self.out_fd, frame_type, request_id, payload)
+
+    def forward(self, stream, frame_type, request_id):
+
+        while True:
+            chunk = os.read(stream.fileno(), chunk_size)
+            if not chunk:
+                break
+            self.send(frame_type, request_id, chunk)
+
+        stream.close()
+
+    def run_command(self, request_id, timeout, argv):
+
+        try:
+            process = subprocess.Popen(argv, stdin=self.devnull,
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE, close_fds=True)
+        except (OSError, ValueError) as ex:
+            self.send(STDERR, request_id, str(ex).encode('utf-8', 'replace'))
+            self.send(EXIT, request_id, exit_code.pack(not_found_exit_code))
+            return
+
+        timer = None
+        if timeout:
+            timer = threading.Timer(timeout, process.kill)
+            timer.start()
+
+        stderr_thread = threading.Thread(target=self.forward,
+            args=(process.stderr, STDERR, request_id))
+        stderr_thread.daemon = True
+        stderr_thread.start()
+
+        self.forward(process.stdout, STDOUT, request_id)
+        stderr_thread.join()
+        returncode = process.wait()
+
+        if timer is not None:
+            timer.cancel()
+
+        self.send(EXIT, request_id, exit_code.pack(returncode))
+
+    def serve(self):
+
+        while True:
+
+            frame = read_frame(self.in_fd)
+
+            # display process has gone away
+            if frame is None:
+                break
+
+            frame_type, request_id, payload = frame
+
+            if frame_type != REQUEST:
+                continue
+
+            timeout_ms = request_timeout.unpack_from(payload)[0]
+            argv = decode_argv(payload[request_timeout.size:])
+
+            thread = threading.Thread(target=self.run_command,
+                args=(request_id, timeout_ms / 1000.0, argv))
+            thread.daemon = True
+            thread.start()
+
+
+#########################
+# client side
+#########################
+
+class CommandResult(object):
+
+    '''
+    Output & exit code of a command run by the spawn server
+    '''
+
+    def __init__(self, argv):
+
+        self.argv = argv
+        self.stdout = []
+        self.stderr = []
+        self.returncode = None
+        self.done = threading.Event()
+
+    @property
+    def output(self):
+        return b''.join(self.stdout)
+
+    @property
+    def errors(self):
+        return b''.join(self.stderr)
+
+
+class SpawnClient(object):
+
+    '''
+    Sends commands to a spawn server helper process
+    '''
+
+    def __init__(self, python=None, command_time=None):
+
+        self.python = python or sys.executable
+        self.process = None
+        self.pending = {}
+        self.next_id = 0
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.reader = None
+
+        # commands sent to the helper & run directly (helper not available)
+        self.served = 0
+        self.fallbacks = 0
+
+        # optional histogram of command run times (see metrics.py)
+        self.command_time = command_time
+
+    def start(self):
+
+        '''
+        Start the helper process (-S: no site packages, -E: ignore
+        PYTHON* environment variables - it only needs the standard library)
+        '''
+
+        try:
+            self.process = subprocess.Popen(
+                [self.python, '-S', '-E', os.path.abspath(__file__.replace('.pyc', '.py')), '--serve'],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, close_fds=True)
+        except OSError:
+            self.process = None
+            return False
+
+        self.reader = threading.Thread(target=self._read_replies, name='spawn-client')
+        self.reader.daemon = True
+        self.reader.start()
+
+        return True
+
+    def stop(self):
+
+        if self.process is not None:
+            self.process.stdin.close()
+            self.process.wait()
+            self.process = None
+
+    @property
+    def running(self):
+
+        return self.process is not None and self.process.poll() is None
+
+    def _read_replies(self):
+
+        fd = self.process.stdout.fileno()
+
+        while True:
+
+            frame = read_frame(fd)
+
+            if frame is None:
+                break
+
+            frame_type, request_id, payload = frame
+
+            with self.lock:
+                result = self.pending.get(request_id)
+
+            if result is None:
+                continue
+
+            if frame_type == STDOUT:
+                result.stdout.append(payload)
+            elif frame_type == STDERR:
+                result.stderr.append(payload)
+            elif frame_type == EXIT:
+                result.returncode = exit_code.unpack(payload)[0]
+                with self.lock:
+                    del self.pending[request_id]
+                result.done.set()
+
+        # helper has gone: fail anything still waiting (run directly instead)
+        with self.lock:
+            self.process = None
+            pending = list(self.pending.values())
+            self.pending = {}
+
+        for result in pending:
+            result.done.set()
+
+    def _run_direct(self, argv, timeout):
+
+        self.fallbacks += 1
+        result = CommandResult(argv)
+
+        try:
+            process = subprocess.Popen(argv, stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE, close_fds=True)
+        except OSError as ex:
+            result.stderr.append(str(ex).encode('utf-8', 'replace'))
+            result.returncode = not_found_exit_code
+            return result
+
+        timer = None
+        if timeout:
+            timer = threading.Timer(timeout, process.kill)
+            timer.start()
+
+        stdout, stderr = process.communicate()
+
+        if timer is not None:
+            timer.cancel()
+
+        result.stdout.append(stdout)
+        result.stderr.append(stderr)
+        result.returncode = process.returncode
+        return result
+
+    def run(self, argv, timeout=None):
+
+        '''
+        Run a command (argv list, no shell) & return its CommandResult
+        '''
+
+        if self.command_time is None:
+            return self._run(argv, timeout)
+
+        start = monotonic()
+        try:
+            return self._run(argv, timeout)
+        finally:
+            self.command_time.observe(monotonic() - start, command=os.path.basename(argv[0]))
+
+    def _run(self, argv, timeout):
+
+        result = CommandResult(argv)
+
+        with self.lock:
+            process = self.process
+            if process is not None:
+                self.next_id = (self.next_id + 1) & 0xffffffff
+                request_id = self.next_id
+                self.pending[request_id] = result
+
+        if process is None:
+            return self._run_direct(argv, timeout)
+
+        payload = request_timeout.pack(int((timeout or 0) * 1000)) + encode_argv(argv)
+
+        try:
+            with self.write_lock:
+                write_frame(process.stdin.fileno(), REQUEST, request_id, payload)
+        except (OSError, IOError, ValueError):
+            with self.lock:
+                self.pending.pop(request_id, None)
+            return self._run_direct(argv, timeout)
+
+        result.done.wait()
+
+        # helper died part way through
+        if result.returncode is None:
+            return self._run_direct(argv, timeout)
+
+        self.served += 1
+        return result
+
+    def call(self, argv, timeout=None):
+
+        '''
+        Run a command & return its exit code (like subprocess.call)
+        '''
+
+        return self.run(argv, timeout).returncode
+
+    def check_output(self, argv, timeout=None, universal_newlines=False):
+
+        '''
+        Run a command & return its stdout (like subprocess.check_output):
+        bytes, or text with universal_newlines (decoded as UTF-8, with
+        CRLF & CR line endings turned in to LF). Raises
+        subprocess.CalledProcessError if it fails.
+        '''
+
+        result = self.run(argv, timeout)
+
+        if result.returncode != 0:
+            raise subprocess.CalledProcessError(result.returncode, argv, result.output)
+
+        output = result.output
+
+        if universal_newlines:
+            if str is not bytes:
+                output = output.decode('utf-8', 'replace')
+            output = output.replace('\r\n', '\n').replace('\r', '\n')
+
+        return output
+
+
+def benchmark(argv=('/bin/true',), runs=50):
+
+    '''
+    Compare per-call latency of subprocess (shell=True) from this process
+    with the spawn server, with this process made roughly as large as the
+    display process (~40MB of heap)
+    '''
+
+    ballast = [ bytearray(1024 * 1024) for n in range(40) ]
+
+    client = SpawnClient()
+    client.start()
+    client.check_output(list(argv))
+
+    def measure(function):
+        times = []
+        for n in range(runs):
+            start = monotonic()
+            function()
+            times.append(monotonic() - start)
+        times.sort()
+        return (times[len(times) // 2] * 1000, times[int(len(times) * 0.95)] * 1000)
+
+    command = ' '.join(argv)
+
+    results = [
+        ('subprocess shell=True', measure(lambda: subprocess.check_output(command, shell=True))),
+        ('subprocess argv', measure(lambda: subprocess.check_output(list(argv)))),
+        ('spawn server', measure(lambda: client.check_output(list(argv)))),
+    ]
+
+    client.stop()
+
+    print('{} x {!r} ({} MB ballast)'.format(runs, command, len(ballast)))
+    for name, (median, p95) in results:
+        print('  {:<22} median {:6.2f} ms   p95 {:6.2f} ms'.format(name, median, p95))
+
+
+if __name__ == '__main__':
+
+    if '--serve' in sys.argv:
+        SpawnServer().serve()
+    elif '--benchmark' in sys.argv:
+        args = [ arg for arg in sys.argv[1:] if arg != '--benchmark' ]
+        benchmark(args or ['/bin/true'])
@@ -0,0 +1,347 @@
+'''
+Native SSD1306 OLED driver using I2C_RDWR block transfers.
+
+The FriendlyARM bakebit_128_64_oled driver sends commands one I2C write at
+a time and data in 32 byte SMBus blocks (or a byte at a time), and blanks
+the screen by writing 1KB of zeros. This driver talks to /dev/i2c-N
+directly: the address window commands & the data for a region are sent
+together in a single I2C_RDWR ioctl, as messages of up to 'max_transfer'
+bytes (the kernel allows up to 8192 bytes per message, most adapters take
+a whole frame in one). Blanking switches the panel off (0xAE) & back on
+(0xAF), leaving its RAM untouched.
+
+Each I2C message to the SSD1306 starts with a control byte: 0x00 for
+commands, 0x40 for display data.
+
+SSD1306 has the same write_region()/clear()/power()/end_frame() interface
+as the devices in display_devices.py, so it can be used with FrameDiff.
+
+FakeI2CBus stands in for /dev/i2c-N: it records each transaction (in
+memory & optionally to a file, one line per transaction) for tests &
+throughput measurements. Run this module to compare the bytes & I2C
+transactions needed for some typical frames with the vendor driver's:
+
+    python ssd1306_i2c.py [record file]
+
+Usage:
+
+    panel = ssd1306_i2c.SSD1306(ssd1306_i2c.I2CBus(0))
+    panel.init()
+    display = frame_diff.FrameDiff(panel)
+'''
+
+import ctypes
+import ctypes.util
+import errno
+import os
+
+# i2c-dev ioctls (linux/i2c-dev.h)
+I2C_FUNCS = 0x0705
+I2C_RDWR = 0x0707
+
+I2C_FUNC_I2C = 0x00000001
+
+# limits of the I2C_RDWR ioctl (linux/i2c-dev.h & i2c-dev.c)
+I2C_RDWR_IOCTL_MAX_MSGS = 42
+I2C_RDWR_MAX_MSG_LEN = 8192
+
+# SSD1306 control bytes
+COMMAND = 0x00
+DATA = 0x40
+
+# SSD1306 commands
+DISPLAY_OFF = 0xAE
+DISPLAY_ON = 0xAF
+SET_COLUMN_ADDRESS = 0x21
+SET_PAGE_ADDRESS = 0x22
+
+# 128x64 panel set-up: clock, multiplex, offset, start line, charge pump,
+# horizontal addressing, segment remap, COM scan direction & pins,
+# contrast, pre-charge, VCOMH, resume from RAM, normal (non-inverse) display
+init_sequence = [
+    DISPLAY_OFF,
+    0xD5, 0x80,
+    0xA8, 0x3F,
+    0xD3, 0x00,
+    0x40,
+    0x8D, 0x14,
+    0x20, 0x00,
+    0xA1,
+    0xC8,
+    0xDA, 0x12,
+    0x81, 0xCF,
+    0xD9, 0xF1,
+    0xDB, 0x40,
+    0xA4,
+    0xA6,
+]
+
+
+class i2c_msg(ctypes.Structure):
+
+    _fields_ = [
+        ('addr', ctypes.c_uint16),
+        ('flags', ctypes.c_uint16),
+        ('len', ctypes.c_uint16),
+        ('buf', ctypes.POINTER(ctypes.c_uint8)),
+    ]
+
+
+class i2c_rdwr_ioctl_data(ctypes.Structure):
+
+    _fields_ = [
+        ('msgs', ctypes.POINTER(i2c_msg)),
+        ('nmsgs', ctypes.c_uint32),
+    ]
+
+
+class I2CBus(object):
+
+    '''
+    /dev/i2c-N, written with combined I2C_RDWR transactions
+    '''
+
+    def __init__(self, bus=0, max_transfer=I2C_RDWR_MAX_MSG_LEN):
+
+        self.path = '/dev/i2c-{}'.format(bus)
+        self.fd = os.open(self.path, os.O_RDWR)
+        self.max_transfer = min(max_transfer, I2C_RDWR_MAX_MSG_LEN)
+        self.max_messages = I2C_RDWR_IOCTL_MAX_MSGS
+
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+
+        functions = ctypes.c_ulong()
+        if self.libc.ioctl(self.fd, I2C_FUNCS, ctypes.byref(functions)) == 0 \
+                and not functions.value & I2C_FUNC_I2C:
+            raise IOError(errno.EOPNOTSUPP, '{} does not support I2C_RDWR'.format(self.path))
+
+    def transfer(self, address, messages):
+
+        '''
+        Write each of messages (bytes) to the device at address, as one
+        combined transaction
+        '''
+
+        count = len(messages)
+        msgs = (i2c_msg * count)()
+        buffers = []
+
+        for i, message in enumerate(messages):
+            buffer = (ctypes.c_uint8 * len(message)).from_buffer_copy(bytes(message))
+            buffers.append(buffer)
+            msgs[i].addr = address
+            msgs[i].flags = 0
+            msgs[i].len = len(message)
+            msgs[i].buf = buffer
+
+        data = i2c_rdwr_ioctl_data(msgs, count)
+
+        if self.libc.ioctl(self.fd, I2C_RDWR, ctypes.byref(data)) < 0:
+            error = ctypes.get_errno()
+            raise IOError(error, '{}: {}'.format(self.path, os.strerror(error)))
+
+    def close(self):
+
+        os.close(self.fd)
+
+
+class FakeI2CBus(object):
+
+    '''
+    Records I2C transactions instead of sending them. If record_file is
+    given, each transaction is also written to it as a line:
+
+        3c 00:21,00,7f,22,00,00 40:ff,ff,...
+    '''
+
+    def __init__(self, record_file=None, max_transfer=I2C_RDWR_MAX_MSG_LEN):
+
+        self.max_transfer = max_transfer
+        self.max_messages = I2C_RDWR_IOCTL_MAX_MSGS
+        self.transactions = []
+        self.record = open(record_file, 'w') if record_file else None
+
+    def transfer(self, address, messages):
+
+        messages = [ bytearray(message) for message in messages ]
+
+        if len(messages) > self.max_messages:
+            raise IOError(errno.EINVAL, 'too many messages in one transaction')
+
+        for message in messages:
+            if len(message) > self.max_transfer:
+                raise IOError(errno.EINVAL, 'message longer than max_transfer')
+
+        self.transactions.append((address, messages))
+
+        if self.record is not None:
+            self.record.write('{:02x} {}\n'.format(address, ' '.join(
+                '{:02x}:{}'.format(message[0], ','.join('{:02x}'.format(byte) for byte in message[1:]))
+                for message in messages)))
+
+    @property
+    def bytes_sent(self):
+
+        # each message costs its bytes plus the address byte
+        return sum(len(message) + 1 for address, messages in self.transactions
+            for message in messages)
+
+    def reset(self):
+
+        self.transactions = []
+
+    def close(self):
+
+        if self.record is not None:
+            self.record.close()
+
+
+class SSD1306(object):
+
+    '''
+    128x64 SSD1306 panel on an I2C bus
+    '''
+
+    def __init__(self, bus, address=0x3c, width=128, height=64):
+
+        self.bus = bus
+        self.address = address
+        self.width = width
+        self.height = height
+        self.powered = False
+
+    def _messages(self, commands, data=None):
+
+        '''
+        A command message & data messages of at most max_transfer bytes
+        '''
+
+        messages = [ bytearray([COMMAND] + commands) ]
+
+        if data:
+            chunk = self.bus.max_transfer - 1
+            for start in range(0, len(data), chunk):
+                messages.append(bytearray([DATA]) + data[start:start + chunk])
+
+        return messages
+
+    def _send(self, messages):
+
+        # as few transactions as the bus allows
+        step = self.bus.max_messages
+        for start in range(0, len(messages), step):
+            self.bus.transfer(self.address, messages[start:start + step])
+
+    def init(self):
+
+        self._send(self._messages(list(init_sequence)))
+        self.clear()
+        self.power(True)
+
+    def write_region(self, page, column, data):
+
+        '''
+        Write the column bytes in data to the given page, starting at column
+        '''
+
+        data = bytearray(data)
+
+        self._send(self._messages([
+            SET_COLUMN_ADDRESS, column, column + len(data) - 1,
+            SET_PAGE_ADDRESS, page, page], data))
+
+    def write_frame(self, data):
+
+        '''
+        Write a whole frame (width x pages column bytes) in one transaction
+        '''
+
+        self._send(self._messages([
+            SET_COLUMN_ADDRESS, 0, self.width - 1,
+            SET_PAGE_ADDRESS, 0, self.height // 8 - 1], bytearray(data)))
+
+    def clear(self):
+
+        '''
+        Blank the panel RAM
+        '''
+
+        self.write_frame(bytearray(self.width * self.height // 8))
+
+    def power(self, on):
+
+        '''
+        Switch the panel on or off (RAM contents are kept while off)
+        '''
+
+        self._send(self._messages([DISPLAY_ON if on else DISPLAY_OFF]))
+        self.powered = on
+
+    def end_frame(self):
+
+        pass
+
+
+def compare_with_vendor(record_file=None):
+
+    '''
+    Print the bytes & I2C transactions needed to send a full frame, a clock
+    tick & to blank the screen, with this driver & with the vendor driver
+    (through BakebitDevice)
+    '''
+
+    import frame_diff
+    from PIL import Image, ImageDraw
+
+    bus = FakeI2CBus(record_file)
+    display = frame_diff.FrameDiff(SSD1306(bus))
+
+    image = Image.new('1', (128, 64))
+    draw = ImageDraw.Draw(image)
+
+    def frame(text):
+        draw.rectangle((0, 0, 128, 64), outline=0, fill=0)
+        draw.text((0, 0), 'WLAN Pi', fill=255)
+        draw.text((0, 26), text, fill=255)
+        draw.text((100, 55), 'Back', fill=255)
+        return image
+
+    def vendor_cost():
+        # for each region: 6 window commands, each a 3 byte write (address,
+        # control, command), then the data in 32 byte SMBus block writes
+        # (address, control & up to 32 bytes)
+        sent = transactions = 0
+        for address, messages in bus.transactions:
+            data = sum(len(message) - 1 for message in messages[1:])
+            blocks = (data + 31) // 32
+            sent += 6 * 3 + data + blocks * 2
+            transactions += 6 + blocks
+        return (sent, transactions)
+
+    print('{:<14} {:>16} {:>16}'.format('', 'I2C_RDWR', 'vendor driver'))
+
+    for name, action in [
+            ('full frame', lambda: display.push(frame('12:34:56'))),
+            ('clock tick', lambda: display.push(frame('12:34:57'))),
+            ('blank screen', display.blank)]:
+
+        bus.reset()
+        action()
+
+        if name == 'blank screen':
+            # vendor clearDisplay(): the whole frame, as zeros
+            vendor = (6 * 3 + 1024 + 32 * 2, 6 + 32)
+        else:
+            vendor = vendor_cost()
+
+        print('{:<14} {:>6} B {:>3} tx {:>7} B {:>4} tx'.format(name, bus.bytes_sent,
+            len(bus.transactions), vendor[0], vendor[1]))
+
+    bus.close()
+
+
+if __name__ == '__main__':
+
+    import sys
+
+    compare_with_vendor(sys.argv[1] if len(sys.argv) > 1 else None)
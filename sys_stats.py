@@ -0,0 +1,274 @@
+'''
+In-process system statistics collectors for the Summary page.
+
+These replace the top/free/df shell pipelines previously used to build the
+Summary page. The kernel already publishes everything we need in /proc and
+/sys, so the files are kept open and simply re-read from the start on each
+refresh (no processes are spawned).
+
+Usage:
+
+    stats = sys_stats.SystemStats()
+    stats.loadavg().one         # 1 minute load average
+    stats.memory().used_mb      # memory used, as shown by 'free -m'
+    stats.disk_usage('/')       # root filesystem usage, as shown by 'df -h'
+    stats.thermal_zones()       # list of ThermalZone
+'''
+
+import glob
+import math
+import os
+from collections import namedtuple
+
+
+class ProcFile(object):
+
+    '''
+    A /proc or /sys file that is kept open & re-read from the start
+    '''
+
+    def __init__(self, path):
+
+        self.path = path
+        self.fd = None
+
+    def read(self):
+
+        '''
+        Return the current content of the file as a string. If the read
+        fails, the file is closed & opened again by the next read (e.g. the
+        sysfs files of a network interface that has been re-registered).
+        '''
+
+        if self.fd is None:
+            self.fd = os.open(self.path, os.O_RDONLY)
+
+        chunks = []
+        offset = 0
+
+        try:
+            while True:
+                if hasattr(os, 'pread'):
+                    chunk = os.pread(self.fd, 4096, offset)
+                else:
+                    os.lseek(self.fd, offset, os.SEEK_SET)
+                    chunk = os.read(self.fd, 4096)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                offset += len(chunk)
+        except OSError:
+            self.close()
+            raise
+
+        return b''.join(chunks).decode('ascii', 'replace')
+
+    def close(self):
+
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class LoadAvg(namedtuple('LoadAvg', 'one five fifteen running total')):
+
+    '''
+    Load averages & task counts from /proc/loadavg
+    '''
+
+
+class MemInfo(namedtuple('MemInfo', 'total free available buffers cached')):
+
+    '''
+    Memory usage from /proc/meminfo (all values in kB). 'cached' includes
+    reclaimable slab, as reported by 'free'.
+    '''
+
+    @property
+    def used(self):
+        return self.total - self.free - self.buffers - self.cached
+
+    @property
+    def total_mb(self):
+        return self.total // 1024
+
+    @property
+    def used_mb(self):
+        return self.used // 1024
+
+
+class CpuTimes(namedtuple('CpuTimes', 'user nice system idle iowait irq softirq steal')):
+
+    '''
+    Aggregate CPU times from /proc/stat (in clock ticks)
+    '''
+
+    @property
+    def total(self):
+        return sum(self)
+
+    @property
+    def busy(self):
+        return self.total - self.idle - self.iowait
+
+
+class DiskUsage(namedtuple('DiskUsage', 'total used available')):
+
+    '''
+    Filesystem usage from statvfs (all values in bytes)
+    '''
+
+    @property
+    def percent(self):
+
+        # rounded up, as 'df' does
+        if self.used + self.available == 0:
+            return 0
+        return int(math.ceil(self.used * 100.0 / (self.used + self.available)))
+
+
+class ThermalZone(namedtuple('ThermalZone', 'name type millidegrees')):
+
+    '''
+    A thermal zone temperature from /sys/class/thermal
+    '''
+
+    @property
+    def celsius(self):
+
+        # a few drivers report whole degrees rather than millidegrees
+        if self.millidegrees > 1000:
+            return self.millidegrees // 1000
+        return self.millidegrees
+
+
+def human_size(size):
+
+    '''
+    Return (value, unit) for a size in bytes, as 'df -h' would show it
+    (powers of 1024, rounded up, one decimal place below 10)
+    '''
+
+    value = float(size)
+    unit = ''
+
+    for next_unit in ['K', 'M', 'G', 'T', 'P']:
+        if value < 1024:
+            break
+        value /= 1024
+        unit = next_unit
+
+    if unit and value < 10:
+        value = math.ceil(value * 10) / 10
+    else:
+        value = math.ceil(value)
+
+    return (value, unit)
+
+
+class SystemStats(object):
+
+    '''
+    Collects system statistics from long-lived /proc and /sys file handles
+    '''
+
+    def __init__(self, thermal_root='/sys/class/thermal'):
+
+        self.loadavg_file = ProcFile('/proc/loadavg')
+        self.meminfo_file = ProcFile('/proc/meminfo')
+        self.stat_file = ProcFile('/proc/stat')
+        self.thermal_root = thermal_root
+        self.thermal_files = None
+        self.last_cpu_times = None
+
+    def loadavg(self):
+
+        fields = self.loadavg_file.read().split()
+        running, total = fields[3].split('/')
+
+        return LoadAvg(float(fields[0]), float(fields[1]), float(fields[2]),
+            int(running), int(total))
+
+    def memory(self):
+
+        values = {}
+
+        for line in self.meminfo_file.read().splitlines():
+            fields = line.split()
+            if len(fields) >= 2:
+                values[fields[0].rstrip(':')] = int(fields[1])
+
+        total = values.get('MemTotal', 0)
+        free = values.get('MemFree', 0)
+
+        return MemInfo(
+            total=total,
+            free=free,
+            available=values.get('MemAvailable', free),
+            buffers=values.get('Buffers', 0),
+            cached=values.get('Cached', 0) + values.get('SReclaimable', 0))
+
+    def cpu_times(self):
+
+        for line in self.stat_file.read().splitlines():
+            if line.startswith('cpu '):
+                fields = [int(field) for field in line.split()[1:9]]
+                fields += [0] * (8 - len(fields))
+                return CpuTimes(*fields)
+
+        return CpuTimes(0, 0, 0, 0, 0, 0, 0, 0)
+
+    def cpu_percent(self):
+
+        '''
+        CPU utilisation (%) since the last call (or since boot on first call)
+        '''
+
+        times = self.cpu_times()
+        last = self.last_cpu_times
+        self.last_cpu_times = times
+
+        if last is None:
+            total = times.total
+            busy = times.busy
+        else:
+            total = times.total - last.total
+            busy = times.busy - last.busy
+
+        if total <= 0:
+            return 0.0
+        return busy * 100.0 / total
+
+    def disk_usage(self, path='/'):
+
+        fs = os.statvfs(path)
+
+        return DiskUsage(
+            total=fs.f_blocks * fs.f_frsize,
+            used=(fs.f_blocks - fs.f_bfree) * fs.f_frsize,
+            available=fs.f_bavail * fs.f_frsize)
+
+    def thermal_zones(self):
+
+        if self.thermal_files is None:
+            self.thermal_files = []
+            zone_dirs = glob.glob(os.path.join(self.thermal_root, 'thermal_zone*'))
+            zone_dirs.sort(key=lambda zone_dir: int(zone_dir.rsplit('zone', 1)[1] or 0))
+            for zone_dir in zone_dirs:
+                try:
+                    with open(os.path.join(zone_dir, 'type')) as type_file:
+                        zone_type = type_file.read().strip()
+                except (IOError, OSError):
+                    zone_type = 'unknown'
+                self.thermal_files.append((os.path.basename(zone_dir), zone_type,
+                    ProcFile(os.path.join(zone_dir, 'temp'))))
+
+        zones = []
+
+        for name, zone_type, temp_file in self.thermal_files:
+            try:
+                zones.append(ThermalZone(name, zone_type, int(temp_file.read())))
+            except (IOError, OSError, ValueError):
+                continue
+
+        return zones
@@ -0,0 +1,9 @@
+'''
+The project's modules live at the top of the repository (they are
+installed as a flat directory), so make them importable from the tests.
+'''
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,76 @@
+'''
+Control socket 'key' requests: argument checks & the press count limit
+'''
+
+import unittest
+
+import bakebit_nanohat_oled as oled
+from button_queue import ButtonQueue
+from event_loop import EventLoop
+
+
+class FakeConnection(object):
+
+    def __init__(self):
+
+        self.replies = []
+
+    def send(self, reply):
+
+        self.replies.append(reply)
+
+
+class ControlKeyTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.saved = (oled.event_loop, oled.button_queue, oled.button_timer)
+
+        oled.event_loop = EventLoop()
+        oled.button_queue = ButtonQueue()
+        oled.button_timer = None
+        self.connection = FakeConnection()
+
+    def tearDown(self):
+
+        for waiter in oled.queued_waiters:
+            waiter[2].cancel()
+        del oled.queued_waiters[:]
+
+        oled.event_loop.close()
+        (oled.event_loop, oled.button_queue, oled.button_timer) = self.saved
+
+    def key(self, *args):
+
+        oled.control_key(self.connection, list(args))
+        return len(oled.button_queue)
+
+    def test_one_press(self):
+
+        self.assertEqual(self.key('down'), 1)
+        self.assertEqual(self.connection.replies, [])
+        self.assertEqual(len(oled.queued_waiters), 1)
+
+    def test_count(self):
+
+        self.assertEqual(self.key('next', '3'), 3)
+
+    def test_count_clamped(self):
+
+        self.assertEqual(self.key('down', '100000'), oled.key_count_max)
+        oled.button_queue = ButtonQueue()
+        self.assertEqual(self.key('down', '-5'), 1)
+
+    def test_bad_requests(self):
+
+        for args in ((), ('up',), ('down', 'lots'), ('down', '1.5')):
+            self.connection.replies = []
+            self.assertEqual(self.key(*args), 0)
+            self.assertEqual(self.connection.replies,
+                [{'ok': False, 'error': 'usage: key down|next|back [count]'}])
+
+        self.assertEqual(oled.queued_waiters, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
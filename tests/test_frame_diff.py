@@ -0,0 +1,86 @@
+'''
+Bytes sent by FrameDiff, measured with CountingDevice
+'''
+
+import unittest
+
+from PIL import Image, ImageDraw
+
+from display_devices import CountingDevice, WINDOW_COMMAND_BYTES
+from frame_diff import FrameDiff, width, height, pages
+
+
+def clock_frame(seconds):
+
+    image = Image.new('1', (width, height))
+    draw = ImageDraw.Draw(image)
+    draw.text((0, 0), 'WLAN Pi', fill=255)
+    draw.text((0, 26), '12:34:{:02d}'.format(seconds), fill=255)
+    draw.text((100, 55), 'Back', fill=255)
+
+    return image
+
+
+class FrameDiffTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.device = CountingDevice()
+        self.display = FrameDiff(self.device)
+
+    def test_first_push_sends_full_frame(self):
+
+        sent = self.display.push(clock_frame(0))
+
+        self.assertEqual(sent, width * pages)
+        self.assertEqual(self.device.data_bytes, width * pages)
+        self.assertEqual(self.device.writes, pages)
+
+    def test_identical_frame_sends_nothing(self):
+
+        self.display.push(clock_frame(0))
+        self.device.reset_counters()
+
+        self.assertEqual(self.display.push(clock_frame(0)), 0)
+        self.assertEqual(self.device.bytes_sent, 0)
+        self.assertEqual(self.display.frames_skipped, 1)
+
+    def test_clock_tick_sends_only_changed_runs(self):
+
+        self.display.push(clock_frame(56))
+        self.device.reset_counters()
+
+        sent = self.display.push(clock_frame(57))
+
+        # only the last digit changes: one run in each page the text covers
+        self.assertGreater(sent, 0)
+        self.assertLess(sent, 2 * 8)
+        self.assertTrue(1 <= self.device.writes <= 2)
+        self.assertEqual(self.device.command_bytes, self.device.writes * WINDOW_COMMAND_BYTES)
+
+        # & the device ends up with the same RAM as a full push of the frame
+        fresh = CountingDevice()
+        FrameDiff(fresh).push(clock_frame(57))
+        self.assertEqual(self.device.ram, fresh.ram)
+
+    def test_invalidate_forces_full_frame(self):
+
+        self.display.push(clock_frame(0))
+        self.device.reset_counters()
+
+        self.display.invalidate()
+
+        self.assertEqual(self.display.push(clock_frame(0)), width * pages)
+        self.assertEqual(self.device.data_bytes, width * pages)
+
+    def test_clear_then_blank_frame_sends_nothing(self):
+
+        self.display.push(clock_frame(0))
+        self.display.clear()
+        self.device.reset_counters()
+
+        self.assertEqual(self.display.push(Image.new('1', (width, height))), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
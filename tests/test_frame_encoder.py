@@ -0,0 +1,94 @@
+'''
+SSD1306 frame encoders, against reference_encode()
+'''
+
+import random
+import unittest
+
+from PIL import Image, ImageDraw
+
+import frame_encoder
+from frame_encoder import reference_encode, lut_encode, width, height, pages
+
+size = width * height // 8
+
+
+def sample_frames():
+
+    rng = random.Random(7)
+    frames = [bytearray(size), bytearray(b'\xff' * size)]
+
+    # every bit of the first & last bytes, plus a few anywhere
+    for bit in range(8):
+        for index in (0, size - 1, rng.randrange(size)):
+            frame = bytearray(size)
+            frame[index] = 0x80 >> bit
+            frames.append(frame)
+
+    for n in range(20):
+        frames.append(bytearray(rng.getrandbits(8) for i in range(size)))
+
+    return frames
+
+
+class ReferenceTest(unittest.TestCase):
+
+    def test_blank_and_full(self):
+
+        self.assertEqual(reference_encode(bytearray(size)), bytearray(width * pages))
+        self.assertEqual(reference_encode(b'\xff' * size), bytearray(b'\xff' * width * pages))
+
+    def test_pixel_positions(self):
+
+        # pixel (x, y) is bit y % 8 of column x in page y // 8
+        for (x, y) in ((0, 0), (5, 9), (127, 63), (64, 31)):
+            image = Image.new('1', (width, height))
+            image.putpixel((x, y), 1)
+            out = reference_encode(image.tobytes())
+            expected = bytearray(width * pages)
+            expected[(y // 8) * width + x] = 1 << (y % 8)
+            self.assertEqual(out, expected, (x, y))
+
+
+class EncoderTest(unittest.TestCase):
+
+    def check(self, encoder):
+
+        for frame in sample_frames():
+            self.assertEqual(encoder(frame), reference_encode(frame))
+
+        # other panel sizes
+        rng = random.Random(3)
+        for (frame_width, frame_height) in ((64, 32), (128, 32), (96, 16)):
+            frame = bytearray(rng.getrandbits(8) for i in range(frame_width * frame_height // 8))
+            self.assertEqual(encoder(frame, frame_width, frame_height),
+                reference_encode(frame, frame_width, frame_height))
+
+    def test_lut_encode(self):
+
+        self.check(lut_encode)
+
+    @unittest.skipIf(frame_encoder.numpy is None, 'numpy not installed')
+    def test_numpy_encode(self):
+
+        self.check(frame_encoder.numpy_encode)
+
+    def test_encode_image(self):
+
+        image = Image.new('1', (width, height))
+        draw = ImageDraw.Draw(image)
+        draw.text((0, 0), 'WLAN Pi', fill=255)
+        draw.rectangle((90, 40, 127, 63), outline=255)
+
+        out = frame_encoder.encode_image(image)
+
+        self.assertEqual(len(out), width * pages)
+        self.assertEqual(out, reference_encode(image.tobytes()))
+
+    def test_self_check(self):
+
+        self.assertEqual(frame_encoder.self_check(frames=40), 40)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+'''
+Text drawn from the glyph atlas matches text drawn by PIL
+'''
+
+import shutil
+import tempfile
+import unittest
+
+from PIL import Image, ImageChops, ImageDraw
+
+import glyph_atlas
+
+
+class GlyphAtlasTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.cache_dir = tempfile.mkdtemp()
+        cls.font = glyph_atlas.load_font('DejaVuSansMono-Bold.ttf', 10, cache_dir=cls.cache_dir)
+
+    @classmethod
+    def tearDownClass(cls):
+
+        shutil.rmtree(cls.cache_dir)
+
+    def draw(self, text, font=None):
+
+        image = Image.new('1', (128, 64))
+        (font or self.font).draw_text(image, (3, 20), text)
+        return image
+
+    def assertSameImage(self, first, second):
+
+        self.assertIsNone(ImageChops.difference(first, second).getbbox())
+
+    def test_same_as_pil(self):
+
+        for text in ['Interface: wlan0', 'SSID: N/A', 'gjpqy (1/2) 12:34:56', '']:
+            expected = Image.new('1', (128, 64))
+            ImageDraw.Draw(expected).text((3, 20), text, font=self.font.font, fill=255)
+            self.assertSameImage(self.draw(text), expected)
+
+    def test_bytes(self):
+
+        self.assertSameImage(self.draw(b'Kismet: running\n'), self.draw(u'Kismet: running\n'))
+
+    def test_cache_file(self):
+
+        cached = glyph_atlas.load_font('DejaVuSansMono-Bold.ttf', 10, cache_dir=self.cache_dir)
+
+        self.assertEqual(sorted(cached.glyphs), sorted(self.font.glyphs))
+        self.assertSameImage(self.draw('WLAN Pi', cached), self.draw('WLAN Pi'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+'''
+nl80211 interface dump parsing, against recorded netlink messages
+'''
+
+import binascii
+import os
+import unittest
+
+import nl80211
+
+fixtures = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load_buffers(name):
+
+    '''
+    Read a hex fixture: one received buffer per paragraph, '#' comments
+    '''
+
+    buffers = []
+    current = []
+
+    with open(os.path.join(fixtures, name)) as fixture:
+        for line in fixture.read().split('\n') + ['']:
+            line = line.strip()
+            if line.startswith('#'):
+                continue
+            if line:
+                current.append(line)
+            elif current:
+                buffers.append(binascii.unhexlify(''.join(current)))
+                current = []
+
+    return buffers
+
+
+class InterfaceDumpTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.interfaces = nl80211.parse_interface_dump(load_buffers('nl80211_interface_dump.hex'))
+
+    def test_interfaces(self):
+
+        self.assertEqual([wlan.name for wlan in self.interfaces], ['wlan0', 'wlan1', 'wlan2'])
+        self.assertEqual([wlan.ifindex for wlan in self.interfaces], [3, 4, 5])
+        self.assertEqual([wlan.wiphy for wlan in self.interfaces], [0, 1, 2])
+
+    def test_associated(self):
+
+        wlan0 = self.interfaces[0]
+
+        self.assertEqual(wlan0.iftype_name, 'managed')
+        self.assertEqual(wlan0.ssid, 'WLAN Pi')
+        self.assertEqual(wlan0.mac, 'dc:a6:32:a1:b2:c3')
+        self.assertEqual(wlan0.frequency, 5180)
+        self.assertEqual(wlan0.channel, 36)
+        self.assertEqual(wlan0.width, 80)
+        self.assertEqual(wlan0.center_freq1, 5210)
+
+    def test_monitor(self):
+
+        wlan1 = self.interfaces[1]
+
+        self.assertEqual(wlan1.iftype_name, 'monitor')
+        self.assertIsNone(wlan1.ssid)
+        self.assertEqual(wlan1.mac, '00:c0:ca:98:1f:2e')
+        self.assertEqual(wlan1.channel, 6)
+        self.assertEqual(wlan1.width, 20)
+
+    def test_not_associated(self):
+
+        wlan2 = self.interfaces[2]
+
+        self.assertEqual(wlan2.iftype_name, 'managed')
+        for value in (wlan2.ssid, wlan2.frequency, wlan2.channel, wlan2.width):
+            self.assertIsNone(value)
+
+
+class MalformedTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.interfaces = nl80211.parse_interface_dump(load_buffers('nl80211_malformed.hex'))
+
+    def test_truncated_message_dropped(self):
+
+        self.assertEqual([wlan.name for wlan in self.interfaces], ['wlan3', 'wlan4'])
+
+    def test_bad_attributes(self):
+
+        wlan3 = self.interfaces[0]
+
+        # 2 byte ifindex
+        self.assertIsNone(wlan3.ifindex)
+        self.assertEqual(wlan3.iftype_name, 'managed')
+        # SSID attribute running past the end of the message
+        self.assertIsNone(wlan3.ssid)
+
+    def test_zero_length_attribute(self):
+
+        wlan4 = self.interfaces[1]
+
+        self.assertIsNone(wlan4.iftype)
+        self.assertEqual(wlan4.iftype_name, 'unknown')
+
+
+class FrequencyTest(unittest.TestCase):
+
+    def test_bands(self):
+
+        for frequency, channel in [(2412, 1), (2484, 14), (5180, 36), (5825, 165),
+                (5935, 2), (5955, 1), (6115, 33), (7115, 233), (4920, 184), (None, None), (900, None)]:
+            self.assertEqual(nl80211.frequency_to_channel(frequency), channel)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+'''
+Event driven pages are redrawn when their data changes, however long they
+have been shown
+'''
+
+import time
+import unittest
+
+import bakebit_nanohat_oled as oled
+from event_loop import EventLoop
+from sampler import Sampler
+
+
+class EventPageTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.saved = dict((name, getattr(oled, name)) for name in
+            ('sampler', 'event_loop', 'refresh_page', 'refresh_timer', 'start_up',
+             'display_state', 'screen_cleared', 'shutdown_in_progress'))
+
+        self.source = ['eth0', '192.168.1.10']
+        self.redraws = []
+
+        oled.sampler = Sampler(idle_after=0.3)
+        oled.event_loop = EventLoop()
+        oled.refresh_page = lambda deadline: self.redraws.append(deadline)
+        oled.refresh_timer = None
+        oled.start_up = True            # home page shown
+        oled.display_state = 'page'
+        oled.screen_cleared = False
+        oled.shutdown_in_progress = False
+
+        oled.sampler.add('home', lambda: tuple(self.source), 0.05)
+        oled.sampler.listeners.append(oled.page_data_changed)
+
+    def tearDown(self):
+
+        oled.sampler.stop()
+        oled.event_loop.close()
+        for name, value in self.saved.items():
+            setattr(oled, name, value)
+
+    def run_loop(self, seconds):
+
+        end = time.time() + seconds
+        while time.time() < end:
+            oled.event_loop.call_later(0.02, lambda: None)
+            oled.event_loop.run_once()
+
+    def test_change_after_idle_redraws(self):
+
+        oled.sampler.start()
+        self.assertEqual(oled.sampler.get('home', wait=1), ('eth0', '192.168.1.10'))
+        oled.schedule_refresh()
+
+        # the page has not read its data for longer than idle_after
+        self.run_loop(0.6)
+        del self.redraws[:]
+
+        self.source[1] = '192.168.1.99'
+        self.run_loop(0.4)
+
+        self.assertTrue(self.redraws)
+        self.assertEqual(oled.sampler.snapshot['home'], ('eth0', '192.168.1.99'))
+
+    def test_blank_screen_pauses_collectors(self):
+
+        oled.sampler.start()
+        oled.sampler.get('home', wait=1)
+        oled.screen_cleared = True
+        oled.schedule_refresh()
+
+        self.run_loop(0.6)
+        del self.redraws[:]
+
+        self.source[1] = '192.168.1.99'
+        self.run_loop(0.3)
+
+        self.assertEqual(self.redraws, [])
+        self.assertEqual(oled.sampler.snapshot['home'], ('eth0', '192.168.1.10'))
+
+
+if __name__ == '__main__':
+    unittest.main()
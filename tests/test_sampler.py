@@ -0,0 +1,97 @@
+'''
+Sampler scheduling: refreshes, idle collectors & watched collectors
+'''
+
+import threading
+import time
+import unittest
+
+from sampler import Sampler
+
+
+class SamplerTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.sampler = Sampler(idle_after=0.3)
+        self.calls = 0
+
+    def tearDown(self):
+
+        self.sampler.stop()
+
+    def collect(self):
+
+        self.calls += 1
+        return self.calls
+
+    def wait_for_calls(self, calls, timeout=1):
+
+        end = time.time() + timeout
+        while self.calls < calls and time.time() < end:
+            time.sleep(0.01)
+        return self.calls
+
+    def test_refresh_while_running(self):
+
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_collect():
+            started.set()
+            release.wait(1)
+            return self.collect()
+
+        self.sampler.add('usb', slow_collect, 30)
+        self.sampler.start()
+
+        self.assertTrue(started.wait(1))
+        self.sampler.refresh('usb')
+        release.set()
+
+        # run again straight away, not after the 30s interval
+        self.assertEqual(self.wait_for_calls(2), 2)
+
+    def test_refresh_when_not_running(self):
+
+        self.sampler.add('usb', self.collect, 30)
+        self.sampler.start()
+        self.assertEqual(self.sampler.get('usb', wait=1), 1)
+
+        self.sampler.refresh('usb')
+
+        self.assertEqual(self.wait_for_calls(2), 2)
+        time.sleep(0.1)
+        self.assertEqual(self.calls, 2)
+
+    def test_idle_collector_paused(self):
+
+        self.sampler.add('home', self.collect, 0.05)
+        self.sampler.start()
+        self.sampler.get('home', wait=1)
+
+        time.sleep(0.5)
+        calls = self.calls
+        time.sleep(0.2)
+
+        self.assertEqual(self.calls, calls)
+
+        # read again: running again
+        self.sampler.get('home')
+        self.assertEqual(self.wait_for_calls(calls + 2), calls + 2)
+
+    def test_watched_collector_not_paused(self):
+
+        self.sampler.add('home', self.collect, 0.05)
+        self.sampler.watch(['home'])
+        self.sampler.start()
+        self.sampler.get('home', wait=1)
+
+        time.sleep(0.5)
+        calls = self.calls
+
+        self.assertEqual(self.wait_for_calls(calls + 2), calls + 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
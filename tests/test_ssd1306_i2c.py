@@ -0,0 +1,172 @@
+'''
+SSD1306 I2C_RDWR driver, against the transactions recorded by FakeI2CBus
+'''
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from PIL import Image, ImageDraw
+
+import ssd1306_i2c
+from frame_diff import FrameDiff
+from ssd1306_i2c import FakeI2CBus, SSD1306, COMMAND, DATA, DISPLAY_OFF, DISPLAY_ON
+
+frame_size = 128 * 64 // 8
+window = [ssd1306_i2c.SET_COLUMN_ADDRESS, 0, 127, ssd1306_i2c.SET_PAGE_ADDRESS, 0, 7]
+
+
+def frame(text):
+
+    image = Image.new('1', (128, 64))
+    draw = ImageDraw.Draw(image)
+    draw.text((0, 0), 'WLAN Pi', fill=255)
+    draw.text((0, 26), text, fill=255)
+
+    return image
+
+
+class SSD1306Test(unittest.TestCase):
+
+    def setUp(self):
+
+        self.bus = FakeI2CBus()
+        self.panel = SSD1306(self.bus)
+
+    def test_init(self):
+
+        self.panel.init()
+
+        # set-up commands, a blank frame, then display on
+        self.assertEqual(self.bus.transactions, [
+            (0x3c, [bytearray([COMMAND] + ssd1306_i2c.init_sequence)]),
+            (0x3c, [bytearray([COMMAND] + window), bytearray([DATA]) + bytearray(frame_size)]),
+            (0x3c, [bytearray([COMMAND, DISPLAY_ON])]),
+        ])
+        self.assertTrue(self.panel.powered)
+
+    def test_write_region(self):
+
+        self.panel.write_region(2, 10, b'\x01\x02\x03')
+
+        # window commands & data in one transaction
+        self.assertEqual(self.bus.transactions, [
+            (0x3c, [bytearray([COMMAND, 0x21, 10, 12, 0x22, 2, 2]), bytearray([DATA, 1, 2, 3])]),
+        ])
+        self.assertEqual(self.bus.bytes_sent, 8 + 5)
+
+    def test_write_frame(self):
+
+        data = bytearray(range(256)) * 4
+
+        self.panel.write_frame(data)
+
+        self.assertEqual(len(self.bus.transactions), 1)
+        (address, messages) = self.bus.transactions[0]
+        self.assertEqual(messages, [bytearray([COMMAND] + window), bytearray([DATA]) + data])
+
+    def test_max_transfer_chunks(self):
+
+        data = bytearray(range(256)) * 4
+
+        # 32 data bytes per message: command + 32 messages, one transaction
+        bus = FakeI2CBus(max_transfer=33)
+        SSD1306(bus).write_frame(data)
+
+        self.assertEqual(len(bus.transactions), 1)
+        messages = bus.transactions[0][1]
+        self.assertEqual(len(messages), 33)
+        self.assertTrue(all(message[0] == DATA and len(message) == 33 for message in messages[1:]))
+        self.assertEqual(b''.join(bytes(message[1:]) for message in messages[1:]), bytes(data))
+
+        # 16 data bytes per message: 65 messages, split to fit max_messages
+        bus = FakeI2CBus(max_transfer=17)
+        SSD1306(bus).write_frame(data)
+
+        counts = [ len(messages) for address, messages in bus.transactions ]
+        self.assertEqual(counts, [ssd1306_i2c.I2C_RDWR_IOCTL_MAX_MSGS, 65 - ssd1306_i2c.I2C_RDWR_IOCTL_MAX_MSGS])
+
+    def test_bus_limits(self):
+
+        bus = FakeI2CBus(max_transfer=16)
+
+        self.assertRaises(IOError, bus.transfer, 0x3c, [bytearray(17)])
+        self.assertRaises(IOError, bus.transfer, 0x3c,
+            [bytearray(1)] * (ssd1306_i2c.I2C_RDWR_IOCTL_MAX_MSGS + 1))
+        self.assertEqual(bus.transactions, [])
+
+    def test_power(self):
+
+        self.panel.power(False)
+        self.assertFalse(self.panel.powered)
+        self.panel.power(True)
+
+        self.assertEqual(self.bus.transactions, [
+            (0x3c, [bytearray([COMMAND, DISPLAY_OFF])]),
+            (0x3c, [bytearray([COMMAND, DISPLAY_ON])]),
+        ])
+
+    def test_record_file(self):
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'i2c.log')
+
+        bus = FakeI2CBus(path)
+        panel = SSD1306(bus)
+        panel.write_region(0, 0, b'\xff\x81')
+        panel.power(False)
+        bus.close()
+
+        with open(path) as record:
+            self.assertEqual(record.read().splitlines(), [
+                '3c 00:21,00,01,22,00,00 40:ff,81',
+                '3c 00:ae',
+            ])
+
+
+class FrameDiffTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.bus = FakeI2CBus()
+        self.display = FrameDiff(SSD1306(self.bus))
+
+    def test_first_push_is_one_transaction(self):
+
+        self.display.push(frame('12:34:56'))
+
+        self.assertEqual(len(self.bus.transactions), 1)
+        messages = self.bus.transactions[0][1]
+        self.assertEqual(messages[0], bytearray([COMMAND] + window))
+        self.assertEqual(len(messages[1]), 1 + frame_size)
+
+    def test_clock_tick_sends_regions(self):
+
+        self.display.push(frame('12:34:56'))
+        self.bus.reset()
+
+        sent = self.display.push(frame('12:34:57'))
+
+        self.assertTrue(0 < sent < 128)
+        for address, messages in self.bus.transactions:
+            self.assertEqual(len(messages), 2)
+            self.assertEqual(messages[0][1], ssd1306_i2c.SET_COLUMN_ADDRESS)
+
+    def test_blank_then_push_powers_on_only(self):
+
+        self.display.push(frame('12:34:56'))
+        self.bus.reset()
+
+        self.display.blank()
+        self.assertEqual(self.bus.transactions, [(0x3c, [bytearray([COMMAND, DISPLAY_OFF])])])
+        self.bus.reset()
+
+        # the panel RAM was kept: the same frame only needs the display on
+        self.assertEqual(self.display.push(frame('12:34:56')), 0)
+        self.assertEqual(self.bus.transactions, [(0x3c, [bytearray([COMMAND, DISPLAY_ON])])])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+'''
+ProcFile: kept open, re-read from the start & re-opened after an error
+'''
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from sys_stats import ProcFile
+
+
+class ProcFileTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'carrier')
+        self.write('1\n')
+        self.proc_file = ProcFile(self.path)
+
+    def tearDown(self):
+
+        self.proc_file.close()
+        shutil.rmtree(self.directory)
+
+    def write(self, content):
+
+        with open(self.path, 'w') as proc_file:
+            proc_file.write(content)
+
+    def test_reread_from_start(self):
+
+        self.assertEqual(self.proc_file.read(), '1\n')
+        fd = self.proc_file.fd
+
+        self.write('0\n')
+
+        self.assertEqual(self.proc_file.read(), '0\n')
+        self.assertEqual(self.proc_file.fd, fd)
+
+    def test_long_file(self):
+
+        self.write('x' * 10000)
+
+        self.assertEqual(len(self.proc_file.read()), 10000)
+
+    def test_reopened_after_error(self):
+
+        self.proc_file.read()
+
+        # stand in for a file gone stale (reads fail): a directory
+        os.close(self.proc_file.fd)
+        self.proc_file.fd = os.open(self.directory, os.O_RDONLY)
+
+        self.assertRaises(OSError, self.proc_file.read)
+        self.assertIsNone(self.proc_file.fd)
+
+        self.write('0\n')
+        self.assertEqual(self.proc_file.read(), '0\n')
+
+    def test_missing_file(self):
+
+        missing = ProcFile(os.path.join(self.directory, 'speed'))
+
+        self.assertRaises(OSError, missing.read)
+        self.assertIsNone(missing.fd)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+'''
+Scrolling a simple table by moving the lines already drawn gives the same
+frame as drawing the table from scratch
+'''
+
+import random
+import unittest
+
+import bakebit_nanohat_oled as oled
+import glyph_atlas
+from display_devices import CountingDevice
+from frame_cache import FrameCache
+from frame_diff import FrameDiff
+
+globals_used = ('smartFont', 'font11', 'display', 'frame_cache', 'table_view',
+    'current_scroll_selection', 'draw_text')
+
+
+class TableScrollTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.fonts = {
+            'smartFont': glyph_atlas.load_font('DejaVuSansMono-Bold.ttf', 10, cache_dir=None),
+            'font11': glyph_atlas.load_font('DejaVuSansMono.ttf', 11, cache_dir=None),
+        }
+
+    def setUp(self):
+
+        self.saved = dict((name, getattr(oled, name)) for name in globals_used)
+
+        for name, font in self.fonts.items():
+            setattr(oled, name, font)
+
+        self.device = CountingDevice()
+        oled.display = FrameDiff(self.device)
+        oled.frame_cache = FrameCache(32)
+        oled.table_view = None
+        oled.current_scroll_selection = 0
+
+        # count the text drawn
+        self.texts = 0
+        draw_text = self.saved['draw_text']
+
+        def counting_draw_text(*args, **kwargs):
+            self.texts += 1
+            draw_text(*args, **kwargs)
+
+        oled.draw_text = counting_draw_text
+
+    def tearDown(self):
+
+        for name, value in self.saved.items():
+            setattr(oled, name, value)
+
+    def show(self, items, position, **options):
+
+        oled.current_scroll_selection = position
+        self.texts = 0
+        oled.display_simple_table(items, **options)
+        return oled.image.tobytes()
+
+    def full_repaint(self, items, position, **options):
+
+        oled.table_view = None
+        oled.frame_cache = FrameCache(32)
+        return self.show(items, position, **options)
+
+    def test_scroll_draws_only_new_line(self):
+
+        items = [ 'ALLOW 22/tcp rule {}'.format(n) for n in range(40) ]
+        options = dict(back_button_req=1, title='--UFW Summary--')
+
+        self.show(items, 0, **options)
+
+        # the line scrolled in, & the nav bar as the Up button appears
+        self.show(items, 1, **options)
+        self.assertEqual(self.texts, 4)
+
+        # from then on, only the line scrolled in
+        for position in (2, 3, 2, 1):
+            scrolled = self.show(items, position, **options)
+            self.assertEqual(self.texts, 1)
+            self.assertEqual(scrolled, self.full_repaint(items, position, **options))
+            # (title, 4 items, Down, Up & Exit)
+            self.assertEqual(self.texts, 8)
+
+    def test_same_frames_as_full_repaint(self):
+
+        rng = random.Random(5)
+        chars = [ chr(c) for c in range(32, 127) ]
+        scrolled = 0
+
+        for trial in range(30):
+
+            items = [ ''.join(rng.choice(chars) for i in range(rng.randint(0, 25)))
+                for n in range(rng.randint(1, 15)) ]
+            options = dict(back_button_req=rng.choice([0, 1]),
+                title=rng.choice(['', 'Profiler Status', '--USB Interfaces--']),
+                font=rng.choice(['small', 'medium']))
+
+            position = 0
+            self.show(items, position, **options)
+
+            for step in range(10):
+                position = max(0, position + rng.choice([1, 1, -1, 2, -3]))
+                frame = self.show(items, position, **options)
+                position = oled.current_scroll_selection
+                if oled.table_view[3] is not None:
+                    scrolled += 1
+                self.assertEqual(frame, self.full_repaint(items, position, **options))
+
+        self.assertGreater(scrolled, 30)
+
+    def test_other_frame_pushed_in_between(self):
+
+        items = [ 'line {}'.format(n) for n in range(10) ]
+
+        self.show(items, 0)
+        oled.clear_display()
+        oled.display.push(oled.image)
+
+        # the image no longer holds the table: drawn from scratch
+        frame = self.show(items, 1)
+
+        self.assertIsNone(oled.table_view[3])
+        self.assertEqual(frame, self.full_repaint(items, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
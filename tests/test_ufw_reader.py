@@ -0,0 +1,147 @@
+'''
+ufw status from its files, against a copy of /etc/ufw in fixtures/ufw
+'''
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import ufw_reader
+
+fixtures = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'ufw')
+
+
+class ParseTupleTest(unittest.TestCase):
+
+    def test_port_rule(self):
+
+        rule = ufw_reader.parse_tuple(' allow tcp 22 0.0.0.0/0 any 0.0.0.0/0 in')
+
+        self.assertEqual((rule.action, rule.proto, rule.dport, rule.direction),
+            ('allow', 'tcp', '22', 'in'))
+        self.assertIsNone(rule.interface)
+        self.assertEqual(rule.line, '22/tcp ALLOW Anywhere')
+
+    def test_app_rule(self):
+
+        rule = ufw_reader.parse_tuple('allow tcp 80,443 0.0.0.0/0 any 0.0.0.0/0 Nginx%20Full - in')
+
+        self.assertEqual(rule.dapp, 'Nginx Full')
+        self.assertIsNone(rule.sapp)
+        self.assertEqual(rule.line, 'Nginx Full ALLOW Anywhere')
+
+    def test_source_app_rule(self):
+
+        rule = ufw_reader.parse_tuple('allow any any 0.0.0.0/0 any 0.0.0.0/0 - OpenSSH in')
+
+        self.assertIsNone(rule.dapp)
+        self.assertEqual(rule.line, 'Anywhere ALLOW OpenSSH')
+
+    def test_interface_rule(self):
+
+        rule = ufw_reader.parse_tuple('deny udp 53 0.0.0.0/0 any 10.0.0.0/8 in_eth0')
+
+        self.assertEqual((rule.direction, rule.interface), ('in', 'eth0'))
+        self.assertEqual(rule.line, '53/udp on eth0 DENY 10.0.0.0/8')
+
+    def test_log_rules(self):
+
+        for action in ('allow_log', 'allow_log-all'):
+            rule = ufw_reader.parse_tuple(action + ' tcp 8080 0.0.0.0/0 any 0.0.0.0/0 in')
+            self.assertEqual(rule.action, 'allow')
+            self.assertTrue(rule.log)
+            self.assertEqual(rule.line, '8080/tcp ALLOW (log) Anywhere')
+
+    def test_comment(self):
+
+        # comment=<hex> is dropped, with or without application names
+        rule = ufw_reader.parse_tuple('limit tcp 2222 0.0.0.0/0 any 0.0.0.0/0 in comment=6d616e6167656d656e74')
+        self.assertEqual(rule.line, '2222/tcp LIMIT Anywhere')
+
+        rule = ufw_reader.parse_tuple('allow tcp 22 0.0.0.0/0 any 0.0.0.0/0 OpenSSH - in comment=737368')
+        self.assertEqual(rule.line, 'OpenSSH ALLOW Anywhere')
+
+    def test_outbound_rule(self):
+
+        rule = ufw_reader.parse_tuple('allow udp 123 0.0.0.0/0 any 0.0.0.0/0 out')
+
+        self.assertEqual(rule.line, '123/udp ALLOW OUT Anywhere')
+
+    def test_v6_rules(self):
+
+        rule = ufw_reader.parse_tuple('allow tcp 22 ::/0 any ::/0 in', v6=True)
+        self.assertEqual(rule.line, '22/tcp (v6) ALLOW Anywhere (v6)')
+
+        rule = ufw_reader.parse_tuple('reject tcp 25 ::/0 any fd00::/8 in', v6=True)
+        self.assertEqual(rule.line, '25/tcp (v6) REJECT fd00::/8')
+
+    def test_unsupported(self):
+
+        self.assertIsNone(ufw_reader.parse_tuple(
+            'route:allow any any 0.0.0.0/0 any 192.168.42.0/24 in_usb0!out_eth0'))
+        self.assertIsNone(ufw_reader.parse_tuple('allow tcp 22'))
+
+
+class ReaderTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.ufw_dir = tempfile.mkdtemp()
+        for name in ('ufw.conf', 'user.rules', 'user6.rules'):
+            shutil.copy(os.path.join(fixtures, name), self.ufw_dir)
+        self.reader = ufw_reader.UfwReader(self.ufw_dir)
+
+    def tearDown(self):
+
+        shutil.rmtree(self.ufw_dir)
+
+    def test_status_lines(self):
+
+        self.assertTrue(self.reader.installed)
+        self.assertEqual(self.reader.status_lines(), [
+            'Status: active',
+            '22/tcp ALLOW Anywhere',
+            'Nginx Full ALLOW Anywhere',
+            '53/udp on eth0 DENY 10.0.0.0/8',
+            '8080/tcp ALLOW (log) Anywhere',
+            '2222/tcp LIMIT Anywhere',
+            'OpenSSH on wlan0 ALLOW Anywhere',
+            '123/udp ALLOW OUT Anywhere',
+            '22/tcp (v6) ALLOW Anywhere (v6)',
+            'Nginx Full (v6) ALLOW Anywhere (v6)',
+            '25/tcp (v6) REJECT fd00::/8',
+        ])
+
+    def test_v6_flag(self):
+
+        rules = self.reader.status().rules
+
+        self.assertEqual([ rule.v6 for rule in rules ], [False] * 7 + [True] * 3)
+
+    def test_cached_until_changed(self):
+
+        status = self.reader.status()
+        self.assertIs(self.reader.status(), status)
+
+        with open(os.path.join(self.ufw_dir, 'ufw.conf'), 'w') as conf:
+            conf.write('ENABLED=no\nLOGLEVEL=low\n')
+
+        self.assertEqual(self.reader.status_lines(), ['Status: inactive'])
+
+    def test_missing_rules_file(self):
+
+        os.unlink(os.path.join(self.ufw_dir, 'user6.rules'))
+
+        self.assertEqual(len(self.reader.status().rules), 7)
+
+    def test_not_installed(self):
+
+        reader = ufw_reader.UfwReader(os.path.join(self.ufw_dir, 'missing'))
+
+        self.assertFalse(reader.installed)
+        self.assertRaises(IOError, reader.status)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+'''
+USB inventory from a fake /sys/bus/usb/devices, named from fixtures/usb.ids
+'''
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import usb_inventory
+from usb_inventory import UsbIdsIndex, UsbInventory
+
+fixtures = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+class FakeMonitor(object):
+
+    '''
+    Stands in for UeventMonitor: changed() returns the queued results
+    '''
+
+    available = True
+
+    def __init__(self):
+
+        self.events = []
+
+    def changed(self):
+
+        return self.events.pop(0) if self.events else False
+
+
+class UsbInventoryTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+        self.sys_bus_usb = os.path.join(self.directory, 'devices')
+        os.mkdir(self.sys_bus_usb)
+
+        self.ids_file = os.path.join(self.directory, 'usb.ids')
+        shutil.copy(os.path.join(fixtures, 'usb.ids'), self.ids_file)
+        self.index = UsbIdsIndex(self.ids_file, os.path.join(self.directory, 'usb.ids.idx'))
+
+        self.add_device('usb1', 1, 1, '1d6b', '0002', manufacturer='Linux 6.1.21-v8+ xhci-hcd')
+        self.add_device('1-1.3', 1, 4, '0bda', '8812')
+        # an interface (no idVendor)
+        os.mkdir(os.path.join(self.sys_bus_usb, '1-1.3:1.0'))
+
+        self.inventory = UsbInventory(self.sys_bus_usb, self.index)
+        if self.inventory.monitor.available:
+            self.inventory.monitor.sock.close()
+        self.inventory.monitor = FakeMonitor()
+
+    def tearDown(self):
+
+        self.index.close()
+        shutil.rmtree(self.directory)
+
+    def add_device(self, name, bus, device, vendor_id, product_id, **strings):
+
+        path = os.path.join(self.sys_bus_usb, name)
+        os.mkdir(path)
+        attributes = dict(busnum=str(bus), devnum=str(device), idVendor=vendor_id,
+            idProduct=product_id, **strings)
+        for attribute, value in attributes.items():
+            with open(os.path.join(path, attribute), 'w') as attribute_file:
+                attribute_file.write(value + '\n')
+
+    def test_index(self):
+
+        self.assertEqual(self.index.vendor(0x0bda), 'Realtek Semiconductor Corp.')
+        self.assertEqual(self.index.product(0x2357, 0x0120), 'Archer T2U PLUS [RTL8821AU]')
+        self.assertIsNone(self.index.vendor(0x1234))
+        self.assertIsNone(self.index.product(0x0bda, 0x0001))
+        self.assertEqual(self.index.builds, 1)
+
+        # rebuilt only when usb.ids changes
+        reopened = UsbIdsIndex(self.ids_file, self.index.index_file)
+        self.assertEqual(reopened.vendor(0x1d6b), 'Linux Foundation')
+        self.assertEqual(reopened.builds, 0)
+
+        with open(self.ids_file, 'ab') as ids:
+            ids.write(b'\n')
+        os.utime(self.ids_file, (0, 0))
+        self.assertEqual(reopened.vendor(0x1d6b), 'Linux Foundation')
+        self.assertEqual(reopened.builds, 1)
+        reopened.close()
+
+    def test_devices(self):
+
+        devices = self.inventory.devices()
+
+        self.assertEqual([ (device.bus, device.device) for device in devices ], [(1, 1), (1, 4)])
+        self.assertEqual(devices[1].vendor, 'Realtek Semiconductor Corp.')
+        self.assertEqual(devices[1].product, 'RTL8812AU 802.11a/b/g/n/ac 2T2R DB WLAN Adapter')
+
+    def test_device_strings_when_not_in_usb_ids(self):
+
+        self.add_device('1-1.4', 1, 5, 'abcd', '0001', manufacturer='Acme', product='Widget')
+
+        device = self.inventory.devices()[-1]
+
+        self.assertEqual((device.vendor, device.product), ('Acme', 'Widget'))
+
+    def test_cached_until_hotplug(self):
+
+        self.assertEqual(len(self.inventory.devices()), 2)
+        self.add_device('1-1.2', 1, 3, '2357', '0120')
+
+        # no uevent yet: the same list
+        self.assertFalse(self.inventory.hotplug())
+        self.assertEqual(len(self.inventory.devices()), 2)
+
+        self.inventory.monitor.events.append(True)
+        self.assertTrue(self.inventory.hotplug())
+        self.assertEqual(len(self.inventory.devices()), 3)
+
+    def test_hotplug_during_scan(self):
+
+        self.inventory.devices()
+        self.inventory.monitor.events.append(True)
+        self.inventory.hotplug()
+
+        # a device arrives (& its uevent is read) while the list is re-read
+        scan = self.inventory._scan
+
+        def slow_scan():
+            devices = scan()
+            self.add_device('1-1.2', 1, 3, '2357', '0120')
+            self.inventory.monitor.events.append(True)
+            self.inventory.hotplug()
+            return devices
+
+        self.inventory._scan = slow_scan
+        self.assertEqual(len(self.inventory.devices()), 2)
+        self.inventory._scan = scan
+
+        self.assertEqual(len(self.inventory.devices()), 3)
+
+    def test_max_age_without_uevents(self):
+
+        self.inventory.monitor.available = False
+        self.inventory.max_age = 0
+
+        self.assertEqual(len(self.inventory.devices()), 2)
+        self.add_device('1-1.2', 1, 3, '2357', '0120')
+        self.inventory.read_time -= 1
+
+        self.assertEqual(len(self.inventory.devices()), 3)
+
+    def test_parse_usb_ids_stops_at_classes(self):
+
+        with open(self.ids_file, 'rb') as ids:
+            (vendors, products) = usb_inventory.parse_usb_ids(ids.read().splitlines())
+
+        self.assertEqual(sorted(vendors), [0x0bda, 0x1d6b, 0x2357])
+        self.assertEqual(len(products), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+'''
+Single-flight TTL result cache.
+
+Caches the results of collectors (commands, probes...) keyed by
+(collector name, args). Each entry has its own time to live, the least
+recently used entries are evicted once the cache is full, and entries can
+be invalidated explicitly (e.g. when leaving the page that uses them).
+
+Lookups are single-flight: if a result is being computed when another
+thread asks for the same key, the second thread waits for that result
+rather than running the collector again, so a page refresh and a button
+press (or the background sampler) never run the same command twice.
+
+Usage:
+
+    cache = ttl_cache.TTLCache(max_entries=64)
+    output = cache.get(('ufw', ()), read_ufw, ttl=30)
+    cache.invalidate('ufw')             # all entries for collector 'ufw'
+'''
+
+import threading
+import time
+from collections import OrderedDict
+
+# use a monotonic clock where available (Python 3)
+monotonic = getattr(time, 'monotonic', time.time)
+
+
+class _Flight(object):
+
+    '''
+    A result being computed, that other callers can wait for
+    '''
+
+    def __init__(self):
+
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache(object):
+
+    '''
+    LRU cache of (collector, args) to value, with per-entry expiry
+    '''
+
+    def __init__(self, max_entries=64):
+
+        self.max_entries = max_entries
+        self.entries = OrderedDict()    # key: (expires, value)
+        self.flights = {}               # key: _Flight
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.evictions = 0
+
+    def __len__(self):
+
+        return len(self.entries)
+
+    def get(self, key, function, ttl, *args):
+
+        '''
+        Return the cached value for key, or call function(*args) to get it
+        (caching it for ttl seconds). Exceptions are passed on to all
+        callers waiting for the value & are not cached.
+        '''
+
+        with self.lock:
+
+            entry = self.entries.get(key)
+
+            if entry is not None:
+                if entry[0] > monotonic():
+                    self.entries.pop(key)
+                    self.entries[key] = entry
+                    self.hits += 1
+                    return entry[1]
+                del self.entries[key]
+
+            flight = self.flights.get(key)
+
+            if flight is not None:
+                self.waits += 1
+                owner = False
+            else:
+                flight = _Flight()
+                self.flights[key] = flight
+                self.misses += 1
+                owner = True
+
+        if not owner:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = function(*args)
+        except Exception as ex:
+            flight.error = ex
+
+        with self.lock:
+
+            # only cache if not invalidated while we were computing it
+            if self.flights.get(key) is flight:
+                del self.flights[key]
+                if flight.error is None:
+                    self.entries[key] = (monotonic() + ttl, flight.value)
+                    while len(self.entries) > self.max_entries:
+                        self.entries.popitem(last=False)
+                        self.evictions += 1
+
+        flight.done.set()
+
+        if flight.error is not None:
+            raise flight.error
+
+        return flight.value
+
+    def invalidate(self, collector, args=None):
+
+        '''
+        Drop the entry for (collector, args), or all entries for collector
+        if args is None
+        '''
+
+        with self.lock:
+
+            keys = [ key for key in list(self.entries) + list(self.flights)
+                if key[0] == collector and (args is None or key[1] == args) ]
+
+            for key in keys:
+                self.entries.pop(key, None)
+                # anyone already waiting still gets the result, but it
+                # won't be cached
+                self.flights.pop(key, None)
+
+    def clear(self):
+
+        with self.lock:
+            self.entries.clear()
+            self.flights.clear()
+
+    def stats(self):
+
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'waits': self.waits,
+            'evictions': self.evictions,
+        }
@@ -0,0 +1,278 @@
+'''
+UFW firewall state read straight from its configuration files.
+
+Replaces running 'ufw status'. ufw is itself a Python program, so each
+call costs a full interpreter start-up plus an iptables query - often over
+a second on a WLANPi. ufw keeps everything it needs to answer 'status' in
+a few files though:
+
+    /etc/ufw/ufw.conf       ENABLED=yes|no
+    /etc/ufw/user.rules     IPv4 user rules
+    /etc/ufw/user6.rules    IPv6 user rules
+
+Each user rule is preceded in the rules files by a comment describing it:
+
+    ### tuple ### allow tcp 22 0.0.0.0/0 any 0.0.0.0/0 in
+    ### tuple ### deny udp 53 0.0.0.0/0 any 10.0.0.0/8 in_eth0
+    ### tuple ### allow tcp 22 0.0.0.0/0 any 0.0.0.0/0 OpenSSH - in
+
+i.e. action, protocol, destination port & address, source port & address,
+optional destination & source application names, then direction (with
+interface if the rule is for one interface). These are parsed in to
+UfwRule tuples. The files are only re-read when one of them changes.
+
+Usage:
+
+    reader = ufw_reader.UfwReader()
+    for line in reader.status_lines():
+        print(line)                 # e.g. "22/tcp ALLOW Anywhere"
+
+Run this module with a directory as argument to print the status lines
+for a copy of the ufw files (e.g. a set of test files).
+'''
+
+import os
+from collections import namedtuple
+
+any_v4 = '0.0.0.0/0'
+any_v6 = '::/0'
+
+
+class UfwRule(namedtuple('UfwRule',
+        'action proto dport dst sport src dapp sapp direction interface v6 log')):
+
+    '''
+    A ufw user rule. action is 'allow', 'deny', 'reject' or 'limit'; ports,
+    addresses & protocol are 'any' (or 0.0.0.0/0, ::/0) when not set.
+    '''
+
+    def _endpoint(self, address, port, app):
+
+        # describe one end of the rule, as 'ufw status' does
+        suffix = ' (v6)' if self.v6 else ''
+
+        if app:
+            text = app
+        elif port != 'any':
+            text = port
+            if self.proto != 'any':
+                text += '/' + self.proto
+        else:
+            text = None
+
+        if address not in (any_v4, any_v6):
+            text = address + (' ' + text if text else '')
+            suffix = ''
+        elif text is None:
+            text = 'Anywhere'
+
+        return text + suffix
+
+    @property
+    def to(self):
+
+        text = self._endpoint(self.dst, self.dport, self.dapp)
+        if self.interface:
+            text += ' on ' + self.interface
+        return text
+
+    @property
+    def from_(self):
+
+        return self._endpoint(self.src, self.sport, self.sapp)
+
+    @property
+    def action_label(self):
+
+        label = self.action.upper()
+        if self.direction == 'out':
+            label += ' OUT'
+        if self.log:
+            label += ' (log)'
+        return label
+
+    @property
+    def line(self):
+
+        return '{} {} {}'.format(self.to, self.action_label, self.from_)
+
+
+def parse_tuple(text, v6=False):
+
+    '''
+    Parse the text after '### tuple ###' in to a UfwRule (None if the rule
+    isn't one we know how to show, e.g. a route rule)
+    '''
+
+    fields = text.split()
+
+    # newer ufw versions add comment=<hex> at the end
+    fields = [ field for field in fields if not field.startswith('comment=') ]
+
+    if len(fields) not in (7, 9):
+        return None
+
+    action = fields[0]
+    if action.startswith('route:'):
+        return None
+
+    log = False
+    if '_' in action:
+        action, log_type = action.split('_', 1)
+        log = log_type.startswith('log')
+
+    dapp = sapp = None
+    if len(fields) == 9:
+        dapp = fields[6].replace('%20', ' ') if fields[6] != '-' else None
+        sapp = fields[7].replace('%20', ' ') if fields[7] != '-' else None
+
+    direction = fields[-1]
+    interface = None
+    if '_' in direction:
+        direction, interface = direction.split('_', 1)
+
+    return UfwRule(
+        action=action,
+        proto=fields[1],
+        dport=fields[2],
+        dst=fields[3],
+        sport=fields[4],
+        src=fields[5],
+        dapp=dapp,
+        sapp=sapp,
+        direction=direction,
+        interface=interface,
+        v6=v6,
+        log=log)
+
+
+def parse_rules(lines, v6=False):
+
+    '''
+    Return the list of UfwRule described in the lines of a rules file
+    '''
+
+    rules = []
+    marker = '### tuple ###'
+
+    for line in lines:
+        line = line.strip()
+        if line.startswith(marker):
+            rule = parse_tuple(line[len(marker):], v6)
+            if rule is not None:
+                rules.append(rule)
+
+    return rules
+
+
+def parse_conf(lines):
+
+    '''
+    Return a dict of the settings in ufw.conf
+    '''
+
+    settings = {}
+
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith('#') and '=' in line:
+            name, value = line.split('=', 1)
+            settings[name.strip()] = value.strip().strip('"\'')
+
+    return settings
+
+
+class UfwStatus(namedtuple('UfwStatus', 'enabled rules')):
+
+    '''
+    Whether ufw is enabled & its user rules (IPv4 then IPv6)
+    '''
+
+
+class UfwReader(object):
+
+    '''
+    Reads ufw state from its files, re-reading only when they change
+    '''
+
+    def __init__(self, ufw_dir='/etc/ufw'):
+
+        self.conf_file = os.path.join(ufw_dir, 'ufw.conf')
+        self.rules_files = [
+            (os.path.join(ufw_dir, 'user.rules'), False),
+            (os.path.join(ufw_dir, 'user6.rules'), True),
+        ]
+        self.signature = None
+        self.cached = None
+
+    @property
+    def installed(self):
+
+        return os.path.isfile(self.conf_file)
+
+    def _signature(self):
+
+        signature = []
+
+        for path in [self.conf_file] + [ path for path, v6 in self.rules_files ]:
+            try:
+                info = os.stat(path)
+                signature.append((info.st_mtime, info.st_size, info.st_ino))
+            except OSError:
+                signature.append(None)
+
+        return signature
+
+    def _read_lines(self, path):
+
+        try:
+            with open(path) as lines_file:
+                return lines_file.read().splitlines()
+        except (IOError, OSError):
+            return []
+
+    def status(self):
+
+        '''
+        Return the current UfwStatus (raises IOError if ufw.conf can't be read)
+        '''
+
+        signature = self._signature()
+
+        if signature == self.signature and self.cached is not None:
+            return self.cached
+
+        with open(self.conf_file) as conf:
+            settings = parse_conf(conf.read().splitlines())
+
+        rules = []
+        for path, v6 in self.rules_files:
+            rules.extend(parse_rules(self._read_lines(path), v6))
+
+        self.cached = UfwStatus(settings.get('ENABLED', 'no').lower() == 'yes', rules)
+        self.signature = signature
+
+        return self.cached
+
+    def status_lines(self):
+
+        '''
+        Status & rule lines, as 'ufw status' shows them (whitespace compressed)
+        '''
+
+        status = self.status()
+
+        if not status.enabled:
+            return ['Status: inactive']
+
+        return ['Status: active'] + [ rule.line for rule in status.rules ]
+
+
+if __name__ == '__main__':
+
+    import sys
+
+    reader = UfwReader(sys.argv[1] if len(sys.argv) > 1 else '/etc/ufw')
+
+    for line in reader.status_lines():
+        print(line)
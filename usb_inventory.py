@@ -0,0 +1,485 @@
+'''
+USB device inventory from /sys/bus/usb/devices with a compiled usb.ids index.
+
+Replaces running lsusb for the USB page. lsusb reads & parses the whole
+usb.ids database (several MB of text) every time it runs just to name the
+few devices that are plugged in. Here the devices are listed from sysfs
+(idVendor, idProduct, manufacturer, product...) and named from a compact
+binary index of usb.ids:
+
+    header     magic, usb.ids mtime & size, vendor & product counts
+    vendors    sorted (vendor id, name offset, name length) records
+    products   sorted (vendor id << 16 | product id, name offset, name length)
+    names      the names, utf-8 encoded
+
+The index is built once (and rebuilt only when usb.ids changes), mapped
+with mmap & searched with bisect, so looking up a name reads a few pages
+of the file rather than parsing all of it.
+
+The device list is kept until the kernel reports a USB hotplug event (a
+uevent, read from a NETLINK_KOBJECT_UEVENT socket). The owner's event loop
+watches the socket (monitor.fileno()) & calls hotplug() when it is
+readable; hotplug() is the only reader of the socket, so devices() can be
+called from another thread. If the socket can't be opened, the list is
+re-read after 'max_age' seconds instead.
+
+Usage:
+
+    inventory = usb_inventory.UsbInventory()
+    for device in inventory.devices():
+        print(device.description)   # e.g. "Realtek Semiconductor Corp. RTL8812AU..."
+
+Run this module to print the devices found (with lsusb style descriptions)
+& the time taken to build & search the index.
+'''
+
+import bisect
+import errno
+import mmap
+import os
+import socket
+import struct
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+from cache_files import writable_cache_dir
+
+# use a monotonic clock where available (Python 3)
+monotonic = getattr(time, 'monotonic', time.time)
+
+# usual locations of usb.ids (first found is used)
+usb_ids_files = [
+    '/usr/share/misc/usb.ids',
+    '/var/lib/usbutils/usb.ids',
+    '/usr/share/hwdata/usb.ids',
+    '/usr/share/usb.ids',
+]
+
+index_header = struct.Struct('=8sdQII')     # magic, mtime, size, vendors, products
+index_record = struct.Struct('=III')        # key, name offset, name length
+index_magic = b'USBIDX01'
+
+NETLINK_KOBJECT_UEVENT = 15
+
+
+def find_usb_ids():
+
+    for path in usb_ids_files:
+        if os.path.isfile(path):
+            return path
+
+    return None
+
+
+def parse_usb_ids(lines):
+
+    '''
+    Return (vendors, products) dicts of id: name (as bytes) from the lines
+    of usb.ids (as bytes). Only the vendor/product section is read.
+    '''
+
+    vendors = {}
+    products = {}
+    vendor = None
+
+    for line in lines:
+
+        if not line.strip() or line.startswith(b'#'):
+            continue
+
+        if line.startswith(b'\t\t'):
+            # interface - not needed
+            continue
+
+        if line.startswith(b'\t'):
+            if vendor is not None:
+                try:
+                    products[(vendor << 16) | int(line[1:5], 16)] = line[5:].strip()
+                except ValueError:
+                    pass
+            continue
+
+        try:
+            vendor = int(line[0:4], 16)
+        except ValueError:
+            # first of the class, HID etc. sections - vendors end here
+            break
+
+        vendors[vendor] = line[4:].strip()
+
+    return (vendors, products)
+
+
+class _Keys(object):
+
+    '''
+    Sequence of the keys of a table in the index (for bisect)
+    '''
+
+    def __init__(self, data, offset, count):
+
+        self.data = data
+        self.offset = offset
+        self.count = count
+
+    def __len__(self):
+
+        return self.count
+
+    def __getitem__(self, position):
+
+        return index_record.unpack_from(self.data, self.offset + position * index_record.size)[0]
+
+
+class UsbIdsIndex(object):
+
+    '''
+    Vendor & product names from a memory mapped index of usb.ids
+    '''
+
+    def __init__(self, ids_file=None, index_file=None):
+
+        self.ids_file = ids_file or find_usb_ids()
+        self.index_file = index_file or self._default_index_file()
+        self.data = None
+        self.signature = None
+        self.builds = 0
+
+    @staticmethod
+    def _default_index_file():
+
+        directory = writable_cache_dir()
+
+        return os.path.join(directory, 'usb.ids.idx') if directory else None
+
+    def build(self, signature):
+
+        '''
+        Compile usb.ids in to the index file (written to a temporary file
+        & renamed in to place, so readers never see part of an index)
+        '''
+
+        with open(self.ids_file, 'rb') as ids:
+            (vendors, products) = parse_usb_ids(ids.read().splitlines())
+
+        names = []
+        names_size = [0]
+
+        def add_name(name):
+            names.append(name)
+            names_size[0] += len(name)
+            return (names_size[0] - len(name), len(name))
+
+        tables = []
+        for table in (vendors, products):
+            tables.append(b''.join(index_record.pack(key, *add_name(table[key]))
+                for key in sorted(table)))
+
+        header = index_header.pack(index_magic, signature[0], signature[1],
+            len(vendors), len(products))
+
+        directory = os.path.dirname(self.index_file)
+        (fd, temp_file) = tempfile.mkstemp(prefix='.usb.ids.', dir=directory)
+
+        try:
+            with os.fdopen(fd, 'wb') as index:
+                index.write(header)
+                index.write(tables[0])
+                index.write(tables[1])
+                index.write(b''.join(names))
+            os.rename(temp_file, self.index_file)
+        except:
+            os.unlink(temp_file)
+            raise
+
+        self.builds += 1
+
+    def _map(self):
+
+        with open(self.index_file, 'rb') as index:
+            return mmap.mmap(index.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _current(self, data, signature):
+
+        if len(data) < index_header.size:
+            return False
+
+        (magic, mtime, size, vendors, products) = index_header.unpack_from(data)
+
+        return magic == index_magic and (mtime, size) == signature
+
+    def open(self):
+
+        '''
+        Map the index, (re)building it first if usb.ids has changed.
+        Returns False if there is no usb.ids or index can't be made.
+        '''
+
+        if self.ids_file is None or self.index_file is None:
+            return False
+
+        try:
+            info = os.stat(self.ids_file)
+        except OSError:
+            return False
+
+        signature = (info.st_mtime, info.st_size)
+
+        if self.data is not None and signature == self.signature:
+            return True
+
+        self.close()
+
+        try:
+            data = self._map() if os.path.isfile(self.index_file) else None
+
+            if data is None or not self._current(data, signature):
+                if data is not None:
+                    data.close()
+                self.build(signature)
+                data = self._map()
+
+        except (IOError, OSError, ValueError):
+            return False
+
+        (magic, mtime, size, vendors, products) = index_header.unpack_from(data)
+
+        self.data = data
+        self.signature = signature
+        self.vendor_keys = _Keys(data, index_header.size, vendors)
+        self.product_keys = _Keys(data, self.vendor_keys.offset + vendors * index_record.size, products)
+        self.names_offset = self.product_keys.offset + products * index_record.size
+
+        return True
+
+    def close(self):
+
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+
+    def _lookup(self, keys, key):
+
+        position = bisect.bisect_left(keys, key)
+
+        if position == len(keys) or keys[position] != key:
+            return None
+
+        (key, offset, length) = index_record.unpack_from(keys.data,
+            keys.offset + position * index_record.size)
+        start = self.names_offset + offset
+
+        return keys.data[start:start + length].decode('utf-8', 'replace')
+
+    def vendor(self, vendor_id):
+
+        if not self.open():
+            return None
+
+        return self._lookup(self.vendor_keys, vendor_id)
+
+    def product(self, vendor_id, product_id):
+
+        if not self.open():
+            return None
+
+        return self._lookup(self.product_keys, (vendor_id << 16) | product_id)
+
+
+class UsbDevice(namedtuple('UsbDevice', 'bus device vendor_id product_id vendor product')):
+
+    '''
+    A USB device. vendor & product are names from usb.ids where known,
+    otherwise the strings the device reports (or None).
+    '''
+
+    @property
+    def description(self):
+
+        '''
+        Description as lsusb shows it (after the "Bus ... ID vvvv:pppp ")
+        '''
+
+        return ' '.join(name for name in (self.vendor, self.product) if name)
+
+
+def read_attribute(path, name):
+
+    try:
+        with open(os.path.join(path, name), 'rb') as attribute:
+            return attribute.read().decode('utf-8', 'replace').strip()
+    except (IOError, OSError):
+        return None
+
+
+class UeventMonitor(object):
+
+    '''
+    Notes USB hotplug uevents from the kernel (read without blocking)
+    '''
+
+    def __init__(self):
+
+        try:
+            self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+            # port id 0 lets the kernel pick one (another netlink socket may
+            # already have our pid); group 1 is the kernel's uevents
+            self.sock.bind((0, 1))
+            self.sock.setblocking(False)
+        except (socket.error, AttributeError, ValueError):
+            self.sock = None
+
+    @property
+    def available(self):
+
+        return self.sock is not None
+
+    def fileno(self):
+
+        return self.sock.fileno()
+
+    def changed(self):
+
+        '''
+        Return True if a USB device has been added or removed since the
+        last call
+        '''
+
+        changed = False
+
+        while True:
+            try:
+                message = self.sock.recv(8192)
+            except socket.error as ex:
+                # events were lost - assume one was for USB
+                if ex.args[0] == errno.ENOBUFS:
+                    changed = True
+                    continue
+                break
+
+            if b'\0SUBSYSTEM=usb\0' in message:
+                changed = True
+
+        return changed
+
+
+class UsbInventory(object):
+
+    '''
+    List of USB devices, re-read from sysfs after a hotplug event
+    '''
+
+    def __init__(self, sys_bus_usb='/sys/bus/usb/devices', ids_index=None, max_age=30):
+
+        self.sys_bus_usb = sys_bus_usb
+        self.ids_index = ids_index or UsbIdsIndex()
+        self.max_age = max_age
+        self.monitor = UeventMonitor()
+        self.cached = None
+        self.read_time = 0
+
+        # hotplug() counts changes; the list is re-read when the count is
+        # not the one it was read at
+        self.lock = threading.Lock()
+        self.changes = 0
+        self.read_changes = 0
+
+    def _scan(self):
+
+        devices = []
+
+        for name in os.listdir(self.sys_bus_usb):
+
+            path = os.path.join(self.sys_bus_usb, name)
+
+            # interfaces (e.g. 1-1:1.0) have no idVendor
+            vendor_id = read_attribute(path, 'idVendor')
+            if vendor_id is None:
+                continue
+
+            vendor_id = int(vendor_id, 16)
+            product_id = int(read_attribute(path, 'idProduct') or '0', 16)
+
+            vendor = self.ids_index.vendor(vendor_id) or read_attribute(path, 'manufacturer')
+            product = self.ids_index.product(vendor_id, product_id) or read_attribute(path, 'product')
+
+            devices.append(UsbDevice(
+                bus=int(read_attribute(path, 'busnum') or 0),
+                device=int(read_attribute(path, 'devnum') or 0),
+                vendor_id=vendor_id,
+                product_id=product_id,
+                vendor=vendor,
+                product=product))
+
+        devices.sort()
+        return devices
+
+    def devices(self):
+
+        '''
+        Return the list of UsbDevice (ordered by bus & device number)
+        '''
+
+        with self.lock:
+            if self.monitor.available:
+                stale = self.read_changes != self.changes
+            else:
+                stale = monotonic() - self.read_time > self.max_age
+
+            if self.cached is not None and not stale:
+                return self.cached
+
+            changes = self.changes
+
+        # (a hotplug event during the scan is picked up by the next call)
+        devices = self._scan()
+
+        with self.lock:
+            self.cached = devices
+            self.read_changes = changes
+            self.read_time = monotonic()
+
+        return devices
+
+    def hotplug(self):
+
+        '''
+        Read pending uevents (when the monitor socket is readable). Returns
+        True, & marks the device list to be re-read, if a USB device was
+        added or removed.
+        '''
+
+        if not self.monitor.changed():
+            return False
+
+        with self.lock:
+            self.changes += 1
+
+        return True
+
+
+if __name__ == '__main__':
+
+    import sys
+
+    index = UsbIdsIndex(*sys.argv[1:3])
+
+    start = monotonic()
+    if index.open():
+        print('index {} ({} builds) opened in {:.1f} ms'.format(
+            index.index_file, index.builds, (monotonic() - start) * 1000))
+
+        start = monotonic()
+        for n in range(1000):
+            index.product(0x0bda, 0x8812)
+        print('1000 lookups in {:.1f} ms: {} {}'.format((monotonic() - start) * 1000,
+            index.vendor(0x0bda), index.product(0x0bda, 0x8812)))
+    else:
+        print('no usb.ids found')
+
+    if os.path.isdir('/sys/bus/usb/devices'):
+        for device in UsbInventory(ids_index=index).devices():
+            print('Bus {:03d} Device {:03d}: ID {:04x}:{:04x} {}'.format(device.bus,
+                device.device, device.vendor_id, device.product_id, device.description))